@@ -0,0 +1,188 @@
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'naruto_jutsu_catalog.settings.dev')
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def benchmark_database():
+    """Run against a throwaway, fully migrated copy of the default database."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+WORDS = (
+    'chakra selo clone fogo água vento terra raio sombra dragão bola esfera '
+    'lâmina escudo ilusão olho sangue folha areia névoa trovão fênix tigre serpente '
+    'invocação barreira técnica proibida ninja kunai pergaminho lua sol tempestade'
+).split()
+SYLLABLES = 'ka ton su i ra sen gan chi do ri ma ke ru ne ji sha rin gō kyū ryū dan mi zu ha'.split()
+
+
+def vocabulary(size=5000, seed=7):
+    """Real words first, then invented ones; drawn with a Zipf-like skew like real prose."""
+    rng = random.Random(seed)
+    words = list(WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    return words, weights
+
+
+def parse_count(value):
+    """``10k``, ``100K``, ``1m`` or a plain integer."""
+    value = value.strip().lower().replace('_', '')
+    for suffix, factor in (('k', 1_000), ('m', 1_000_000)):
+        if value.endswith(suffix):
+            return int(float(value[:-1]) * factor)
+    return int(value)
+
+
+def seed_images(count, seed=42, prefix='jutsu_images/bench'):
+    """
+    Store ``count`` deterministic PNGs (gradients with a few shapes) plus their
+    responsive variants, and return ``[(name, manifest), ...]`` to share among
+    jutsus. Existing files are reused, so reseeding is cheap.
+    """
+    from PIL import Image, ImageDraw
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from catalog.images import render_variants
+
+    rng = random.Random(seed)
+    pool = []
+    for index in range(count):
+        width, height = rng.choice([(1600, 900), (1200, 1200), (900, 1350)])
+        start, end = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(2)]
+        shapes = [(rng.randrange(width), rng.randrange(height), rng.randrange(40, 400),
+                   tuple(rng.randrange(256) for _ in range(3))) for _ in range(6)]
+        name = f'{prefix}/{index:04d}.png'
+        manifest_name = f'{name}.json'
+        if default_storage.exists(manifest_name):
+            with default_storage.open(manifest_name) as file:
+                pool.append((name, json.load(file)))
+            continue
+        image = Image.linear_gradient('L').resize((width, height))
+        image = Image.merge('RGB', [image.point(lambda v, a=a, b=b: a + (b - a) * v // 255)
+                                    for a, b in zip(start, end)])
+        draw = ImageDraw.Draw(image)
+        for x, y, radius, color in shapes:
+            draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+        buffer = BytesIO()
+        image.save(buffer, format='PNG')
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(buffer.getvalue()))
+        manifest = render_variants(image, f'bench-{PurePosixPath(name).stem}')
+        manifest['source'] = name
+        default_storage.save(manifest_name, ContentFile(json.dumps(manifest).encode()))
+        pool.append((name, manifest))
+    return pool
+
+
+def synthetic_name(rng, words, weights, number):
+    return f"{' '.join(rng.choices(words, weights, k=2)).capitalize()} no Jutsu #{number}"
+
+
+def seed_jutsus(count, batch_size=5000, seed=42, images=(), image_ratio=0.7):
+    """
+    Deterministic catalog of ``count`` jutsus: Zipf-distributed descriptions of
+    20-60 words, uniform classifications and, when an ``images`` pool is
+    given, an image with a current manifest on ``image_ratio`` of them.
+    Counters, revision, change feed and sampling caches are refreshed at the
+    end since bulk_create skips the signals.
+    """
+    from django.db import transaction
+    from catalog import sampling
+    from catalog.changes import rebuild_changes
+    from catalog.models import Jutsu
+    from catalog.stats import rebuild_stats
+    from catalog.versioning import bump_revision
+
+    rng = random.Random(seed)
+    words, weights = vocabulary()
+    elements = [value for value, _ in Jutsu.Elements.choices]
+    types = [value for value, _ in Jutsu.Types.choices]
+    ranks = [value for value, _ in Jutsu.Ranks.choices]
+    for start in range(0, count, batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, count)):
+            jutsu = Jutsu(
+                name=synthetic_name(rng, words, weights, i),
+                description=' '.join(rng.choices(words, weights, k=rng.randint(20, 60))),
+                element_type=rng.choice(elements),
+                jutsu_type=rng.choice(types),
+                rank=rng.choice(ranks),
+            )
+            if images and rng.random() < image_ratio:
+                jutsu.image, jutsu.image_variants = rng.choice(images)
+            batch.append(jutsu)
+        with transaction.atomic():
+            Jutsu.objects.bulk_create(batch)
+    with transaction.atomic():
+        rebuild_stats()
+        bump_revision()
+    rebuild_changes()
+    sampling.invalidate()
+
+
+def measure(func, repeat=20, warmup=2):
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'p50_ms': statistics.median(timings),
+        'p95_ms': percentile(timings, 0.95),
+        'p99_ms': percentile(timings, 0.99),
+        'mean_ms': statistics.fmean(timings),
+        'max_ms': timings[-1],
+    }
+
+
+def print_table(rows, columns):
+    widths = [max(len(str(column)), *(len(f'{row[column]:.2f}' if isinstance(row[column], float) else str(row[column])) for row in rows)) for column in columns]
+    print('  '.join(str(column).ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        cells = [f'{row[column]:.2f}' if isinstance(row[column], float) else str(row[column]) for column in columns]
+        print('  '.join(cell.ljust(width) for cell, width in zip(cells, widths)))
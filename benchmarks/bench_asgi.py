@@ -0,0 +1,107 @@
+"""
+Sync (gunicorn) versus async (gunicorn + uvicorn workers) deployment of the
+same code, at increasing client concurrency.
+
+Both servers get the same number of worker processes and serve the configured
+database, so fill it first:
+
+    python -m benchmarks.generate_data --rows 100k
+    python -m benchmarks.bench_asgi --workers 2 --concurrency 1 8 32 64
+
+Sync workers handle one request at a time, so once every worker is busy the
+extra clients queue and latency grows with concurrency; async workers keep
+accepting requests while queries are in flight. The gap widens with database
+latency (e.g. PostgreSQL over the network) and narrows on a local SQLite file.
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks._common import ROOT, print_table
+from benchmarks.bench_routes import RESULTS_DIR, git_commit, http_fetch, routes, run
+
+SERVERS = {
+    'wsgi': ['naruto_jutsu_catalog.wsgi:application'],
+    'asgi': ['naruto_jutsu_catalog.asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+DEFAULT_ROUTES = ['home', 'jutsu-list', 'jutsu-detail', 'dashboard', 'api list', 'api detail']
+
+
+def start_server(kind, port, workers):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='benchmarks.server_settings')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', *SERVERS[kind], '--workers', str(workers),
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/api/', timeout=1).read()
+            return process
+        except (urllib.error.URLError, ConnectionError, OSError):
+            if process.poll() is not None:
+                raise RuntimeError(f'{kind} server exited with {process.returncode}')
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{kind} server did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 64])
+    parser.add_argument('--requests', type=int, default=20, help='Timed requests per client, per route.')
+    parser.add_argument('--routes', nargs='+', default=DEFAULT_ROUTES)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help='Report path (default: benchmarks/results/<time>-<commit>-asgi.json).')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.server_settings')
+    import django
+    django.setup()
+    from catalog.models import Jutsu
+
+    jutsu_pk = Jutsu.objects.order_by('pk').values_list('pk', flat=True).first()
+    if jutsu_pk is None:
+        parser.error('the database is empty; run benchmarks.generate_data first')
+    paths = {name: path for name, path in routes(jutsu_pk) if name in args.routes}
+
+    report = {
+        'commit': git_commit(),
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'mode': 'asgi-vs-wsgi',
+        'workers': args.workers,
+        'rows': Jutsu.objects.count(),
+        'results': [],
+    }
+    for kind in SERVERS:
+        process = start_server(kind, args.port, args.workers)
+        try:
+            fetch = http_fetch(f'http://127.0.0.1:{args.port}')
+            for concurrency in args.concurrency:
+                for name, path in paths.items():
+                    result = run(fetch, path, args.requests * concurrency, concurrency, warmup=3)
+                    result.update(server=kind, concurrency=concurrency, route=name)
+                    report['results'].append(result)
+                    print(f'{kind} c={concurrency} {name}: {result["rps"]:.0f} req/s, p99 {result["p99_ms"]:.1f} ms', flush=True)
+        finally:
+            process.terminate()
+            process.wait()
+
+    print_table(report['results'], ['server', 'concurrency', 'route', 'rps', 'p50_ms', 'p95_ms', 'p99_ms'])
+    output = args.output or RESULTS_DIR / f"{report['date'][:19].replace(':', '')}-{report['commit'] or 'nogit'}-asgi.json"
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'saved {output}')
+
+
+if __name__ == '__main__':
+    main()
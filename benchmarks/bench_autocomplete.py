@@ -0,0 +1,97 @@
+"""
+Latency of the in-process autocomplete index over synthetic jutsu names.
+
+    python -m benchmarks.bench_autocomplete --rows 1m
+    python -m benchmarks.bench_autocomplete --rows 100k --db-rows 100k
+
+Queries are what a user types: the start of a name, the start of a later
+word, a name with a typo and text that matches nothing. ``--db-rows`` also
+times the ``name__icontains`` query a search box would otherwise send.
+"""
+import argparse
+import random
+import resource
+import string
+import time
+
+from benchmarks._common import (
+    benchmark_database, parse_count, print_table, seed_jutsus, setup_django, summarize, synthetic_name, vocabulary,
+)
+
+
+def typo(rng, word):
+    position = rng.randrange(len(word))
+    return word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+
+
+def queries(rng, names, count):
+    """``{kind: [query]}``, drawn from ``names``."""
+    kinds = {'prefix': [], 'word': [], 'typo': [], 'miss': []}
+    for _ in range(count):
+        words = rng.choice(names).split()
+        kinds['prefix'].append(' '.join(words)[:rng.randint(1, 8)])
+        kinds['word'].append(words[1][:rng.randint(2, 6)])
+        longest = max(words[:2], key=len)
+        kinds['typo'].append(typo(rng, longest) if len(longest) >= 5 else longest)
+        kinds['miss'].append(''.join(rng.choices('xzqw', k=6)))
+    return kinds
+
+
+def time_queries(func, kinds, limit):
+    rows = []
+    for kind, texts in kinds.items():
+        timings, found = [], 0
+        for text in texts:
+            start = time.perf_counter()
+            found += len(func(text, limit))
+            timings.append((time.perf_counter() - start) * 1000)
+        rows.append({'queries': kind, 'avg_results': found / len(texts), **summarize(timings)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=parse_count, default='1m', help='Names in the index: 100k, 1m...')
+    parser.add_argument('--queries', type=int, default=1000, help='Queries of each kind.')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db-rows', type=parse_count, default=0, help='Also time icontains on a database this big.')
+    args = parser.parse_args()
+
+    setup_django()
+    from catalog import autocomplete
+
+    rng = random.Random(args.seed)
+    words, weights = vocabulary()
+    names = [synthetic_name(rng, words, weights, number) for number in range(args.rows)]
+    kinds = queries(random.Random(args.seed + 1), names, args.queries)
+
+    memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    index = autocomplete.NameIndex(enumerate(names, 1))
+    built = time.perf_counter() - start
+    memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memory) / 1024
+    print(f'{len(index)} names: index built in {built:.1f}s, peak memory +{memory:.0f} MB, '
+          f'{len(index.words)} distinct words')
+
+    def lookup(text, limit):
+        return index.search(autocomplete.fold(text), limit)
+
+    columns = ['queries', 'avg_results', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+    print_table(time_queries(lookup, kinds, args.limit), columns)
+
+    if args.db_rows:
+        from catalog.models import Jutsu
+
+        with benchmark_database():
+            seed_jutsus(args.db_rows, seed=args.seed)
+
+            def icontains(text, limit):
+                return list(Jutsu.objects.filter(name__icontains=text).values_list('id', 'name')[:limit])
+
+            print(f'\nname__icontains over {args.db_rows} jutsus')
+            print_table(time_queries(icontains, {kind: texts[:100] for kind, texts in kinds.items()}, args.limit), columns)
+
+
+if __name__ == '__main__':
+    main()
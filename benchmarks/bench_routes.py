@@ -0,0 +1,179 @@
+"""
+Latency, throughput and SQL query counts of every catalog route.
+
+In-process (default) it seeds a throwaway database and drives the views with
+Django's test client; with ``--url`` it sends real HTTP requests to a running
+server (e.g. gunicorn over a database filled by ``generate_data``), where SQL
+counts are not available. Results are printed and saved as JSON for
+``benchmarks.compare``.
+
+    python -m benchmarks.bench_routes --rows 100k
+    python -m benchmarks.bench_routes --url http://127.0.0.1:8000 --concurrency 8
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from benchmarks._common import (
+    ROOT, benchmark_database, parse_count, print_table, seed_images, seed_jutsus, setup_django, summarize,
+)
+
+RESULTS_DIR = ROOT / 'benchmarks' / 'results'
+
+
+def routes(jutsu_pk):
+    return [
+        ('home', '/'),
+        ('jutsu-list', '/jutsus/'),
+        ('jutsu-list page 5', '/jutsus/?page=5'),
+        ('jutsu-list filters', '/jutsus/?element=fire&type=offensive'),
+        ('jutsu-list search', '/jutsus/?search=chakra+fogo'),
+        ('jutsu-detail', f'/jutsu/{jutsu_pk}/'),
+        ('dashboard', '/dashboard/'),
+        ('api list', '/api/jutsus/'),
+        ('api list cursor', '/api/jutsus/?cursor=&ordering=-created_at'),
+        ('api list filters', '/api/jutsus/?element_type=water&rank=S'),
+        ('api search', '/api/jutsus/?search=selo'),
+        ('api detail', f'/api/jutsus/{jutsu_pk}/'),
+    ]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(fetch, path, requests, concurrency, warmup):
+    """Time ``requests`` fetches of ``path``; returns the summary plus throughput and queries per request."""
+    for _ in range(warmup):
+        fetch(path)
+    timings, queries = [], []
+    lock = threading.Lock()
+
+    def one(_):
+        start = time.perf_counter()
+        count = fetch(path)
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            timings.append(elapsed)
+            if count is not None:
+                queries.append(count)
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(requests)))
+    else:
+        for index in range(requests):
+            one(index)
+    wall = time.perf_counter() - started
+    result = summarize(timings)
+    result['rps'] = requests / wall
+    result['queries'] = max(queries) if queries else None
+    return result
+
+
+def in_process_fetch():
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client()
+
+    def fetch(path):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(path)
+        if response.status_code != 200:
+            raise RuntimeError(f'{path}: HTTP {response.status_code}')
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+        return len(queries)
+
+    return fetch
+
+
+def http_fetch(base_url):
+    def fetch(path):
+        with urllib.request.urlopen(base_url.rstrip('/') + path) as response:
+            response.read()
+        return None
+
+    return fetch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=parse_count, default='10k', help='In-process dataset size: 10k, 100k, 1m...')
+    parser.add_argument('--images', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=200, help='Timed requests per route.')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=1, help='Parallel clients (HTTP mode).')
+    parser.add_argument('--url', help='Benchmark a running server instead of the in-process views.')
+    parser.add_argument('--jutsu', type=int, help='Primary key used for the detail routes in HTTP mode.')
+    parser.add_argument('--page-cache', action='store_true', help='Keep the catalog page cache on (in-process).')
+    parser.add_argument('--only', nargs='*', help='Route names to run.')
+    parser.add_argument('--output', type=Path, help=f'Report path (default: {RESULTS_DIR.relative_to(ROOT)}/<time>-<commit>.json).')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings
+
+    report = {
+        'commit': git_commit(),
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'mode': 'http' if args.url else 'in-process',
+        'url': args.url,
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'routes': {},
+    }
+
+    def measure_routes(fetch, jutsu_pk):
+        for name, path in routes(jutsu_pk):
+            if args.only and name not in args.only:
+                continue
+            result = run(fetch, path, args.requests, args.concurrency, args.warmup)
+            report['routes'][name] = dict(result, path=path)
+            print(f'{name}: p50 {result["p50_ms"]:.2f} ms', flush=True)
+
+    if args.url:
+        measure_routes(http_fetch(args.url), args.jutsu or 1)
+    else:
+        if args.concurrency > 1:
+            parser.error('--concurrency needs --url; in-process requests share one database connection')
+        overrides = {'DEBUG': False, 'MEDIA_ROOT': str(Path(settings.MEDIA_ROOT) / 'benchmarks')}
+        if not args.page_cache:
+            overrides['CATALOG_PAGE_CACHE_TIMEOUT'] = 0
+        with override_settings(**overrides), benchmark_database():
+            from catalog.models import Jutsu
+
+            pool = seed_images(args.images) if args.images else ()
+            seed_jutsus(args.rows, images=pool)
+            report.update(rows=args.rows, database=connection.vendor, page_cache=args.page_cache)
+            measure_routes(in_process_fetch(), Jutsu.objects.order_by('pk').values_list('pk', flat=True)[args.rows // 2])
+
+    rows = [dict(result, route=name) for name, result in report['routes'].items()]
+    print_table(rows, ['route', 'p50_ms', 'p95_ms', 'p99_ms', 'rps', 'queries'])
+
+    output = args.output or RESULTS_DIR / f"{report['date'][:19].replace(':', '')}-{report['commit'] or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f'saved {output}')
+
+
+if __name__ == '__main__':
+    main()
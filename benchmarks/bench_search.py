@@ -0,0 +1,51 @@
+"""
+Compare the full-text search index against the old ``icontains`` scan.
+
+    python -m benchmarks.bench_search --rows 100000
+"""
+import argparse
+
+from benchmarks._common import benchmark_database, measure, print_table, seed_jutsus, setup_django
+
+QUERIES = ['chakra', 'bola fogo', 'rasen', 'kasenri', 'técnica proibida', 'inexistente']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models import Q
+    from catalog.models import Jutsu
+    from catalog.search import search_jutsus
+
+    with benchmark_database():
+        seed_jutsus(args.rows)
+        rows = []
+        for query in QUERIES:
+            # One list page: the paginator's count plus the first 12 rows.
+            def scan_page():
+                queryset = Jutsu.objects.filter(Q(name__icontains=query) | Q(description__icontains=query))
+                return queryset.count(), list(queryset[:12])
+
+            def indexed_page():
+                queryset = search_jutsus(Jutsu.objects.all(), query)
+                return queryset.count(), list(queryset[:12])
+
+            scan = measure(scan_page, repeat=args.repeat)
+            indexed = measure(indexed_page, repeat=args.repeat)
+            rows.append({
+                'query': query,
+                'matches': search_jutsus(Jutsu.objects.all(), query).count(),
+                'icontains_p50_ms': scan['p50_ms'],
+                'fts_p50_ms': indexed['p50_ms'],
+                'fts_p95_ms': indexed['p95_ms'],
+            })
+        print(f'{args.rows} jutsus')
+        print_table(rows, ['query', 'matches', 'icontains_p50_ms', 'fts_p50_ms', 'fts_p95_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare JutsuSerializer on model instances against the ``.values()`` fast path
+used by the list API.
+
+    python -m benchmarks.bench_serializers --rows 20000
+"""
+import argparse
+
+from benchmarks._common import benchmark_database, measure, print_table, seed_jutsus, setup_django
+
+PAGE_SIZES = [10, 100, 1000]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import RequestFactory
+    from rest_framework.renderers import JSONRenderer
+    from catalog.models import Jutsu
+    from catalog.serializers import JutsuListSerializer, JutsuSerializer
+
+    request = RequestFactory().get('/api/jutsus/')
+    renderer = JSONRenderer()
+
+    with benchmark_database():
+        seed_jutsus(args.rows)
+        # Every other jutsu has an image with a current manifest, like a converted catalog.
+        for pk in Jutsu.objects.filter(pk__in=range(0, args.rows + 1, 2)).values_list('pk', flat=True).iterator():
+            name = f'jutsu_images/{pk}.png'
+            Jutsu.objects.filter(pk=pk).update(image=name, image_variants={
+                'source': name, 'width': 1600, 'height': 900,
+                'variants': [
+                    {'name': f'jutsu_images/variants/{pk}-{width}w.{fmt}', 'format': fmt, 'width': width, 'height': width * 9 // 16}
+                    for width in (320, 640, 1280) for fmt in ('webp', 'jpeg')
+                ],
+            })
+
+        rows = []
+        for page_size in PAGE_SIZES:
+            queryset = Jutsu.objects.order_by('name')[:page_size]
+
+            def instances():
+                return renderer.render(JutsuSerializer(list(queryset), many=True, context={'request': request}).data)
+
+            def values():
+                page = list(Jutsu.objects.order_by('name').values(*JutsuListSerializer.VALUE_FIELDS)[:page_size])
+                return renderer.render(JutsuSerializer(page, many=True, context={'request': request}).data)
+
+            assert instances() == values()
+            slow = measure(instances, repeat=args.repeat)
+            fast = measure(values, repeat=args.repeat)
+            rows.append({
+                'page_size': page_size,
+                'instances_p50_ms': slow['p50_ms'],
+                'values_p50_ms': fast['p50_ms'],
+                'instances_rows_s': int(page_size / slow['p50_ms'] * 1000),
+                'values_rows_s': int(page_size / fast['p50_ms'] * 1000),
+                'speedup': slow['p50_ms'] / fast['p50_ms'],
+            })
+        print(f'{args.rows} jutsus, query + serialization + JSON rendering')
+        print_table(rows, ['page_size', 'instances_p50_ms', 'values_p50_ms', 'instances_rows_s', 'values_rows_s', 'speedup'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Cold start and per-request overhead of each settings profile (dev and prod).
+
+Cold start runs fresh interpreters that load the WSGI application and the
+URLconf, as a gunicorn worker does when it boots. Request overhead drives a
+few routes with Django's test client in one process per profile, over a
+SQLite file, so connection setup is paid per request under dev
+(CONN_MAX_AGE = 0) and once under prod.
+
+    python -m benchmarks.bench_startup --rows 10k --runs 10 --repeat 200
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks._common import ROOT, measure, parse_count, print_table, seed_jutsus, setup_django, summarize
+
+PROFILES = {
+    'dev': 'naruto_jutsu_catalog.settings.dev',
+    'prod': 'naruto_jutsu_catalog.settings.prod',
+}
+ROUTES = ['home', 'jutsu-detail', 'api list', 'api detail']
+
+COLD_START = """
+import time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def profile_env(profile, database):
+    return dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE=PROFILES[profile],
+        SQL_DATABASE=str(database),
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'bench-startup'),
+        DJANGO_ALLOWED_HOSTS='localhost',
+    )
+
+
+def cold_start(profiles, database, runs):
+    """``{profile: (process, setup)}`` timings; the profiles take turns so machine noise hits them alike."""
+    timings = {profile: ([], []) for profile in profiles}
+    for _ in range(runs):
+        for profile, (process_ms, setup_ms) in timings.items():
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, '-c', COLD_START], cwd=ROOT, env=profile_env(profile, database),
+                capture_output=True, text=True, check=True,
+            ).stdout
+            process_ms.append((time.perf_counter() - start) * 1000)
+            setup_ms.append(float(output.strip().splitlines()[-1]))
+    return {profile: (summarize(process_ms), summarize(setup_ms)) for profile, (process_ms, setup_ms) in timings.items()}
+
+
+def request_overhead(profile, database, repeat):
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_startup', '--requests-only', '--repeat', str(repeat)],
+        cwd=ROOT, env=profile_env(profile, database), capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def serve_requests(repeat):
+    """In a child process, already on its profile: time each route through the whole middleware stack."""
+    setup_django()
+    from django.test import Client
+    from catalog.models import Jutsu
+    from benchmarks.bench_routes import routes
+
+    client = Client(HTTP_HOST='localhost')
+    paths = dict(routes(Jutsu.objects.order_by('pk').values_list('pk', flat=True).first()))
+
+    def fetch(path):
+        response = client.get(path)
+        if response.status_code != 200:
+            raise RuntimeError(f'{path}: HTTP {response.status_code}')
+        return response.content
+
+    print(json.dumps({name: measure(lambda: fetch(paths[name]), repeat=repeat, warmup=5) for name in ROUTES}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=parse_count, default=10_000)
+    parser.add_argument('--runs', type=int, default=10, help='Interpreters started per profile.')
+    parser.add_argument('--repeat', type=int, default=200, help='Timed requests per route.')
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument('--requests-only', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.requests_only:
+        serve_requests(args.repeat)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = Path(directory) / 'startup.sqlite3'
+        os.environ.update(DJANGO_SETTINGS_MODULE=PROFILES['dev'], SQL_DATABASE=str(database))
+        setup_django()
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+        seed_jutsus(args.rows)
+
+        startup, requests = [], []
+        for profile, (process, setup) in cold_start(args.profiles, database, args.runs).items():
+            startup.append({
+                'profile': profile,
+                'process_p50_ms': process['p50_ms'],
+                'process_max_ms': process['max_ms'],
+                'setup_p50_ms': setup['p50_ms'],
+                'setup_max_ms': setup['max_ms'],
+            })
+        for profile in args.profiles:
+            for route, result in request_overhead(profile, database, args.repeat).items():
+                requests.append({'profile': profile, 'route': route, **result})
+
+    print(f'cold start: interpreter + django.setup() + WSGI application + URLconf ({args.runs} runs)')
+    print_table(startup, ['profile', 'process_p50_ms', 'process_max_ms', 'setup_p50_ms', 'setup_max_ms'])
+    print()
+    print(f'requests through the test client, {args.rows} jutsus ({args.repeat} per route)')
+    print_table(requests, ['profile', 'route', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Compare two ``bench_routes`` reports, e.g. before and after a change.
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import json
+
+from benchmarks._common import print_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--metric', default='p50_ms', choices=['p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'rps'])
+    args = parser.parse_args()
+
+    with open(args.before) as file:
+        before = json.load(file)
+    with open(args.after) as file:
+        after = json.load(file)
+    print(f"{before.get('commit')} -> {after.get('commit')} ({args.metric})")
+    rows = []
+    for name, result in after['routes'].items():
+        if name not in before['routes']:
+            continue
+        old, new = before['routes'][name][args.metric], result[args.metric]
+        rows.append({
+            'route': name,
+            'before': old,
+            'after': new,
+            'change_pct': (new - old) / old * 100 if old else 0.0,
+            'queries': f"{before['routes'][name].get('queries')} -> {result.get('queries')}",
+        })
+    print_table(rows, ['route', 'before', 'after', 'change_pct', 'queries'])
+
+
+if __name__ == '__main__':
+    main()
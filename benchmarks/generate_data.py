@@ -0,0 +1,39 @@
+"""
+Fill the configured database with a deterministic synthetic catalog, e.g. to
+benchmark a local gunicorn with ``bench_routes --url``.
+
+    python -m benchmarks.generate_data --rows 100k --images 50
+"""
+import argparse
+
+from benchmarks._common import parse_count, seed_images, seed_jutsus, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=parse_count, default='10k', help='10k, 100k, 1m...')
+    parser.add_argument('--images', type=int, default=50, help='Distinct images shared by the jutsus (0 for none).')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--flush', action='store_true', help='Delete every existing jutsu first.')
+    parser.add_argument('--similar', action='store_true', help='Also precompute the similar jutsus (slow on large catalogs).')
+    args = parser.parse_args()
+
+    setup_django()
+    from catalog.models import Jutsu, JutsuNeighbor, JutsuTerm, SimilarityTerm
+    from catalog.similarity import rebuild_similar
+
+    if Jutsu.objects.exists():
+        if not args.flush:
+            parser.error('the database already has jutsus; use --flush to replace them')
+        for model in (JutsuNeighbor, JutsuTerm, SimilarityTerm):
+            model.objects.all()._raw_delete(model.objects.db)
+        Jutsu.objects.all()._raw_delete(Jutsu.objects.db)
+    pool = seed_images(args.images, seed=args.seed) if args.images else ()
+    seed_jutsus(args.rows, seed=args.seed, images=pool)
+    if args.similar:
+        rebuild_similar()
+    print(f'{Jutsu.objects.count()} jutsus, {len(pool)} images')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+"""Project settings with DEBUG off, for benchmarking real servers (no debug toolbar, no query log)."""
+from naruto_jutsu_catalog.settings.base import *  # noqa: F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
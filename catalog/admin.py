@@ -1,6 +1,7 @@
 # catalog/admin.py
 from django.contrib import admin
 from .models import Jutsu
+from .pagination import EstimatedCountPaginator
 
 @admin.register(Jutsu)
 class JutsuAdmin(admin.ModelAdmin):
@@ -42,6 +43,9 @@ class JutsuAdmin(admin.ModelAdmin):
         }),
     )
     list_per_page = 25
+    # Counts of large changelists are estimated; the "N total" link would count the whole table anyway.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def get_element_display(self, obj):
         element_emojis = {
@@ -1,14 +1,45 @@
-from rest_framework import viewsets, permissions, filters
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.utils.text import compress_sequence
+from rest_framework import viewsets, permissions, filters, serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from .autocomplete import suggest
+from .conditional import catalog_etag, catalog_last_modified, jutsu_etag, jutsu_last_modified
+from .facets import facet_counts
 from .models import Jutsu
-from .serializers import JutsuSerializer
+from .pagination import JutsuPagination
+from .serializers import JutsuBulkSerializer, JutsuListSerializer, JutsuSerializer
+from .similarity import similar_jutsus
+from . import bulk, changes, search, transfer
 
+
+class JutsuSearchFilter(filters.SearchFilter):
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or not search.is_available(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+        return search.search_jutsus(queryset, ' '.join(terms))
+
+
+@method_decorator(condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified), name='list')
+@method_decorator(condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified), name='changes')
+@method_decorator(condition(etag_func=jutsu_etag, last_modified_func=jutsu_last_modified), name='retrieve')
+@method_decorator(condition(etag_func=jutsu_etag, last_modified_func=jutsu_last_modified), name='similar')
 class JutsuViewSet(viewsets.ModelViewSet):
     queryset = Jutsu.objects.all().order_by('name')
     serializer_class = JutsuSerializer
+    pagination_class = JutsuPagination
     filter_backends = [
         DjangoFilterBackend,  
-        filters.SearchFilter, 
+        JutsuSearchFilter,
         filters.OrderingFilter 
     ]
 
@@ -16,9 +47,164 @@ class JutsuViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'description']  
     ordering_fields = ['name', 'created_at', 'rank']  
 
+    export_chunk_size = 2000
+    # GET actions served from a read replica (catalog.routers); export streams after the request, from the primary.
+    replica_actions = ('list', 'retrieve', 'similar', 'changes')
+    # Serve list pages from .values() rows through JutsuListSerializer's fast path.
+    fast_list = True
+
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'export', 'similar', 'autocomplete', 'changes']:
             permission_classes = [permissions.AllowAny]
         else:
             permission_classes = [permissions.IsAuthenticated]
-        return [permission() for permission in permission_classes]
\ No newline at end of file
+        return [permission() for permission in permission_classes]
+
+    def wants_facets(self):
+        return self.action == 'list' and self.request.query_params.get('facets') in ('1', 'true')
+
+    def get_facet_query(self):
+        """``(queryset, filters)`` for catalog.facets: the searched list and its classification filters."""
+        queryset = JutsuSearchFilter().filter_queryset(self.request, self.get_queryset(), self)
+        params = self.request.query_params
+        return queryset, {field: params[field] for field in self.filterset_fields if params.get(field)}
+
+    def get_paginated_response(self, data, facets=None):
+        """``?facets=true`` adds the ``facets`` block of catalog.facets to list pages."""
+        response = super().get_paginated_response(data)
+        if self.wants_facets():
+            response.data['facets'] = facets if facets is not None else facet_counts(*self.get_facet_query())
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_list:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).values(*JutsuListSerializer.VALUE_FIELDS)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        The precomputed most similar jutsus (see catalog.similarity), best
+        first, each with its ``similarity`` score.
+        """
+        try:
+            rows = list(similar_jutsus(pk).values(*JutsuListSerializer.VALUE_FIELDS, 'similarity'))
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        if not rows and not Jutsu.objects.filter(pk=pk).exists():
+            raise Http404
+        data = self.get_serializer(rows, many=True).data
+        for item, row in zip(data, rows):
+            item['similarity'] = row['similarity']
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Name suggestions while the user types: ``?q=<text>&limit=<1-20>``,
+        answered from the in-process index of catalog.autocomplete.
+        """
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        return Response({'query': query, 'results': suggest(query, limit)})
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        What changed since a mirror's last sync (see catalog.changes):
+        ``?since=<token>&limit=<1-1000>`` lists the jutsus created, updated and
+        deleted after ``token``, in commit order, with their current data; ask
+        again with ``next`` while ``has_more``. ``since=0`` is the whole
+        catalog. A token older than the compacted tombstones answers 410.
+        """
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', 500))
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'detail': "Os parâmetros since e limit devem ser números inteiros."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            entries, token, has_more = changes.changes_since(since, limit)
+        except changes.TokenExpired:
+            return Response(
+                {'detail': "Token expirado: sincronize o catálogo novamente a partir de since=0."},
+                status=status.HTTP_410_GONE,
+            )
+        payloads = iter(self.get_serializer([row for _, row in entries if row is not None], many=True).data)
+        results = [{
+            'seq': change.id,
+            'operation': change.operation,
+            'id': change.jutsu_id,
+            'jutsu': next(payloads) if row is not None else None,
+        } for change, row in entries]
+        return Response({'since': since, 'next': token, 'has_more': has_more, 'results': results})
+
+    def bulk_max_items(self):
+        return getattr(settings, 'CATALOG_BULK_MAX_ITEMS', 500)
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        """
+        Batches of jutsus in one transaction: POST a list of new jutsus, PATCH
+        a list of partial updates (each with its ``id``) or DELETE a list of
+        ids, up to CATALOG_BULK_MAX_ITEMS items. Either the whole batch is
+        applied or nothing is: an invalid batch answers 400 with the errors of
+        each item, in order; a valid one answers ``results``, also in order
+        (``deleted: false`` for ids that did not exist).
+        """
+        if request.method == 'DELETE':
+            field = serializers.ListField(child=serializers.IntegerField(), max_length=self.bulk_max_items())
+            ids = field.run_validation(request.data)
+            with transaction.atomic():
+                deleted = set(bulk.delete_jutsus(ids))
+            return Response({'results': [{'id': pk, 'deleted': pk in deleted} for pk in ids]})
+
+        instances = None
+        if request.method == 'PATCH':
+            items = request.data if isinstance(request.data, list) else []
+            ids = [item.get('id') if isinstance(item, dict) else None for item in items]
+            found = Jutsu.objects.in_bulk([pk for pk in ids if isinstance(pk, int)])
+            instances = [found.get(pk) if isinstance(pk, int) else None for pk in ids]
+        serializer = JutsuBulkSerializer(
+            instances, data=request.data, many=True, partial=instances is not None,
+            max_length=self.bulk_max_items(), context=self.get_serializer_context(),
+        )
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            if instances is None:
+                jutsus = bulk.create_jutsus(serializer.validated_data)
+            else:
+                jutsus = bulk.update_jutsus(zip(instances, serializer.validated_data))
+        data = JutsuSerializer(jutsus, many=True, context=self.get_serializer_context()).data
+        return Response(
+            {'results': data},
+            status=status.HTTP_201_CREATED if instances is None else status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        The whole filtered catalog as NDJSON (one jutsu per line, in id order),
+        streamed in constant memory. Gzipped when the client accepts it.
+        """
+        rows = transfer.export_rows(self.filter_queryset(self.get_queryset()), chunk_size=self.export_chunk_size)
+        content = (chunk.encode() for chunk in transfer.iter_ndjson(rows))
+        gzipped = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if gzipped:
+            content = compress_sequence(content)
+        response = StreamingHttpResponse(content, content_type='application/x-ndjson; charset=utf-8')
+        if gzipped:
+            response.headers['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
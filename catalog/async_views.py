@@ -0,0 +1,225 @@
+"""
+Async versions of the catalog's read views, served instead of the sync ones
+when the project runs under ASGI (see ``naruto_jutsu_catalog.asgi_urls``).
+
+Reads go through Django's async ORM and independent ones are awaited
+together. Django still runs one request's queries one after another on that
+request's database thread, so the gain is in the server: a slow query parks a
+coroutine instead of holding a worker. Templates are rendered in a thread, as
+Django always does for async views.
+
+The API views only take over JSON ``GET``/``HEAD`` of list and retrieve. DRF
+is sync, so authentication, permissions, throttling, content negotiation and
+filtering still run through the viewset in a thread; writes, ``OPTIONS`` and
+the browsable API are handed to the viewset unchanged.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.utils.decorators import method_decorator
+from django.utils.translation import gettext as _
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from . import search, views
+from .api_views import JutsuViewSet
+from .caching import cache_catalog_page
+from .conditional import aprepare, catalog_etag, catalog_last_modified, jutsu_etag, jutsu_last_modified
+from .facets import afacet_counts
+from .models import Jutsu
+from .pagination import InvalidCursor, aestimate_count, apaginate_keyset
+from .sampling import asample_jutsus
+from .serializers import JutsuListSerializer
+from .similarity import similar_jutsus
+from .stats import adashboard_stats, atotal_jutsus
+
+
+async def _list(queryset):
+    return [item async for item in queryset]
+
+
+class AsyncReadMixin:
+    """Loads what the validators and the page cache read before the decorated ``get`` runs."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        await aprepare(request, kwargs.get('pk'))
+        return await super().dispatch(request, *args, **kwargs)
+
+
+@method_decorator(condition(etag_func=catalog_etag), name='get')
+@method_decorator(cache_catalog_page('jutsu-list'), name='get')
+class JutsuListView(AsyncReadMixin, views.JutsuListView):
+
+    async def get(self, request, *args, **kwargs):
+        if request.GET.get('search'):
+            await sync_to_async(search.is_available)(Jutsu.objects.db)
+        self.object_list = self.get_queryset()
+        self.page_result, self.facets = await asyncio.gather(
+            self.apaginate_queryset(self.object_list, self.get_paginate_by(self.object_list)),
+            afacet_counts(self.get_search_queryset(), self.get_filters()),
+        )
+        return self.render_to_response(self.get_context_data())
+
+    async def apaginate_queryset(self, queryset, page_size):
+        if 'page' in self.request.GET or self.request.GET.get('search'):
+            self.count = await aestimate_count(queryset)
+            paginator, page, _, is_paginated = super().paginate_queryset(queryset, page_size)
+            page.object_list = await _list(page.object_list)
+            return paginator, page, page.object_list, is_paginated
+        try:
+            page = await apaginate_keyset(queryset, page_size, self.request.GET.get('cursor') or None)
+        except InvalidCursor:
+            raise Http404("Cursor inválido.")
+        return (None, page, page.object_list, page.has_other_pages())
+
+    def get_paginator(self, *args, **kwargs):
+        paginator = super().get_paginator(*args, **kwargs)
+        paginator.count, paginator.count_is_estimated = self.count
+        return paginator
+
+    def paginate_queryset(self, queryset, page_size):
+        return self.page_result
+
+    def get_facets(self):
+        return self.facets
+
+
+@method_decorator(condition(etag_func=jutsu_etag), name='get')
+@method_decorator(cache_catalog_page('jutsu-detail'), name='get')
+class JutsuDetailView(AsyncReadMixin, views.JutsuDetailView):
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        try:
+            self.object, self.similar = await asyncio.gather(
+                queryset.aget(pk=self.kwargs['pk']), _list(similar_jutsus(self.kwargs['pk']))
+            )
+        except queryset.model.DoesNotExist:
+            raise Http404(
+                _("No %(verbose_name)s found matching the query") % {'verbose_name': queryset.model._meta.verbose_name}
+            )
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+    def get_similar_jutsus(self):
+        return self.similar
+
+
+@method_decorator(cache_catalog_page('dashboard'), name='get')
+class DashboardView(AsyncReadMixin, views.DashboardView):
+
+    async def get(self, request, *args, **kwargs):
+        self.data = views.dashboard_context(*await asyncio.gather(
+            adashboard_stats(), _list(Jutsu.objects.order_by('-created_at')[:5])
+        ))
+        return self.render_to_response(self.get_context_data(**kwargs))
+
+    def get_context_data(self, **kwargs):
+        context = super(views.DashboardView, self).get_context_data(**kwargs)
+        context.update(self.data)
+        return context
+
+
+@method_decorator(cache_catalog_page('home', timeout=60), name='get')
+class HomeView(AsyncReadMixin, views.HomeView):
+
+    async def get(self, request, *args, **kwargs):
+        self.data = views.home_context(*await asyncio.gather(
+            _list(Jutsu.objects.order_by('-created_at')[:3]),
+            asample_jutsus(**views.FEATURED_SIZES),
+            atotal_jutsus(),
+        ))
+        return self.render_to_response(self.get_context_data(**kwargs))
+
+    def get_context_data(self, **kwargs):
+        context = super(views.HomeView, self).get_context_data(**kwargs)
+        context.update(self.data)
+        return context
+
+
+class JutsuAPIView(View):
+    """Async ``action`` of JutsuViewSet; ``actions``/``initkwargs`` are the router's for the same URL."""
+    action = None
+    actions = None
+    initkwargs = None
+    replica_actions = JutsuViewSet.replica_actions
+    etag_func = last_modified_func = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        cls.sync_view = staticmethod(JutsuViewSet.as_view(dict(cls.actions), basename='jutsu', **cls.initkwargs))
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def fallback(self, request, *args, **kwargs):
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    post = put = patch = delete = options = fallback
+
+    def start(self, request, *args, **kwargs):
+        """JutsuViewSet's dispatch up to the handler, in a thread. Returns an error response, if any."""
+        actions = dict(self.actions, head=self.actions['get'])
+        self.viewset = viewset = JutsuViewSet(basename='jutsu', **self.initkwargs)
+        viewset.action_map = actions
+        for method, action in actions.items():
+            setattr(viewset, method, getattr(viewset, action))
+        viewset.args, viewset.kwargs = args, kwargs
+        viewset.request = viewset.initialize_request(request, *args, **kwargs)
+        viewset.headers = viewset.default_response_headers
+        try:
+            viewset.initial(viewset.request, *args, **kwargs)
+            self.queryset = viewset.filter_queryset(viewset.get_queryset()).values(*JutsuListSerializer.VALUE_FIELDS)
+            self.facet_query = viewset.get_facet_query() if viewset.wants_facets() else None
+        except Exception as exc:
+            return self.finish(viewset.handle_exception(exc))
+
+    def finish(self, response):
+        return self.viewset.finalize_response(self.viewset.request, response)
+
+    async def get(self, request, *args, **kwargs):
+        await aprepare(request, kwargs.get('pk'))
+        error = await sync_to_async(self.start)(request, *args, **kwargs)
+        if error is not None:
+            return error
+        if not isinstance(self.viewset.request.accepted_renderer, JSONRenderer):
+            return await self.fallback(request, *args, **kwargs)
+        respond = condition(etag_func=self.etag_func, last_modified_func=self.last_modified_func)(self.respond)
+        try:
+            response = await respond(self.viewset.request, *args, **kwargs)
+        except Exception as exc:
+            response = self.viewset.handle_exception(exc)
+        return self.finish(response)
+
+
+class JutsuListAPIView(JutsuAPIView):
+    actions = {'get': 'list', 'post': 'create'}
+    initkwargs = {'suffix': 'List', 'detail': False}
+    etag_func, last_modified_func = staticmethod(catalog_etag), staticmethod(catalog_last_modified)
+
+    async def respond(self, request, *args, **kwargs):
+        viewset = self.viewset
+        page = await viewset.paginator.apaginate_queryset(self.queryset, request, view=viewset)
+        if page is not None:
+            facets = await afacet_counts(*self.facet_query) if self.facet_query else None
+            return viewset.get_paginated_response(viewset.get_serializer(page, many=True).data, facets)
+        return Response(viewset.get_serializer(await _list(self.queryset), many=True).data)
+
+
+class JutsuDetailAPIView(JutsuAPIView):
+    actions = {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}
+    initkwargs = {'suffix': 'Instance', 'detail': True}
+    etag_func, last_modified_func = staticmethod(jutsu_etag), staticmethod(jutsu_last_modified)
+
+    async def respond(self, request, *args, **kwargs):
+        try:
+            row = await self.queryset.filter(pk=kwargs['pk']).afirst()
+        except (TypeError, ValueError, ValidationError):
+            row = None
+        if row is None:
+            raise Http404
+        self.viewset.check_object_permissions(request, row)
+        # The list serializer's fast path, for a page of one.
+        return Response(self.viewset.get_serializer([row], many=True).data[0])
@@ -0,0 +1,364 @@
+"""
+In-process typeahead over jutsu names.
+
+A ``NameIndex`` is an immutable snapshot of every name, sorted by its folded
+form (lowercase, no accents, punctuation as spaces), with the positions of
+the names containing each word -- already in name order -- and a trigram
+index over the distinct words. A lookup returns, best first:
+
+1. names starting with the query (binary search over the names);
+2. names with a later word starting with it (the postings of the words the
+   query starts, walked in order until enough names verify);
+3. when that is not enough, names with a word sharing most of the trigrams
+   of the word being typed, so a typo still finds the jutsu.
+
+Committed saves and deletes (catalog.signals) land in a small overlay that
+lookups merge in. Every ``CATALOG_AUTOCOMPLETE_MAX_AGE`` seconds a background
+thread merges the writes of other worker processes into it from the change
+feed (catalog.changes); the snapshot is rebuilt, also in the background, only
+when the overlay grows past ``OVERLAY_LIMIT`` or the feed was compacted past
+its token.
+
+The snapshot is loaded in the background too -- at worker start with
+``warm()`` (gunicorn.conf.py), or on first use. Until it is ready, lookups read
+prefixes and word starts from the table, without typo tolerance.
+
+Readers never lock: they read ``_state`` once, and every change replaces it
+instead of mutating it.
+"""
+import bisect
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Max
+
+from .changes import DELETED, compacted_through
+from .models import Jutsu, JutsuChange
+from .search import strip_accents
+
+logger = logging.getLogger(__name__)
+
+MAX_LIMIT = 20
+OVERLAY_LIMIT = 500
+# Share of a word's trigrams another word needs to count as the same word
+# mistyped (one typo in a six-letter word keeps about two thirds of them),
+# and the shortest word worth matching that way.
+FUZZY_SHARE = 0.6
+FUZZY_MIN_LENGTH = 4
+# Most vocabulary words the last word of a query may start before its names
+# are found by scanning rather than by merging their postings.
+MERGE_LIMIT = 1000
+
+PREFIX, WORD, FUZZY = range(3)
+
+_SEPARATOR_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+_state = None
+_pending = None
+_sequence = 0
+_lock = threading.Lock()
+_rebuilding = False
+
+
+def fold(text):
+    return _SEPARATOR_RE.sub(' ', strip_accents(text)).strip()
+
+
+def trigrams(word, partial=False):
+    """Trigrams of ``word`` padded like pg_trgm's; ``partial`` leaves its end open (the user is still typing)."""
+    padded = f'  {word}' if partial else f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def fuzzy_grams(query):
+    """Trigrams of the word being typed (the last one); empty when it is too short to match fuzzily."""
+    word = query.rsplit(' ', 1)[-1]
+    return trigrams(word, partial=True) if len(word) >= FUZZY_MIN_LENGTH else set()
+
+
+def rank(key, query, grams):
+    """Sort key of the folded name ``key`` as a match for ``query`` (lower is better), or None."""
+    if key.startswith(query):
+        return (PREFIX, 0, key)
+    if f' {query}' in key:
+        return (WORD, 0, key)
+    if grams:
+        shared = max(len(grams & trigrams(word)) for word in key.split(' '))
+        if shared >= len(grams) * FUZZY_SHARE:
+            return (FUZZY, -shared, key)
+    return None
+
+
+def _prefix_range(words, prefix):
+    return bisect.bisect_left(words, prefix), bisect.bisect_left(words, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def _unique(positions):
+    return (position for position, _ in itertools.groupby(positions))
+
+
+class NameIndex:
+
+    def __init__(self, rows):
+        entries = sorted((fold(name), name, pk) for pk, name in rows)
+        self.keys = [key for key, _, _ in entries]
+        self.names = [name for _, name, _ in entries]
+        self.ids = array('q', [pk for _, _, pk in entries])
+        del entries
+        self.postings = {}
+        for position, key in enumerate(self.keys):
+            for word in set(key.split(' ')):
+                posting = self.postings.get(word)
+                if posting is None:
+                    posting = self.postings[word] = array('i')
+                posting.append(position)
+        self.words = sorted(self.postings)
+        self.grams = {}
+        for number, word in enumerate(self.words):
+            for gram in trigrams(word):
+                posting = self.grams.get(gram)
+                if posting is None:
+                    posting = self.grams[gram] = array('i')
+                posting.append(number)
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def search(self, query, limit, skip=frozenset()):
+        """``[(rank, pk, name)]`` of up to ``limit`` matches of the folded ``query``, best first."""
+        keys, ids = self.keys, self.ids
+        found = []
+        for position in range(bisect.bisect_left(keys, query), len(keys)):
+            if len(found) >= limit or not keys[position].startswith(query):
+                break
+            if ids[position] not in skip:
+                found.append(((PREFIX, 0, keys[position]), position))
+        if len(found) < limit:
+            found += self._word_starts(query, limit - len(found), skip)
+        if len(found) < limit:
+            found += self._fuzzy(query, limit - len(found), skip, {position for _, position in found})
+        return [(match, ids[position], self.names[position]) for match, position in found]
+
+    def _word_starts(self, query, limit, skip):
+        *complete, last = query.split(' ')
+        # Every word but the last must be in the name as typed; the last one may be unfinished.
+        streams = []
+        for word in complete:
+            posting = self.postings.get(word)
+            if posting is None:
+                return []
+            streams.append((len(posting), posting))
+        start, end = _prefix_range(self.words, last)
+        if start == end:
+            return []
+        if end - start == 1:
+            streams.append((len(self.postings[self.words[start]]), self.postings[self.words[start]]))
+        elif end - start <= MERGE_LIMIT:
+            size = sum(len(self.postings[word]) for word in self.words[start:end])
+            streams.append((size, _unique(heapq.merge(*(self.postings[word] for word in self.words[start:end])))))
+        else:
+            # Merging that many postings costs more than scanning names that match this often.
+            streams.append((len(self.keys), range(len(self.keys))))
+        keys, ids = self.keys, self.ids
+        found = []
+        for position in min(streams, key=lambda stream: stream[0])[1]:
+            key = keys[position]
+            if f' {query}' in key and not key.startswith(query) and ids[position] not in skip:
+                found.append(((WORD, 0, key), position))
+                if len(found) >= limit:
+                    break
+        return found
+
+    def _fuzzy(self, query, limit, skip, seen):
+        grams = fuzzy_grams(query)
+        if not grams:
+            return []
+        counts = Counter()
+        for gram in grams:
+            counts.update(self.grams.get(gram, ()))
+        needed = len(grams) * FUZZY_SHARE
+        similar = sorted((-shared, number) for number, shared in counts.items() if shared >= needed)
+        found = []
+        for score, words in itertools.groupby(similar, key=lambda item: item[0]):
+            # Names of equally similar words, in name order.
+            merged = _unique(heapq.merge(*(self.postings[self.words[number]] for _, number in words)))
+            for position in merged:
+                if position not in seen and self.ids[position] not in skip:
+                    seen.add(position)
+                    found.append(((FUZZY, score, self.keys[position]), position))
+                    if len(found) >= limit:
+                        return found
+        return found
+
+
+class _State:
+    """
+    An index plus the names committed since it was built: ``{pk: (sequence,
+    name or None)}``; ``token`` is the last change feed entry merged in.
+    """
+
+    def __init__(self, index, overlay, token, synced_at=None):
+        self.index = index
+        self.overlay = overlay
+        self.skip = frozenset(overlay)
+        self.token = token
+        self.synced_at = time.monotonic() if synced_at is None else synced_at
+
+
+def _max_age():
+    return getattr(settings, 'CATALOG_AUTOCOMPLETE_MAX_AGE', 300)
+
+
+def _in_background():
+    return getattr(settings, 'CATALOG_AUTOCOMPLETE_IN_BACKGROUND', True)
+
+
+def _rebuild():
+    global _state, _pending
+    with _lock:
+        started = _sequence
+        if _state is None:
+            _pending = {}
+    try:
+        # Taken first: whatever commits during the scan is merged again by the next sync.
+        token = JutsuChange.objects.aggregate(last=Max('id'))['last'] or 0
+        index = NameIndex(Jutsu.objects.order_by().values_list('id', 'name').iterator(chunk_size=5000))
+        with _lock:
+            overlay = _state.overlay if _state is not None else _pending
+            # Keep what the new snapshot may have missed.
+            _state = _State(index, {pk: entry for pk, entry in overlay.items() if entry[0] > started}, token)
+    finally:
+        with _lock:
+            _pending = None
+
+
+def _sync():
+    """Merge the writes committed since the state's token by every process, or rebuild."""
+    global _state, _sequence
+    state = _state
+    if state.token < compacted_through():
+        return _rebuild()
+    with _lock:
+        started = _sequence
+    changes = list(
+        JutsuChange.objects.filter(id__gt=state.token).order_by('id')
+        .values_list('id', 'jutsu_id', 'operation')[:OVERLAY_LIMIT + 1]
+    )
+    if len(state.overlay) + len(changes) > OVERLAY_LIMIT:
+        return _rebuild()
+    live = [pk for _, pk, operation in changes if operation != DELETED]
+    names = dict(Jutsu.objects.filter(pk__in=live).values_list('id', 'name')) if live else {}
+    with _lock:
+        overlay = dict(_state.overlay)
+        for _, pk, _ in changes:
+            # A write recorded by this process after the read is newer than the feed's.
+            if overlay.get(pk, (0,))[0] <= started:
+                _sequence += 1
+                overlay[pk] = (_sequence, names.get(pk))
+        _state = _State(_state.index, overlay, changes[-1][0] if changes else state.token)
+
+
+def _run(job):
+    global _rebuilding
+    try:
+        job()
+    except Exception:
+        logger.exception("Falha ao atualizar o índice de sugestões de jutsus")
+    finally:
+        with _lock:
+            _rebuilding = False
+        close_old_connections()
+
+
+def _start(job):
+    global _rebuilding
+    with _lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+    threading.Thread(target=_run, args=(job,), name='catalog-autocomplete', daemon=True).start()
+
+
+def warm():
+    """Load the index in the background, so the first lookups of a worker do not wait for it."""
+    if _state is None:
+        _start(_rebuild)
+
+
+def load():
+    """Load the index in this thread."""
+    _rebuild()
+
+
+def current_state():
+    """The state to read, or None while it loads; brought up to date in the background."""
+    state = _state
+    if state is None:
+        if not _in_background():
+            load()
+            return _state
+        warm()
+        return None
+    if len(state.overlay) > OVERLAY_LIMIT:
+        _start(_rebuild)
+    elif time.monotonic() - state.synced_at > _max_age():
+        _start(_sync)
+    return state
+
+
+def _from_database(text, limit):
+    """Names starting with ``text``, then names with a word starting with it, read from the table."""
+    jutsus = Jutsu.objects.order_by('name', 'pk')
+    found = list(jutsus.filter(name__istartswith=text).values_list('id', 'name')[:limit])
+    if len(found) < limit:
+        found += jutsus.filter(name__icontains=f' {text}').exclude(
+            pk__in=[pk for pk, _ in found]
+        ).values_list('id', 'name')[:limit - len(found)]
+    return [{'id': pk, 'name': name} for pk, name in found]
+
+
+def suggest(query, limit=10):
+    """Up to ``limit`` ``{'id', 'name'}`` suggestions for what the user has typed so far."""
+    text, query = query, fold(query)
+    limit = max(1, min(limit, MAX_LIMIT))
+    if not query:
+        return []
+    state = current_state()
+    if state is None:
+        return _from_database(text.strip(), limit)
+    matches = state.index.search(query, limit, state.skip)
+    if state.overlay:
+        grams = fuzzy_grams(query)
+        for pk, (_, name) in state.overlay.items():
+            match = rank(fold(name), query, grams) if name is not None else None
+            if match is not None:
+                matches.append((match, pk, name))
+        matches.sort(key=lambda item: item[0])
+    return [{'id': pk, 'name': name} for _, pk, name in matches[:limit]]
+
+
+def record(pk, name=None):
+    """Apply a committed save (``name``) or delete (``None``) to the loaded index, if any."""
+    global _state, _pending, _sequence
+    with _lock:
+        _sequence += 1
+        if _state is not None:
+            _state = _State(_state.index, {**_state.overlay, pk: (_sequence, name)}, _state.token, _state.synced_at)
+        elif _pending is not None:
+            _pending[pk] = (_sequence, name)
+
+
+def reset():
+    """Drop the index; the next lookup loads it again."""
+    global _state
+    with _lock:
+        _state = None
@@ -0,0 +1,108 @@
+"""
+Batch writes behind the bulk API actions.
+
+``bulk_create``, ``bulk_update`` and a raw delete skip the model signals, so
+each function here does for the whole batch what catalog.signals does per
+jutsu: counters, catalog revision, change feed, sampling buckets, similar-jutsu
+lists, autocomplete and media cleanup. Call them inside a transaction; the work that
+belongs after the commit is queued with ``on_commit`` like the signals do.
+"""
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import autocomplete, changes, media, sampling, similarity, stats
+from .models import Jutsu, JutsuNeighbor
+from .versioning import bump_revision
+
+
+def _classification(jutsu):
+    return {field: getattr(jutsu, field) for field in Jutsu.CLASSIFICATION_FIELDS}
+
+
+def _track(classifications, names, operation, using):
+    """
+    Bookkeeping for ``classifications`` ``[(old, new)]`` and ``names``
+    ``{pk: name or None}`` of the jutsus written by ``operation``.
+    """
+    if not names:
+        return
+    stats.record_changes(classifications, using)
+    bump_revision(using)
+    changes.record(names, operation, using)
+    buckets = set()
+    for previous, current in classifications:
+        if previous != current:
+            buckets |= sampling.buckets_for(previous) | sampling.buckets_for(current)
+    if buckets:
+        transaction.on_commit(lambda: sampling.invalidate(buckets), using=using)
+
+    def record():
+        for pk, name in names.items():
+            autocomplete.record(pk, name)
+
+    transaction.on_commit(record, using=using)
+
+
+def create_jutsus(rows, using=DEFAULT_DB_ALIAS):
+    """Insert the validated ``rows`` with one statement; returns the new jutsus, with their ids."""
+    jutsus = Jutsu.objects.using(using).bulk_create([Jutsu(**row) for row in rows])
+    _track(
+        [(None, _classification(jutsu)) for jutsu in jutsus],
+        {jutsu.pk: jutsu.name for jutsu in jutsus},
+        changes.CREATED,
+        using,
+    )
+    similarity.schedule_refresh(changed=[jutsu.pk for jutsu in jutsus], using=using)
+    return jutsus
+
+
+def update_jutsus(updates, using=DEFAULT_DB_ALIAS):
+    """Apply ``[(jutsu, validated data)]`` with one statement; returns the updated jutsus."""
+    jutsus, previous, fields = [], [], set()
+    now = timezone.now()
+    for jutsu, data in updates:
+        previous.append(_classification(jutsu))
+        for field, value in data.items():
+            setattr(jutsu, field, value)
+        # bulk_update() does not run auto_now.
+        jutsu.updated_at = now
+        fields.update(data)
+        jutsus.append(jutsu)
+    if not jutsus:
+        return jutsus
+    Jutsu.objects.using(using).bulk_update(jutsus, sorted(fields) + ['updated_at'])
+    _track(
+        [(old, _classification(jutsu)) for old, jutsu in zip(previous, jutsus)],
+        {jutsu.pk: jutsu.name for jutsu in jutsus},
+        changes.UPDATED,
+        using,
+    )
+    similarity.schedule_refresh(changed=[jutsu.pk for jutsu in jutsus], using=using)
+    return jutsus
+
+
+def delete_jutsus(ids, using=DEFAULT_DB_ALIAS):
+    """Delete the jutsus ``ids`` with one statement (their similar lists first); returns the ids deleted."""
+    rows = list(
+        Jutsu.objects.using(using)
+        .filter(pk__in=ids)
+        .values('pk', 'name', 'image', 'image_variants', *Jutsu.CLASSIFICATION_FIELDS)
+    )
+    deleted = [row['pk'] for row in rows]
+    if not deleted:
+        return deleted
+    neighbors = JutsuNeighbor.objects.using(using)
+    # The lists that include these jutsus lose them; they get refilled after the commit.
+    stale = set(neighbors.filter(neighbor_id__in=deleted).values_list('jutsu_id', flat=True)) - set(deleted)
+    neighbors.filter(Q(jutsu_id__in=deleted) | Q(neighbor_id__in=deleted)).delete()
+    Jutsu.objects.using(using).filter(pk__in=deleted)._raw_delete(using)
+    _track(
+        [({field: row[field] for field in Jutsu.CLASSIFICATION_FIELDS}, None) for row in rows],
+        dict.fromkeys(deleted),
+        changes.DELETED,
+        using,
+    )
+    media.enqueue_jutsu_files([(row['image'], row['image_variants']) for row in rows], using)
+    similarity.schedule_refresh(stale=stale, deleted=deleted, using=using)
+    return deleted
@@ -0,0 +1,167 @@
+"""
+Whole-page cache for the public catalog views (off when
+``CATALOG_PAGE_CACHE_TIMEOUT`` is 0).
+
+Keys embed the catalog revision (bumped in the same transaction as every jutsu
+write) and the code version, so a write or a deploy makes every old entry
+unreachable without deleting anything. Authenticated users and requests with
+pending flash messages always get a fresh render.
+
+When an entry is missing, only the worker that wins ``cache.add()`` on the
+key's lock renders it. The others serve the previous revision's copy, if there
+is one, or wait briefly for the winner before rendering themselves.
+"""
+import asyncio
+import functools
+import hashlib
+import time
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .conditional import current_revision
+from .instrumentation import timed
+from .versioning import code_version
+
+LOCK_TIMEOUT = 30
+WAIT_STEP = 0.05
+
+
+def _cache():
+    return caches[getattr(settings, 'CATALOG_PAGE_CACHE', 'default')]
+
+
+def _bypass(request):
+    if not getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 300):
+        return True
+    if request.method not in ('GET', 'HEAD'):
+        return True
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return True
+    messages = getattr(request, '_messages', None)
+    return messages is not None and len(messages) > 0
+
+
+def _base_key(name, request):
+    target = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'catalog:page:{name}:{target}'
+
+
+def _freeze(response):
+    return {
+        'content': response.content,
+        'status': response.status_code,
+        'headers': {key: value for key, value in response.items() if key not in ('Set-Cookie', 'Vary')},
+    }
+
+
+def _thaw(entry):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for key, value in entry['headers'].items():
+        response[key] = value
+    return response
+
+
+def _key(name, request):
+    base = _base_key(name, request)
+    revision, changed_at = current_revision(request)
+    # changed_at guards against revision numbers reused after a database restore.
+    return base, f'{base}:{revision}:{changed_at.timestamp() if changed_at else 0}:{code_version()}'
+
+
+def _ttl(timeout):
+    return timeout if timeout is not None else getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 300)
+
+
+def _cacheable(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def cache_catalog_page(name, timeout=None):
+    """
+    Decorator for a view's ``get``; ``name`` namespaces the keys of that view.
+    Async views must call ``conditional.aprepare()`` first (see catalog.async_views).
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if await sync_to_async(_bypass)(request):
+                    return await view(request, *args, **kwargs)
+
+                cache = _cache()
+                base, key = _key(name, request)
+                entry = await cache.aget(key)
+                if entry is not None:
+                    return _thaw(entry)
+
+                lock = f'{base}:lock'
+                if not await cache.aadd(lock, 1, LOCK_TIMEOUT):
+                    stale = await cache.aget(f'{base}:latest')
+                    if stale is not None:
+                        return _thaw(stale)
+                    deadline = time.monotonic() + getattr(settings, 'CATALOG_PAGE_CACHE_WAIT', 2)
+                    while time.monotonic() < deadline:
+                        await asyncio.sleep(WAIT_STEP)
+                        entry = await cache.aget(key)
+                        if entry is not None:
+                            return _thaw(entry)
+                    return await view(request, *args, **kwargs)
+
+                try:
+                    response = await view(request, *args, **kwargs)
+                    if hasattr(response, 'render') and callable(response.render):
+                        with timed('render'):
+                            response = await sync_to_async(response.render)()
+                    if _cacheable(response):
+                        entry = _freeze(response)
+                        await cache.aset_many({key: entry, f'{base}:latest': entry}, _ttl(timeout))
+                    return response
+                finally:
+                    await cache.adelete(lock)
+
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if _bypass(request):
+                return view(request, *args, **kwargs)
+
+            cache = _cache()
+            base, key = _key(name, request)
+            entry = cache.get(key)
+            if entry is not None:
+                return _thaw(entry)
+
+            lock = f'{base}:lock'
+            if not cache.add(lock, 1, LOCK_TIMEOUT):
+                stale = cache.get(f'{base}:latest')
+                if stale is not None:
+                    return _thaw(stale)
+                deadline = time.monotonic() + getattr(settings, 'CATALOG_PAGE_CACHE_WAIT', 2)
+                while time.monotonic() < deadline:
+                    time.sleep(WAIT_STEP)
+                    entry = cache.get(key)
+                    if entry is not None:
+                        return _thaw(entry)
+                return view(request, *args, **kwargs)
+
+            try:
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render') and callable(response.render):
+                    with timed('render'):
+                        response = response.render()
+                if _cacheable(response):
+                    entry = _freeze(response)
+                    cache.set_many({key: entry, f'{base}:latest': entry}, _ttl(timeout))
+                return response
+            finally:
+                cache.delete(lock)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,144 @@
+"""
+Change feed for catalog mirrors: ``/api/jutsus/changes/?since=<token>``.
+
+``JutsuChange`` holds the last write to each jutsu -- created, updated or
+deleted -- numbered by its ``id``. A write replaces the jutsu's entry with a
+new one, so the log is compacted as it goes (one row per jutsu ever created)
+and reading it from 0 yields the whole catalog. Entries are written after
+``bump_revision`` in the same transaction: the revision row stays locked until
+the commit, so numbers are handed out in commit order and a mirror never sees
+a number before an earlier one commits.
+
+Every entry but a tombstone stands for the jutsu's current row, so a mirror
+upserts it whatever the operation; ``refreshed`` means only its similar list
+or image variants changed.
+
+A deleted jutsu leaves a tombstone, which ``compact_changes()`` (``manage.py
+compact_changes``) drops once it is older than CATALOG_CHANGES_RETENTION_DAYS.
+Tokens older than the last dropped tombstone are refused: that mirror has to
+load the catalog again from 0, which is always valid since the log keeps one
+entry per live jutsu.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import CatalogRevision, Jutsu, JutsuChange
+from .serializers import JutsuListSerializer
+from .versioning import bump_revision
+
+CREATED, UPDATED, DELETED, REFRESHED = JutsuChange.Operations.values
+MAX_LIMIT = 1000
+BATCH_SIZE = 2000
+
+
+class TokenExpired(Exception):
+    """The token predates compacted tombstones; the mirror has to resync from 0."""
+
+
+def _chunks(values, size=500):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def record(ids, operation, using=DEFAULT_DB_ALIAS):
+    """Make ``operation`` the last change of the jutsus ``ids``; call it after ``bump_revision``."""
+    ids = list(ids)
+    if not ids:
+        return
+    changes = JutsuChange.objects.using(using)
+    for chunk in _chunks(ids):
+        changes.filter(jutsu_id__in=chunk).delete()
+    changes.bulk_create([JutsuChange(jutsu_id=pk, operation=operation) for pk in ids], batch_size=BATCH_SIZE)
+
+
+def record_refreshed(ids, written=(), using=DEFAULT_DB_ALIAS):
+    """
+    Record that what is derived from the jutsus ``ids`` (their similar lists or
+    image variants) changed; call it after ``bump_revision``. Those among
+    ``written``, whose own write led to it, keep their created or updated
+    entry, moved to the end of the feed; the others get a ``refreshed`` one.
+    """
+    written = set(written) & set(ids)
+    operations = dict(
+        JutsuChange.objects.using(using).filter(jutsu_id__in=written).values_list('jutsu_id', 'operation')
+    ) if written else {}
+    for operation in (CREATED, UPDATED):
+        record([pk for pk in ids if operations.get(pk) == operation], operation, using)
+    record([pk for pk in ids if operations.get(pk) not in (CREATED, UPDATED)], REFRESHED, using)
+
+
+def compacted_through(using=None):
+    return CatalogRevision.objects.using(using).filter(pk=1).values_list(
+        'changes_compacted_through', flat=True
+    ).first() or 0
+
+
+def _set_compacted_through(token, using):
+    CatalogRevision.objects.using(using).filter(pk=1).update(changes_compacted_through=token)
+
+
+def changes_since(since, limit=500, using=None):
+    """
+    ``(entries, token, has_more)``: up to ``limit`` changes after ``since``, in
+    commit order, as ``(change, row)`` with the jutsu's ``.values(*fields)``
+    row (None for deletions); ``token`` is the one to ask for next.
+    """
+    # From 0 is the whole catalog, compacted or not.
+    if since and since < compacted_through(using):
+        raise TokenExpired
+    limit = max(1, min(limit, MAX_LIMIT))
+    changes = list(JutsuChange.objects.using(using).filter(id__gt=since).order_by('id')[:limit + 1])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    live = [change.jutsu_id for change in changes if change.operation != DELETED]
+    rows = {
+        row['id']: row
+        for row in Jutsu.objects.using(using).filter(pk__in=live).values(*JutsuListSerializer.VALUE_FIELDS)
+    } if live else {}
+    entries = []
+    for change in changes:
+        row = rows.get(change.jutsu_id)
+        # Deleted since this page was read: its tombstone comes later in the feed.
+        if change.operation != DELETED and row is None:
+            continue
+        entries.append((change, row))
+    return entries, changes[-1].id if changes else since, has_more
+
+
+def compact_changes(days=None, using=DEFAULT_DB_ALIAS):
+    """Drop the tombstones older than ``days``; returns how many were dropped."""
+    if days is None:
+        days = getattr(settings, 'CATALOG_CHANGES_RETENTION_DAYS', 30)
+    tombstones = JutsuChange.objects.using(using).filter(operation=DELETED)
+    with transaction.atomic(using=using):
+        cutoff = timezone.now() - timedelta(days=days)
+        last = tombstones.filter(changed_at__lt=cutoff).aggregate(last=Max('id'))['last']
+        if last is None:
+            return 0
+        dropped, _ = tombstones.filter(id__lte=last).delete()
+        _set_compacted_through(max(last, compacted_through(using)), using)
+    return dropped
+
+
+def rebuild_changes(using=DEFAULT_DB_ALIAS):
+    """
+    Start the feed over after writes that skipped it (``bulk_create``): one
+    created entry per jutsu, and every earlier token expired.
+    """
+    changes = JutsuChange.objects.using(using)
+    with transaction.atomic(using=using):
+        # Taken first, the revision lock holds off the writers until the new feed commits.
+        bump_revision(using)
+        last = changes.aggregate(last=Max('id'))['last'] or 0
+        changes.all().delete()
+        ids = Jutsu.objects.using(using).order_by('pk').values_list('pk', flat=True)
+        changes.bulk_create(
+            (JutsuChange(jutsu_id=pk, operation=CREATED) for pk in ids.iterator(chunk_size=BATCH_SIZE)),
+            batch_size=BATCH_SIZE,
+        )
+        _set_compacted_through(last, using)
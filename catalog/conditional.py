@@ -0,0 +1,86 @@
+"""
+Validators for ``django.views.decorators.http.condition``.
+
+They are computed with one indexed query before the view runs, so a matching
+``If-None-Match``/``If-Modified-Since`` returns 304 without rendering a
+template or serializing anything. ETags cover everything a response can vary
+on: the data, the deployed code, the viewer, the negotiated format and the host
+(used in absolute URLs).
+"""
+import hashlib
+
+from django.core.exceptions import ValidationError
+
+from .models import Jutsu
+from .versioning import acatalog_revision, catalog_revision, code_version
+
+
+def _etag(request, *parts):
+    user = getattr(request, 'user', None)
+    viewer = user.pk if user is not None and user.is_authenticated else 'anon'
+    key = ':'.join(str(part) for part in (
+        code_version(), viewer, request.META.get('HTTP_ACCEPT', ''), request.get_host(), *parts
+    ))
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def current_revision(request):
+    """The catalog revision, read at most once per request."""
+    if not hasattr(request, '_catalog_revision'):
+        request._catalog_revision = catalog_revision()
+    return request._catalog_revision
+
+
+# What a jutsu's responses show: its fields, its similar list (catalog.similarity)
+# and its image variants (catalog.images).
+VERSION_FIELDS = ('updated_at', 'similar_updated_at', 'variants_updated_at')
+
+
+def _versions(request, pk):
+    """The jutsu's VERSION_FIELDS, read at most once per request; None if it does not exist."""
+    if getattr(request, '_jutsu_versions', (None,))[0] != pk:
+        try:
+            versions = Jutsu.objects.filter(pk=pk).values_list(*VERSION_FIELDS).first()
+        except (TypeError, ValueError, ValidationError):
+            # Not a valid pk (``/api/jutsus/abc/``): no validators, and the view answers 404.
+            versions = None
+        request._jutsu_versions = (pk, versions)
+    return request._jutsu_versions[1]
+
+
+async def aprepare(request, pk=None):
+    """
+    For async views: load everything the validators (and the page cache) read
+    -- the viewer, the revision and the jutsu's versions -- so they can then
+    run inside the event loop without a blocking query.
+    """
+    request.user = await request.auser()
+    if not hasattr(request, '_catalog_revision'):
+        request._catalog_revision = await acatalog_revision()
+    if pk is not None and getattr(request, '_jutsu_versions', (None,))[0] != pk:
+        try:
+            versions = await Jutsu.objects.filter(pk=pk).values_list(*VERSION_FIELDS).afirst()
+        except (TypeError, ValueError, ValidationError):
+            versions = None
+        request._jutsu_versions = (pk, versions)
+
+
+def catalog_etag(request, *args, **kwargs):
+    revision, changed_at = current_revision(request)
+    return _etag(request, 'catalog', revision, changed_at.isoformat() if changed_at else '')
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return current_revision(request)[1]
+
+
+def jutsu_etag(request, pk=None, *args, **kwargs):
+    versions = _versions(request, pk)
+    if versions is None:
+        return None
+    return _etag(request, 'jutsu', pk, *(version.isoformat() if version else '' for version in versions))
+
+
+def jutsu_last_modified(request, pk=None, *args, **kwargs):
+    versions = _versions(request, pk)
+    return max(filter(None, versions)) if versions is not None else None
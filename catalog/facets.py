@@ -0,0 +1,90 @@
+"""
+Faceted counts for the jutsu lists: how many jutsus each element, type and
+rank would show, given the current search and the other filters.
+
+A facet ignores its own filter (picking another element replaces the current
+one), so each facet is counted under different conditions. All of them come out
+of one aggregate query with a conditional ``COUNT`` per value. A facet that
+nothing constrains -- no search and no other filter -- is read from the
+dashboard counters (catalog.stats) instead of counting the whole table.
+"""
+from functools import reduce
+from operator import or_
+
+from django.db.models import Count, Q
+
+from .models import Jutsu
+from .stats import astored_stats, stored_stats
+
+FACET_FIELDS = Jutsu.CLASSIFICATION_FIELDS
+
+
+def _choices(field):
+    return Jutsu._meta.get_field(field).choices
+
+
+def _plan(queryset, filters):
+    """
+    ``(aggregates, where, counted)``: the conditional counts to run over
+    ``queryset`` filtered by ``where``, and the facets they cover; the other
+    facets come from the counters.
+    """
+    # A queryset without a WHERE clause is the whole catalog: nothing but the filters constrains it.
+    searched = bool(queryset.query.where)
+    conditions = {}
+    for field in FACET_FIELDS:
+        others = {other: value for other, value in filters.items() if other != field}
+        if searched or others:
+            conditions[field] = others
+    aggregates = {
+        f'{field}_{index}': Count('pk', filter=Q(**{field: value}, **others))
+        for field, others in conditions.items()
+        for index, (value, _) in enumerate(_choices(field))
+    }
+    # Only rows that some facet counts need to be read (an unconstrained facet needs them all).
+    where = Q()
+    if conditions and all(conditions.values()):
+        where = reduce(or_, (Q(**others) for others in conditions.values()))
+    return aggregates, where, list(conditions)
+
+
+def _assemble(counted, row, stats):
+    facets = {}
+    for field in FACET_FIELDS:
+        facets[field] = [
+            {
+                'value': value,
+                'label': str(label),
+                'count': row[f'{field}_{index}'] if field in counted else stats[(field, value)],
+            }
+            for index, (value, label) in enumerate(_choices(field))
+        ]
+    return facets
+
+
+def facet_labels():
+    """``facet_counts()``'s structure with every ``count`` None, for pages that load the counts separately."""
+    return {
+        field: [{'value': value, 'label': str(label), 'count': None} for value, label in _choices(field)]
+        for field in FACET_FIELDS
+    }
+
+
+def facet_counts(queryset, filters):
+    """
+    ``{field: [{'value', 'label', 'count'}]}`` for every classification field,
+    in the order of its choices. ``queryset`` is the list before the
+    classification filters (searched or not); ``filters`` maps the filtered
+    fields to their values.
+    """
+    aggregates, where, counted = _plan(queryset, filters)
+    row = queryset.filter(where).order_by().aggregate(**aggregates) if aggregates else {}
+    stats = stored_stats(queryset.db) if len(counted) < len(FACET_FIELDS) else {}
+    return _assemble(counted, row, stats)
+
+
+async def afacet_counts(queryset, filters):
+    aggregates, where, counted = _plan(queryset, filters)
+    row = await queryset.filter(where).order_by().aaggregate(**aggregates) if aggregates else {}
+    stats = await astored_stats(queryset.db) if len(counted) < len(FACET_FIELDS) else {}
+    return _assemble(counted, row, stats)
@@ -0,0 +1,204 @@
+"""
+Resized WebP/AVIF/JPEG derivatives of ``Jutsu.image``.
+
+Variants are rendered by a worker process after the saving transaction
+commits and recorded in ``Jutsu.image_variants``:
+
+    {'source': 'jutsu_images/x.png', 'width': 2000, 'height': 1500,
+     'variants': [{'name': ..., 'format': 'webp', 'width': 320, 'height': 240}, ...]}
+
+A manifest whose ``source`` differs from the current image is stale; the
+``jutsu_image`` template tag serves the original meanwhile and schedules a
+regeneration, so existing images are converted lazily. An image that cannot be
+read gets ``{'source': ..., 'error': ...}``: it is current, so the tag serves
+the original without queueing it again (``generate_image_variants --force``
+retries it).
+
+The manifest moves ``Jutsu.variants_updated_at``, not ``updated_at``, and
+leaves a ``refreshed`` entry in the change feed: the jutsu itself did not change.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANT_DIR = 'jutsu_images/variants'
+CONTENT_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+QUALITY = {'avif': 60, 'webp': 80, 'jpeg': 82}
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _workers():
+    return getattr(settings, 'CATALOG_IMAGE_WORKERS', 2)
+
+
+def variant_formats():
+    """Best format first; JPEG is always last as the ``<img>`` fallback."""
+    Image.init()
+    formats = []
+    if 'AVIF' in Image.SAVE:
+        formats.append('avif')
+    if features.check('webp'):
+        formats.append('webp')
+    return formats + ['jpeg']
+
+
+def manifest_is_current(jutsu):
+    manifest = jutsu.image_variants or {}
+    return manifest.get('source', '') == (jutsu.image.name or '')
+
+
+def render_variants(source, stem):
+    """Write every width/format of the open ``source`` image to storage and return the manifest."""
+    image = ImageOps.exif_transpose(source)
+    widths = [width for width in VARIANT_WIDTHS if width < image.width] or [image.width]
+    variants = []
+    try:
+        for width in widths:
+            resized = image.copy()
+            resized.thumbnail((width, image.height), Image.LANCZOS)
+            for fmt in variant_formats():
+                frame = resized
+                if fmt == 'jpeg' and frame.mode != 'RGB':
+                    frame = frame.convert('RGB')
+                elif frame.mode not in ('RGB', 'RGBA'):
+                    frame = frame.convert('RGBA')
+                buffer = BytesIO()
+                frame.save(buffer, format=fmt.upper(), quality=QUALITY[fmt])
+                name = default_storage.save(
+                    f'{VARIANT_DIR}/{stem}-{width}w.{fmt}', ContentFile(buffer.getvalue())
+                )
+                variants.append({'name': name, 'format': fmt, 'width': resized.width, 'height': resized.height})
+    except BaseException:
+        # A partial set is useless; drop what was written before the failure.
+        for variant in variants:
+            default_storage.delete(variant['name'])
+        raise
+    return {'width': image.width, 'height': image.height, 'variants': variants}
+
+
+def generate_variants(pk, using=DEFAULT_DB_ALIAS, force=False):
+    """(Re)build the derivatives of one jutsu; does nothing when they are already current."""
+    from . import changes, media
+    from .models import Jutsu
+    from .versioning import bump_revision
+
+    jutsu = Jutsu.objects.using(using).filter(pk=pk).only('image', 'image_variants').first()
+    if jutsu is None or (manifest_is_current(jutsu) and not force):
+        return
+    manifest = {}
+    if jutsu.image:
+        try:
+            with default_storage.open(jutsu.image.name) as file, Image.open(file) as source:
+                manifest = render_variants(source, PurePosixPath(jutsu.image.name).stem)
+        except (OSError, Image.DecompressionBombError) as error:
+            # Missing, truncated or not an image: recorded so that it is not queued on every view.
+            logger.warning("Não foi possível gerar as variantes da imagem %s: %s", jutsu.image.name, error)
+            manifest = {'error': str(error)}
+        manifest['source'] = jutsu.image.name
+    # Only record the result if the image was not replaced while we were rendering.
+    same_image = Q(image=jutsu.image.name) if jutsu.image else Q(image__isnull=True) | Q(image='')
+    with transaction.atomic(using=using):
+        updated = Jutsu.objects.using(using).filter(same_image, pk=pk).update(
+            image_variants=manifest, variants_updated_at=timezone.now()
+        )
+        if updated:
+            bump_revision(using)
+            changes.record_refreshed([pk], using=using)
+            superseded = jutsu.image_variants or {}
+            # Variants of an earlier image go with it; those of this image were just replaced.
+            source = superseded.get('source', '') if superseded.get('source') != jutsu.image.name else ''
+            media.enqueue(media.variant_names(superseded), source=source, using=using)
+        else:
+            media.enqueue(media.variant_names(manifest), using=using)
+
+
+def _init_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'naruto_jutsu_catalog.settings.dev')
+    import django
+    django.setup()
+
+
+def _run_job(pk, using):
+    try:
+        generate_variants(pk, using)
+    finally:
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=_workers(),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+        )
+    return _executor
+
+
+def _job_done(key, future):
+    with _lock:
+        _pending.discard(key)
+    if future.exception() is not None:
+        logger.error("Falha ao gerar variantes da imagem do jutsu %s", key[1], exc_info=future.exception())
+
+
+def schedule_variants(jutsu, using=DEFAULT_DB_ALIAS):
+    """Queue a regeneration for after the current transaction commits (deduplicated per jutsu)."""
+    key = (using, jutsu.pk)
+
+    def submit():
+        with _lock:
+            if key in _pending:
+                return
+            _pending.add(key)
+        if _workers() <= 0:
+            try:
+                generate_variants(jutsu.pk, using)
+            finally:
+                with _lock:
+                    _pending.discard(key)
+            return
+        _get_executor().submit(_run_job, jutsu.pk, using).add_done_callback(
+            lambda future: _job_done(key, future)
+        )
+
+    transaction.on_commit(submit, using=using)
+
+
+def media_url(name):
+    """``default_storage.url(name)``, computed directly for the local file storage."""
+    if isinstance(default_storage, FileSystemStorage) and not {'.', '..'} & set(name.split('/')):
+        return default_storage.base_url + filepath_to_uri(name).lstrip('/')
+    return default_storage.url(name)
+
+
+def srcsets(jutsu):
+    """``{format: 'url 320w, url 640w'}`` from the manifest, without touching storage."""
+    if not jutsu.image or not manifest_is_current(jutsu):
+        return {}
+    grouped = {}
+    for variant in jutsu.image_variants.get('variants', []):
+        grouped.setdefault(variant['format'], []).append(
+            f"{default_storage.url(variant['name'])} {variant['width']}w"
+        )
+    return {fmt: ', '.join(entries) for fmt, entries in grouped.items()}
@@ -0,0 +1,239 @@
+"""
+Always-on request instrumentation.
+
+``InstrumentationMiddleware`` counts and times the SQL of every request
+(through an execute wrapper installed on each connection), collects the
+``timed()`` sections recorded while handling it (template rendering,
+serialization) and:
+
+* sends them back in a ``Server-Timing`` header,
+* aggregates them into per-route histograms, served in the Prometheus text
+  format by ``metrics_view``,
+* logs queries slower than ``CATALOG_SLOW_QUERY_MS`` with the view that sent them.
+
+Metrics live in the memory of each worker process, like a Prometheus client
+without a multiprocess collector: scrape the workers individually or run one
+per target.
+"""
+import contextlib
+import contextvars
+import hmac
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_current = contextvars.ContextVar('catalog_request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('request', 'queries', 'db_time', 'sections', 'slow')
+
+    def __init__(self, request):
+        self.request = request
+        self.queries = 0
+        self.db_time = 0.0
+        self.sections = {}
+        self.slow = _slow_query_threshold()
+
+    def add(self, name, seconds):
+        self.sections[name] = self.sections.get(name, 0.0) + seconds
+
+    def view_name(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return (match.view_name or match._func_path) if match is not None else 'unmatched'
+
+
+@contextlib.contextmanager
+def timed(name):
+    """Add the duration of the block to section ``name`` of the current request, if any."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - start)
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, buckets, labels):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self.lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self.series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in zip(self.labels, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}'
+            yield f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}'
+            yield f'{self.name}_sum{{{label_text}}} {total:.6f}'
+            yield f'{self.name}_count{{{label_text}}} {count}'
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram(
+    'catalog_request_duration_seconds', 'Tempo total de resposta por rota.',
+    DURATION_BUCKETS, ('view', 'method', 'status'),
+)
+DB_DURATION = Histogram(
+    'catalog_db_duration_seconds', 'Tempo gasto em SQL por requisição.', DURATION_BUCKETS, ('view',),
+)
+DB_QUERIES = Histogram(
+    'catalog_db_queries', 'Consultas SQL por requisição.', QUERY_BUCKETS, ('view',),
+)
+SECTION_DURATION = Histogram(
+    'catalog_section_duration_seconds', 'Tempo de renderização de templates e de serialização por requisição.',
+    DURATION_BUCKETS, ('view', 'section'),
+)
+HISTOGRAMS = [REQUEST_DURATION, DB_DURATION, DB_QUERIES, SECTION_DURATION]
+
+
+def render_metrics():
+    return '\n'.join(line for histogram in HISTOGRAMS for line in histogram.collect()) + '\n'
+
+
+def _slow_query_threshold():
+    threshold = getattr(settings, 'CATALOG_SLOW_QUERY_MS', None)
+    return threshold / 1000 if threshold is not None else None
+
+
+def _execute(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.queries += 1
+        metrics.db_time += elapsed
+        if metrics.slow is not None and elapsed >= metrics.slow:
+            logger.warning(
+                "Consulta lenta (%.1f ms) em %s [%s]: %s",
+                elapsed * 1000, metrics.view_name(), context['connection'].alias, sql,
+            )
+
+
+def install_query_hook(connection):
+    """
+    Time every query of ``connection`` on behalf of the request in the current
+    context (called for each new connection by catalog.signals). Connections
+    are per thread, so a hook on the connection rather than around the request
+    also sees the queries that async views run in sync_to_async threads.
+    """
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+class InstrumentationMiddleware:
+    """Put it first in MIDDLEWARE so the timings cover the whole stack."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics(request)
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics(request)
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    def finish(self, request, response, metrics, total):
+        view = metrics.view_name()
+        REQUEST_DURATION.observe((view, request.method, str(response.status_code)), total)
+        DB_DURATION.observe((view,), metrics.db_time)
+        DB_QUERIES.observe((view,), metrics.queries)
+        timings = [f'db;desc="{metrics.queries} queries";dur={metrics.db_time * 1000:.2f}']
+        for name, seconds in metrics.sections.items():
+            SECTION_DURATION.observe((view, name), seconds)
+            timings.append(f'{name};dur={seconds * 1000:.2f}')
+        timings.append(f'total;dur={total * 1000:.2f}')
+        response.headers['Server-Timing'] = ', '.join(timings)
+        return response
+
+    def process_template_response(self, request, response):
+        # Render here rather than in the handler so the time lands in the "render" section.
+        with timed('render'):
+            return response.render()
+
+
+def _metrics_allowed(request, token, addresses):
+    if token and hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return True
+    return request.META.get('REMOTE_ADDR') in addresses
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition, for ``Authorization: Bearer <CATALOG_METRICS_TOKEN>``
+    or the addresses in ``CATALOG_METRICS_ALLOWED_IPS``; 404 while neither is set.
+    """
+    token = getattr(settings, 'CATALOG_METRICS_TOKEN', None)
+    addresses = getattr(settings, 'CATALOG_METRICS_ALLOWED_IPS', ())
+    if not token and not addresses:
+        raise Http404
+    if not _metrics_allowed(request, token, addresses):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
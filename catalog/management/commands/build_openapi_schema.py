@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from catalog.openapi import build, prune, schema_dir
+from catalog.versioning import code_version
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera o schema OpenAPI da versão atual do código (JSON e YAML) e o grava para "
+        "/swagger.json e /swagger.yaml, removendo o de versões anteriores."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-old', action='store_true',
+            help="Mantém os schemas de outras versões do código (ex.: durante um deploy gradual).",
+        )
+
+    def handle(self, *args, keep_old=False, **options):
+        version = code_version()
+        index = build(version)
+        for name in index.values():
+            self.stdout.write(str(schema_dir() / name))
+        if not keep_old:
+            removed = prune(version)
+            if removed:
+                self.stdout.write(f"{removed} arquivo(s) de versões anteriores removido(s).")
+        self.stdout.write(self.style.SUCCESS(f"Schema OpenAPI da versão {version} gerado."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog.changes import compact_changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove do feed de alterações (/api/jutsus/changes/) as lápides de jutsus "
+        "excluídos há mais de CATALOG_CHANGES_RETENTION_DAYS dias."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Idade mínima, em dias, das lápides removidas.")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, days=None, database=DEFAULT_DB_ALIAS, **options):
+        dropped = compact_changes(days, database)
+        self.stdout.write(self.style.SUCCESS(f"{dropped} lápide(s) removida(s) do feed de alterações."))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog.models import Jutsu
+from catalog.transfer import FORMATS, detect_format, export_rows, open_text, write_rows
+
+
+class Command(BaseCommand):
+    help = "Exporta o catálogo de jutsus para JSONL ou CSV, em streaming."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Arquivo de saída (.jsonl ou .csv); '-' escreve na saída padrão.")
+        parser.add_argument('--format', choices=FORMATS, help="Formato do arquivo (padrão: pela extensão).")
+        parser.add_argument('--element', help="Exporta apenas jutsus deste elemento.")
+        parser.add_argument('--type', help="Exporta apenas jutsus deste tipo.")
+        parser.add_argument('--rank', help="Exporta apenas jutsus deste rank.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        queryset = Jutsu.objects.using(options['database'])
+        for option, field in (('element', 'element_type'), ('type', 'jutsu_type'), ('rank', 'rank')):
+            if options[option]:
+                queryset = queryset.filter(**{field: options[option]})
+
+        path = options['path']
+        with open_text(path, 'w') as target:
+            count = write_rows(
+                export_rows(queryset, chunk_size=options['chunk_size']),
+                target,
+                detect_format(path, options['format']),
+            )
+        if path != '-':
+            self.stdout.write(self.style.SUCCESS(f"{count} jutsu(s) exportado(s) para {path}."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from catalog.images import generate_variants, manifest_is_current
+from catalog.models import Jutsu
+
+
+class Command(BaseCommand):
+    help = "Gera as miniaturas WebP/AVIF/JPEG das imagens dos jutsus que ainda não as têm."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Regera as variantes de todas as imagens, mesmo as que já estão em dia ou cuja geração falhou.",
+        )
+
+    def handle(self, *args, force=False, **options):
+        jutsus = (
+            Jutsu.objects.exclude(Q(image__isnull=True) | Q(image=''))
+            .only('pk', 'image', 'image_variants')
+            .order_by('pk')
+        )
+        done = 0
+        for jutsu in jutsus.iterator(chunk_size=500):
+            if force or not manifest_is_current(jutsu):
+                generate_variants(jutsu.pk, force=force)
+                done += 1
+                if done % 100 == 0:
+                    self.stdout.write(f"{done} imagens processadas...")
+        self.stdout.write(self.style.SUCCESS(f"{done} imagem(ns) processada(s)."))
@@ -0,0 +1,117 @@
+import contextlib
+import itertools
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework.exceptions import ValidationError
+
+from catalog import changes, sampling
+from catalog.serializers import JutsuImportSerializer
+from catalog.similarity import rebuild_similar, refresh_similar
+from catalog.stats import rebuild_stats
+from catalog.transfer import FORMATS, RowError, detect_format, open_text, read_rows, upsert_jutsus
+from catalog.versioning import bump_revision
+
+# Above this many written jutsus, --similar refresh rebuilds everything instead:
+# that is cheaper than refreshing them one by one, and their ids are not kept.
+REFRESH_LIMIT = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa jutsus de um arquivo JSONL ou CSV em lotes, atualizando os que já "
+        "existem com o mesmo nome. Linhas inválidas são puladas e relatadas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Arquivo de entrada (.jsonl ou .csv); '-' lê da entrada padrão.")
+        parser.add_argument('--format', choices=FORMATS, help="Formato do arquivo (padrão: pela extensão).")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--errors', help="Grava o relatório de erros (JSONL, uma linha por registro rejeitado).")
+        parser.add_argument('--dry-run', action='store_true', help="Apenas valida, sem gravar nada.")
+        parser.add_argument(
+            '--similar', choices=['refresh', 'rebuild', 'skip'], default='refresh',
+            help=(
+                "Jutsus semelhantes: atualiza só os jutsus importados e as listas afetadas (padrão; "
+                f"acima de {REFRESH_LIMIT} jutsus gravados, recalcula tudo), recalcula tudo (melhor para "
+                "cargas grandes) ou não mexe (rode rebuild_similar_jutsus depois)."
+            ),
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = detect_format(path, options['format'])
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size deve ser positivo.")
+
+        serializer = JutsuImportSerializer()
+        started = time.monotonic()
+        read = written = rejected = 0
+        similar = options['similar']
+        imported = []
+
+        with contextlib.ExitStack() as stack:
+            source = stack.enter_context(open_text(path, 'r'))
+            errors = stack.enter_context(open_text(options['errors'], 'w')) if options['errors'] else None
+            rows = read_rows(source, fmt)
+            while batch := list(itertools.islice(rows, batch_size)):
+                valid = []
+                for line_number, row in batch:
+                    try:
+                        if isinstance(row, RowError):
+                            raise ValidationError({'non_field_errors': [str(row)]})
+                        valid.append(serializer.run_validation(row))
+                    except ValidationError as exc:
+                        rejected += 1
+                        self.report_error(errors, line_number, exc.detail, row)
+                read += len(batch)
+                if valid and not options['dry_run']:
+                    with transaction.atomic(using=options['database']):
+                        ids = self.write_batch(valid, options['database'])
+                    written += len(ids)
+                    if similar == 'refresh':
+                        imported += ids
+                        if len(imported) > REFRESH_LIMIT:
+                            similar, imported = 'rebuild', []
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{read} linhas lidas, {written} gravadas, {rejected} rejeitadas "
+                    f"({read / elapsed if elapsed else 0:.0f} linhas/s)"
+                )
+
+        if written:
+            # bulk_create skips the signals that keep these up to date.
+            rebuild_stats(options['database'])
+            bump_revision(options['database'])
+            sampling.invalidate()
+            if similar == 'rebuild':
+                rebuild_similar(options['database'])
+            elif similar == 'refresh':
+                refresh_similar(changed=imported, using=options['database'])
+
+        message = f"Importação concluída: {written} jutsu(s) gravado(s), {rejected} linha(s) rejeitada(s)."
+        if rejected:
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def write_batch(self, rows, using):
+        created, updated = upsert_jutsus(rows, using=using)
+        # The change feed is kept per batch, in the batch's transaction (see catalog.changes).
+        bump_revision(using)
+        changes.record(created, changes.CREATED, using)
+        changes.record(updated, changes.UPDATED, using)
+        return created + updated
+
+    def report_error(self, errors, line_number, detail, row):
+        if errors is None:
+            self.stderr.write(f"Linha {line_number}: {json.dumps(detail, ensure_ascii=False)}")
+            return
+        errors.write(json.dumps(
+            {'line': line_number, 'errors': detail, 'row': None if isinstance(row, RowError) else row},
+            ensure_ascii=False,
+        ) + '\n')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog.stats import rebuild_stats, stats_drift
+
+
+class Command(BaseCommand):
+    help = "Recalcula a tabela de estatísticas do dashboard a partir dos jutsus e reporta divergências."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Apenas verifica divergências; termina com erro se houver alguma.",
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, check=False, database=DEFAULT_DB_ALIAS, **options):
+        drift = stats_drift(database)
+        for (dimension, value), (stored, actual) in drift.items():
+            label = f"{dimension}={value}" if value else dimension
+            self.stdout.write(f"{label}: armazenado {stored}, real {actual}")
+
+        if check:
+            if drift:
+                raise CommandError(f"{len(drift)} contador(es) divergente(s).")
+            self.stdout.write(self.style.SUCCESS("Estatísticas em dia."))
+            return
+
+        rebuild_stats(database)
+        self.stdout.write(self.style.SUCCESS(
+            f"Estatísticas reconstruídas ({len(drift)} contador(es) corrigido(s))."
+        ))
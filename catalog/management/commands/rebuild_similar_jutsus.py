@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog.similarity import TOP_K, rebuild_similar
+
+
+class Command(BaseCommand):
+    help = "Recalcula do zero a lista de jutsus semelhantes de todos os jutsus."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=TOP_K,
+            help=f"Quantidade de jutsus semelhantes guardada por jutsu (padrão: {TOP_K}).",
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, top=TOP_K, database=DEFAULT_DB_ALIAS, **options):
+        started = time.monotonic()
+        indexed = rebuild_similar(database, k=top)
+        self.stdout.write(self.style.SUCCESS(
+            f"Jutsus semelhantes recalculados para {indexed} jutsu(s) em {time.monotonic() - started:.1f}s."
+        ))
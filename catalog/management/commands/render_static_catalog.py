@@ -0,0 +1,58 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, close_old_connections
+
+from catalog.static_catalog import output_dir, render_catalog
+
+logger = logging.getLogger('catalog.static_catalog')
+
+
+class Command(BaseCommand):
+    help = (
+        "Renderiza as páginas públicas e o JSON da API do catálogo em CATALOG_STATIC_DIR, "
+        "para o nginx servir; por padrão só o que mudou desde a última execução. "
+        "Com --watch, continua atualizando a partir do feed de alterações."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Diretório de saída (padrão: CATALOG_STATIC_DIR).")
+        parser.add_argument(
+            '--full', action='store_true',
+            help="Renderiza tudo de novo, ignorando o que já foi gerado.",
+        )
+        parser.add_argument(
+            '--workers', type=int,
+            help="Processos de renderização (padrão: CATALOG_STATIC_WORKERS; 0 = neste processo).",
+        )
+        parser.add_argument(
+            '--watch', type=float, metavar='SEGUNDOS',
+            help="Não termina: renderiza o que mudou a cada SEGUNDOS.",
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, output=None, full=False, workers=None, watch=None, database=DEFAULT_DB_ALIAS,
+               **options):
+        output = output or output_dir()
+        if output is None:
+            raise CommandError("Defina CATALOG_STATIC_DIR ou use --output.")
+        self.report(output, render_catalog(output, full=full, workers=workers, using=database))
+        while watch:
+            time.sleep(watch)
+            # Between runs, as between requests: don't keep a connection the database has closed.
+            close_old_connections()
+            try:
+                result = render_catalog(output, workers=workers, using=database)
+            except Exception:
+                logger.exception("Falha ao atualizar o snapshot estático do catálogo")
+                continue
+            if result['rendered'] or result['removed']:
+                self.report(output, result)
+
+    def report(self, output, result):
+        kind = "completa" if result['full'] else "incremental"
+        self.stdout.write(self.style.SUCCESS(
+            f"Renderização {kind} em {output}: {len(result['rendered'])} arquivo(s) gerado(s), "
+            f"{len(result['removed'])} removido(s)."
+        ))
@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog.media import MEDIA_DIR, find_orphans, process_queue
+
+
+class Command(BaseCommand):
+    help = (
+        f"Processa a fila de remoção de mídia e apaga os arquivos de {MEDIA_DIR}/ "
+        "que nenhum jutsu referencia."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help="Idade mínima, em segundos, de um arquivo órfão para ser apagado (padrão: 3600).",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Apenas lista os arquivos órfãos, sem apagar nada.",
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, min_age=3600, dry_run=False, database=DEFAULT_DB_ALIAS, **options):
+        if not dry_run:
+            queued = process_queue(database)
+            self.stdout.write(f"{queued} arquivo(s) removido(s) da fila pendente.")
+
+        orphans = 0
+        for name in find_orphans(database, timedelta(seconds=min_age)):
+            orphans += 1
+            if dry_run:
+                self.stdout.write(name)
+            else:
+                default_storage.delete(name)
+                if orphans % 1000 == 0:
+                    self.stdout.write(f"{orphans} arquivos órfãos apagados...")
+
+        verb = "encontrado(s)" if dry_run else "apagado(s)"
+        self.stdout.write(self.style.SUCCESS(f"{orphans} arquivo(s) órfão(s) {verb}."))
@@ -0,0 +1,170 @@
+"""
+Deferred removal of media files.
+
+Files that lose their jutsu -- the image and variants of a deleted jutsu, a
+replaced image, superseded variants -- are not deleted during the request.
+Their names go into ``MediaDeletion`` in the transaction that drops them, so a
+rollback keeps the files, and after the commit a background thread deletes
+them from storage in batches (``CATALOG_MEDIA_CLEANUP_IN_BACKGROUND = False``
+does it inline, still after the commit). An entry whose ``source`` image is
+still used by some jutsu is dropped without touching storage.
+
+Entries left behind by a crash or a storage error are retried by the next run
+and by ``manage.py sweep_media``, which also removes files under
+``jutsu_images/`` that no jutsu references.
+"""
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Jutsu, MediaDeletion
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+MEDIA_DIR = 'jutsu_images'
+
+_executor = None
+_scheduled = set()
+_lock = threading.Lock()
+
+
+def variant_names(manifest):
+    return [variant['name'] for variant in (manifest or {}).get('variants', [])]
+
+
+def enqueue(names, source='', using=DEFAULT_DB_ALIAS):
+    """
+    Record ``names`` for deletion in the current transaction and process them
+    after it commits. With a ``source``, they are kept while a jutsu uses that image.
+    """
+    names = [name for name in names if name]
+    if not names:
+        return
+    MediaDeletion.objects.using(using).bulk_create([MediaDeletion(name=name, source=source) for name in names])
+    transaction.on_commit(lambda: schedule(using), using=using)
+
+
+def enqueue_jutsu_files(files, using=DEFAULT_DB_ALIAS):
+    """Everything stored for each ``(image, manifest)`` of ``files``: the originals and their variants."""
+    entries = [
+        MediaDeletion(name=name, source=image or '')
+        for image, manifest in files
+        for name in [image, *variant_names(manifest)]
+        if name
+    ]
+    if not entries:
+        return
+    MediaDeletion.objects.using(using).bulk_create(entries)
+    transaction.on_commit(lambda: schedule(using), using=using)
+
+
+def process_queue(using=DEFAULT_DB_ALIAS, batch_size=BATCH_SIZE):
+    """Delete the queued files, one batch at a time; returns how many were removed from storage."""
+    queue = MediaDeletion.objects.using(using).order_by('id')
+    removed = 0
+    last = 0
+    while True:
+        batch = list(queue.filter(id__gt=last)[:batch_size])
+        if not batch:
+            return removed
+        last = batch[-1].id
+        sources = {entry.source for entry in batch if entry.source}
+        in_use = set(
+            Jutsu.objects.using(using).filter(image__in=sources).values_list('image', flat=True)
+        ) if sources else set()
+        done = []
+        for entry in batch:
+            if entry.source not in in_use:
+                try:
+                    # No exists() first: deleting a missing file is a no-op, and on remote storage a round trip.
+                    default_storage.delete(entry.name)
+                    removed += 1
+                except Exception:
+                    logger.exception("Falha ao remover o arquivo de mídia %s", entry.name)
+                    continue
+            done.append(entry.id)
+        MediaDeletion.objects.using(using).filter(id__in=done).delete()
+
+
+def _in_background():
+    return getattr(settings, 'CATALOG_MEDIA_CLEANUP_IN_BACKGROUND', True)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='catalog-media')
+    return _executor
+
+
+def _run(using):
+    with _lock:
+        _scheduled.discard(using)
+    try:
+        process_queue(using)
+    except Exception:
+        logger.exception("Falha ao processar a fila de remoção de mídia")
+    finally:
+        close_old_connections()
+
+
+def schedule(using=DEFAULT_DB_ALIAS):
+    """Process the queue in the background thread; a run already waiting picks up new entries."""
+    if not _in_background():
+        process_queue(using)
+        return
+    with _lock:
+        if using in _scheduled:
+            return
+        _scheduled.add(using)
+    _get_executor().submit(_run, using)
+
+
+def referenced_names(using=DEFAULT_DB_ALIAS, chunk_size=2000):
+    """Every stored name some jutsu points to: images and the variants of their manifests."""
+    names = set()
+    rows = Jutsu.objects.using(using).order_by().values_list('image', 'image_variants')
+    for image, manifest in rows.iterator(chunk_size=chunk_size):
+        if image:
+            names.add(image)
+        names.update(variant_names(manifest))
+    return names
+
+
+def stored_names(directory=MEDIA_DIR):
+    """The files under ``directory``, walked one directory listing at a time."""
+    try:
+        directories, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield posixpath.join(directory, name)
+    for child in directories:
+        yield from stored_names(posixpath.join(directory, child))
+
+
+def find_orphans(using=DEFAULT_DB_ALIAS, min_age=timedelta(hours=1)):
+    """
+    Files under ``jutsu_images/`` no jutsu references, streamed. Files younger
+    than ``min_age`` are skipped: an upload or a render may not have committed yet.
+    """
+    referenced = referenced_names(using)
+    cutoff = timezone.now() - min_age
+    for name in stored_names():
+        if name in referenced:
+            continue
+        try:
+            modified = default_storage.get_modified_time(name)
+        except (NotImplementedError, OSError):
+            modified = None
+        if modified is not None and modified > cutoff:
+            continue
+        yield name
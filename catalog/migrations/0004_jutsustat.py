@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:43
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_stats(apps, schema_editor):
+    Jutsu = apps.get_model('catalog', 'Jutsu')
+    JutsuStat = apps.get_model('catalog', 'JutsuStat')
+    using = schema_editor.connection.alias
+    jutsus = Jutsu.objects.using(using).order_by()
+    stats = [JutsuStat(dimension='total', value='', count=jutsus.count())]
+    for field in ('element_type', 'jutsu_type', 'rank'):
+        for row in jutsus.values(field).annotate(count=Count('id')):
+            stats.append(JutsuStat(dimension=field, value=row[field], count=row['count']))
+    JutsuStat.objects.using(using).bulk_create(stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_jutsu_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JutsuStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('element_type', 'Elemento'), ('jutsu_type', 'Tipo'), ('rank', 'Rank')], max_length=20)),
+                ('value', models.CharField(blank=True, max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Estatística de Jutsus',
+                'verbose_name_plural': 'Estatísticas de Jutsus',
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'value'), name='catalog_jutsustat_unique_dimension_value')],
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
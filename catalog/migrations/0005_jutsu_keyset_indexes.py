@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_jutsustat'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jutsu',
+            index=models.Index(fields=['created_at', 'id'], name='jutsu_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jutsu',
+            index=models.Index(fields=['rank', 'id'], name='jutsu_rank_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jutsu',
+            index=models.Index(fields=['element_type', 'name'], name='jutsu_element_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jutsu',
+            index=models.Index(fields=['element_type', 'created_at', 'id'], name='jutsu_element_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jutsu',
+            index=models.Index(fields=['jutsu_type', 'name'], name='jutsu_type_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jutsu',
+            index=models.Index(fields=['jutsu_type', 'created_at', 'id'], name='jutsu_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jutsu',
+            index=models.Index(fields=['rank', 'name'], name='jutsu_rank_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jutsu',
+            index=models.Index(fields=['rank', 'created_at', 'id'], name='jutsu_rank_created_idx'),
+        ),
+    ]
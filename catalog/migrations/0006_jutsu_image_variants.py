@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_jutsu_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jutsu',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Miniaturas e formatos alternativos gerados a partir da imagem (ver catalog.images).'),
+        ),
+        migrations.AddField(
+            model_name='jutsu',
+            name='variants_updated_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Data e hora em que as variantes da imagem foram geradas pela última vez (ver catalog.images).', null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_catalogrevision'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jutsu',
+            index=models.Index(fields=['element_type', 'jutsu_type', 'name'], name='jutsu_element_type_name_idx'),
+        ),
+    ]
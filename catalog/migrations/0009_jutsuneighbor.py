@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_jutsu_element_type_name_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JutsuNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('jutsu', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='catalog.jutsu')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbor_of', to='catalog.jutsu')),
+            ],
+            options={
+                'verbose_name': 'Jutsu Semelhante',
+                'verbose_name_plural': 'Jutsus Semelhantes',
+                'constraints': [models.UniqueConstraint(fields=('jutsu', 'position'), name='catalog_jutsuneighbor_unique_position')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarityTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50, unique=True)),
+                ('documents', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Termo de Similaridade',
+                'verbose_name_plural': 'Termos de Similaridade',
+            },
+        ),
+        migrations.AddField(
+            model_name='jutsu',
+            name='similar_updated_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Data e hora em que a lista de jutsus semelhantes mudou pela última vez (ver catalog.similarity).', null=True),
+        ),
+        migrations.CreateModel(
+            name='JutsuTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jutsu_id', models.BigIntegerField()),
+                ('term', models.CharField(max_length=50)),
+                ('weight', models.FloatField()),
+            ],
+            options={
+                'verbose_name': 'Termo de Jutsu',
+                'verbose_name_plural': 'Termos de Jutsus',
+                'indexes': [models.Index(fields=['term', 'jutsu_id'], name='jutsuterm_term_jutsu_idx')],
+                'constraints': [models.UniqueConstraint(fields=('jutsu_id', 'term'), name='catalog_jutsuterm_unique_term')],
+            },
+        ),
+    ]
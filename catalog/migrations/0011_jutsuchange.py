@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_changes(apps, schema_editor):
+    # Every jutsu already in the catalog starts the feed as created.
+    Jutsu = apps.get_model('catalog', 'Jutsu')
+    JutsuChange = apps.get_model('catalog', 'JutsuChange')
+    using = schema_editor.connection.alias
+    ids = Jutsu.objects.using(using).order_by('pk').values_list('pk', flat=True)
+    JutsuChange.objects.using(using).bulk_create(
+        (JutsuChange(jutsu_id=pk, operation='created') for pk in ids.iterator(chunk_size=2000)),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_mediadeletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JutsuChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jutsu_id', models.BigIntegerField(unique=True)),
+                ('operation', models.CharField(choices=[('created', 'Criado'), ('updated', 'Atualizado'), ('deleted', 'Excluído'), ('refreshed', 'Recalculado')], max_length=10)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Alteração de Jutsu',
+                'verbose_name_plural': 'Alterações de Jutsus',
+            },
+        ),
+        migrations.AddField(
+            model_name='catalogrevision',
+            name='changes_compacted_through',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(seed_changes, migrations.RunPython.noop),
+    ]
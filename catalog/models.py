@@ -1,6 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from django.core.files.storage import default_storage
 
 class Jutsu(models.Model):
 
@@ -71,6 +71,13 @@ class Jutsu(models.Model):
         help_text="Uma imagem representativa do jutsu."
     )
 
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Miniaturas e formatos alternativos gerados a partir da imagem (ver catalog.images)."
+    )
+
     created_at = models.DateTimeField(
         auto_now_add=True,
         help_text="Data e hora em que o jutsu foi registrado no catálogo."
@@ -81,19 +88,200 @@ class Jutsu(models.Model):
         help_text="Data e hora da última atualização do registro."
     )
 
+    similar_updated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Data e hora em que a lista de jutsus semelhantes mudou pela última vez (ver catalog.similarity)."
+    )
+
+    variants_updated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Data e hora em que as variantes da imagem foram geradas pela última vez (ver catalog.images)."
+    )
+
     class Meta:
         verbose_name = "Jutsu"
         verbose_name_plural = "Jutsus"
         ordering = ['name'] 
+        indexes = [
+            # Keyset pagination: (ordering field, id), optionally behind an equality filter.
+            models.Index(fields=['created_at', 'id'], name='jutsu_created_id_idx'),
+            models.Index(fields=['rank', 'id'], name='jutsu_rank_id_idx'),
+            models.Index(fields=['element_type', 'name'], name='jutsu_element_name_idx'),
+            models.Index(fields=['element_type', 'created_at', 'id'], name='jutsu_element_created_idx'),
+            models.Index(fields=['jutsu_type', 'name'], name='jutsu_type_name_idx'),
+            models.Index(fields=['jutsu_type', 'created_at', 'id'], name='jutsu_type_created_idx'),
+            models.Index(fields=['rank', 'name'], name='jutsu_rank_name_idx'),
+            models.Index(fields=['rank', 'created_at', 'id'], name='jutsu_rank_created_idx'),
+            # The HTML list's element + type filters, in its default name order.
+            models.Index(fields=['element_type', 'jutsu_type', 'name'], name='jutsu_element_type_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.get_element_type_display()})"
     
+    CLASSIFICATION_FIELDS = ('element_type', 'jutsu_type', 'rank')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_state()
+        return instance
+
+    def _remember_loaded_state(self):
+        if all(field in self.__dict__ for field in self.CLASSIFICATION_FIELDS):
+            self._loaded_classification = {
+                field: self.__dict__[field] for field in self.CLASSIFICATION_FIELDS
+            }
+        if 'image' in self.__dict__:
+            # A name from the database, a FieldFile once the attribute was read.
+            self._loaded_image = getattr(self.__dict__['image'], 'name', self.__dict__['image']) or ''
+
+    def save(self, *args, **kwargs):
+        # Keeps the post_save bookkeeping (catalog.stats, catalog.media) in the same transaction.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+        self._remember_loaded_state()
+
     def get_absolute_url(self):
         from django.urls import reverse
         return reverse('jutsu-detail', kwargs={'pk': self.pk})
-    
-    def delete(self, *args, **kwargs):
-        if self.image and default_storage.exists(self.image.name):
-            default_storage.delete(self.image.name)
-        super().delete(*args, **kwargs)
\ No newline at end of file
+
+
+class JutsuStat(models.Model):
+    """Materialized count of jutsus per classification value, maintained by catalog.stats."""
+
+    class Dimensions(models.TextChoices):
+        TOTAL = 'total', _('Total')
+        ELEMENT = 'element_type', _('Elemento')
+        TYPE = 'jutsu_type', _('Tipo')
+        RANK = 'rank', _('Rank')
+
+    dimension = models.CharField(max_length=20, choices=Dimensions.choices)
+    value = models.CharField(max_length=20, blank=True)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Estatística de Jutsus"
+        verbose_name_plural = "Estatísticas de Jutsus"
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'value'], name='catalog_jutsustat_unique_dimension_value'),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension}={self.value}: {self.count}"
+
+
+class CatalogRevision(models.Model):
+    """Single-row counter bumped by every jutsu write; versions catalog-wide ETags and caches."""
+
+    revision = models.BigIntegerField(default=0)
+    changed_at = models.DateTimeField(auto_now=True)
+    # Change feed tokens up to this one may have lost tombstones to compaction (see catalog.changes).
+    changes_compacted_through = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Revisão do Catálogo"
+        verbose_name_plural = "Revisões do Catálogo"
+
+    def __str__(self):
+        return f"Revisão {self.revision}"
+
+
+class JutsuNeighbor(models.Model):
+    """One entry of a jutsu's precomputed "similar jutsus" list, maintained by catalog.similarity."""
+
+    jutsu = models.ForeignKey(Jutsu, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Jutsu, on_delete=models.CASCADE, related_name='neighbor_of')
+    position = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        verbose_name = "Jutsu Semelhante"
+        verbose_name_plural = "Jutsus Semelhantes"
+        constraints = [
+            # Also the index behind the detail page's lookup.
+            models.UniqueConstraint(fields=['jutsu', 'position'], name='catalog_jutsuneighbor_unique_position'),
+        ]
+
+    def __str__(self):
+        return f"{self.jutsu_id} -> {self.neighbor_id} ({self.score:.3f})"
+
+
+class SimilarityTerm(models.Model):
+    """How many jutsus use a word, for the TF-IDF vectors of catalog.similarity."""
+
+    term = models.CharField(max_length=50, unique=True)
+    documents = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Termo de Similaridade"
+        verbose_name_plural = "Termos de Similaridade"
+
+    def __str__(self):
+        return f"{self.term}: {self.documents}"
+
+
+class JutsuTerm(models.Model):
+    """One word of a jutsu's stored TF-IDF vector, maintained by catalog.similarity."""
+
+    # Not a foreign key: a deleted jutsu's words are subtracted from the frequencies after its commit.
+    jutsu_id = models.BigIntegerField()
+    term = models.CharField(max_length=50)
+    weight = models.FloatField()
+
+    class Meta:
+        verbose_name = "Termo de Jutsu"
+        verbose_name_plural = "Termos de Jutsus"
+        constraints = [
+            models.UniqueConstraint(fields=['jutsu_id', 'term'], name='catalog_jutsuterm_unique_term'),
+        ]
+        indexes = [
+            # The postings: the jutsus that use a word.
+            models.Index(fields=['term', 'jutsu_id'], name='jutsuterm_term_jutsu_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.jutsu_id}: {self.term} ({self.weight:.3f})"
+
+
+class MediaDeletion(models.Model):
+    """A file to remove from storage once its deletion commits; processed by catalog.media."""
+
+    name = models.CharField(max_length=255)
+    # The original image the file belongs to: kept while a jutsu still uses it. Empty for unconditional removals.
+    source = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Remoção de Mídia Pendente"
+        verbose_name_plural = "Remoções de Mídia Pendentes"
+
+    def __str__(self):
+        return self.name
+
+
+class JutsuChange(models.Model):
+    """The last write to a jutsu, numbered in commit order for the change feed; maintained by catalog.changes."""
+
+    class Operations(models.TextChoices):
+        CREATED = 'created', _('Criado')
+        UPDATED = 'updated', _('Atualizado')
+        DELETED = 'deleted', _('Excluído')
+        # Only what is derived from the jutsu (its similar list or image variants) changed.
+        REFRESHED = 'refreshed', _('Recalculado')
+
+    # Not a foreign key: the tombstone of a deleted jutsu outlives it.
+    jutsu_id = models.BigIntegerField(unique=True)
+    operation = models.CharField(max_length=10, choices=Operations.choices)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Alteração de Jutsu"
+        verbose_name_plural = "Alterações de Jutsus"
+
+    def __str__(self):
+        return f"#{self.pk} {self.operation} {self.jutsu_id}"
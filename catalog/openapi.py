@@ -0,0 +1,149 @@
+"""
+The API's OpenAPI (Swagger 2.0) schema, generated once per code version.
+
+drf_yasg builds it by introspecting every viewset, serializer and filter, which
+``/swagger.json`` used to redo on every hit. Here it is generated without a
+request -- so it names no host, and clients use the one they fetched it from --
+by ``manage.py build_openapi_schema`` at deploy, or by the first request of a
+process that finds none for the running ``code_version()``.
+
+Each format is stored under CATALOG_OPENAPI_DIR (``STATIC_ROOT/openapi`` by
+default) as ``swagger.<content hash>.<format>``, next to an index
+``<code version>.json`` naming them, and served from memory with the content
+hash as its ETag.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_safe
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+from .versioning import code_version
+
+API_INFO = openapi.Info(
+    title="Naruto Jutsu Catalog API",
+    default_version='v1',
+    description="API para o catálogo de jutsus de Naruto",
+    terms_of_service="https://www.example.com/terms/",
+    contact=openapi.Contact(email="seu.email@example.com"),
+    license=openapi.License(name="BSD License"),
+)
+
+# The async views under ASGI document the same endpoints; one URLconf keeps the schema identical.
+URLCONF = 'naruto_jutsu_catalog.urls'
+
+FORMATS = {
+    'json': ('application/json', OpenAPICodecJson),
+    'yaml': ('application/yaml', OpenAPICodecYaml),
+}
+
+_documents = {}
+_lock = threading.Lock()
+
+
+class Document:
+    __slots__ = ('content', 'content_type', 'etag')
+
+    def __init__(self, content, content_type, etag):
+        self.content = content
+        self.content_type = content_type
+        self.etag = etag
+
+
+def schema_dir():
+    configured = getattr(settings, 'CATALOG_OPENAPI_DIR', None)
+    return Path(configured or Path(settings.STATIC_ROOT) / 'openapi')
+
+
+def generate():
+    """``{format: bytes}`` of the public schema, as drf_yasg's schema view renders it."""
+    schema = OpenAPISchemaGenerator(API_INFO, urlconf=URLCONF).get_schema(request=None, public=True)
+    return {name: codec([]).encode(schema) for name, (_, codec) in FORMATS.items()}
+
+
+def _write(path, content):
+    # Readers in other workers never see a partial file.
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix='.tmp-', delete=False) as file:
+        file.write(content)
+    # The temporary file is private (0600); workers and nginx may run as other users.
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, path)
+
+
+def build(version=None):
+    """Generate and store the schema of ``version`` (the running code); returns the index."""
+    version = version or code_version()
+    directory = schema_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    index = {}
+    for name, content in generate().items():
+        filename = f'swagger.{hashlib.sha256(content).hexdigest()[:16]}.{name}'
+        if not (directory / filename).exists():
+            _write(directory / filename, content)
+        index[name] = filename
+    _write(directory / f'{version}.json', json.dumps(index).encode())
+    return index
+
+
+def prune(keep=None):
+    """Remove the indexes and files of every code version but ``keep``; returns how many files went."""
+    keep = keep or code_version()
+    directory = schema_dir()
+    try:
+        index = json.loads((directory / f'{keep}.json').read_bytes())
+    except FileNotFoundError:
+        return 0
+    kept = {f'{keep}.json', *index.values()}
+    removed = 0
+    for path in directory.iterdir():
+        if path.is_file() and path.name not in kept:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+def _load(name):
+    version = code_version()
+    directory = schema_dir()
+    try:
+        filename = json.loads((directory / f'{version}.json').read_bytes())[name]
+        content = (directory / filename).read_bytes()
+    except (FileNotFoundError, KeyError, ValueError):
+        filename = build(version)[name]
+        content = (directory / filename).read_bytes()
+    return Document(content, FORMATS[name][0], filename.split('.')[1])
+
+
+def get_document(name):
+    """The stored schema in format ``name``, read (or built) once per process."""
+    document = _documents.get(name)
+    if document is None:
+        with _lock:
+            document = _documents.get(name)
+            if document is None:
+                document = _documents[name] = _load(name)
+    return document
+
+
+def _schema_etag(request, format):
+    return get_document(format.lstrip('.')).etag
+
+
+@require_safe
+@condition(etag_func=_schema_etag)
+def schema_view(request, format):
+    """``/swagger.json`` and ``/swagger.yaml``."""
+    document = get_document(format.lstrip('.'))
+    response = HttpResponse(document.content, content_type=document.content_type)
+    # Cached anywhere, but revalidated: a deploy changes it under the same URL.
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
@@ -0,0 +1,340 @@
+"""
+Keyset (cursor) pagination for jutsu lists.
+
+Pages are fetched with ``WHERE (field, id) > (last_field, last_id) ORDER BY
+field, id LIMIT n + 1`` so every page is an index range scan and no
+``COUNT(*)`` is needed. Page-number pagination remains the default whenever
+no ``cursor`` parameter is sent.
+
+Page numbers need a count, which ``EstimatedCountPaginator`` avoids computing
+over large sets (see ``estimate_count``).
+"""
+import base64
+import binascii
+import json
+import math
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import Col
+from django.db.models.lookups import Exact
+from django.db.models.sql.where import AND
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .models import Jutsu
+from .stats import TOTAL, astored_stats, stored_stats
+
+KEYSET_ORDERINGS = ['name', '-name', 'created_at', '-created_at', 'rank', '-rank']
+DEFAULT_ORDERING = 'name'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+
+    def __init__(self, object_list, ordering, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.ordering = ordering
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def encode_cursor(ordering, jutsu, backwards=False):
+    """``jutsu`` is an instance or a ``.values()`` row."""
+    if isinstance(jutsu, dict):
+        value, pk = jutsu[ordering.lstrip('-')], jutsu['id']
+    else:
+        value, pk = getattr(jutsu, ordering.lstrip('-')), jutsu.pk
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    payload = json.dumps([ordering, value, pk, backwards], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, ordering):
+    """Return ``(value, pk, backwards)`` or raise InvalidCursor."""
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        cursor_ordering, value, pk, backwards = json.loads(payload)
+        value = Jutsu._meta.get_field(ordering.lstrip('-')).to_python(value)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, ValidationError):
+        raise InvalidCursor(token)
+    if cursor_ordering != ordering or not isinstance(pk, int):
+        raise InvalidCursor(token)
+    return value, pk, bool(backwards)
+
+
+def keyset_ordering(queryset):
+    """The queryset's ordering if keyset pagination supports it, else the default."""
+    order_by = queryset.query.order_by or queryset.model._meta.ordering
+    if order_by and order_by[0] in KEYSET_ORDERINGS:
+        return order_by[0]
+    return DEFAULT_ORDERING
+
+
+def _keyset_query(queryset, page_size, cursor, ordering):
+    """The ``LIMIT page_size + 1`` queryset for a page, plus whether it walks backwards."""
+    field = ordering.lstrip('-')
+    value = pk = None
+    backwards = False
+    if cursor:
+        value, pk, backwards = decode_cursor(cursor, ordering)
+
+    # Walking backwards scans the reversed ordering and flips the page afterwards.
+    descending = ordering.startswith('-') != backwards
+    prefix, op = ('-', 'lt') if descending else ('', 'gt')
+    queryset = queryset.order_by(f'{prefix}{field}', f'{prefix}id')
+    if cursor:
+        queryset = queryset.filter(
+            Q(**{f'{field}__{op}e': value}),
+            Q(**{f'{field}__{op}': value}) | Q(**{f'id__{op}': pk}),
+        )
+    return queryset[:page_size + 1], backwards
+
+
+def _keyset_page(rows, page_size, cursor, ordering, backwards):
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+    has_next, has_previous = (cursor is not None, has_more) if backwards else (has_more, cursor is not None)
+
+    return KeysetPage(
+        rows,
+        ordering,
+        next_cursor=encode_cursor(ordering, rows[-1]) if rows and has_next else None,
+        previous_cursor=encode_cursor(ordering, rows[0], backwards=True) if rows and has_previous else None,
+    )
+
+
+def paginate_keyset(queryset, page_size, cursor=None, ordering=None):
+    ordering = ordering or keyset_ordering(queryset)
+    query, backwards = _keyset_query(queryset, page_size, cursor, ordering)
+    return _keyset_page(list(query), page_size, cursor, ordering, backwards)
+
+
+async def apaginate_keyset(queryset, page_size, cursor=None, ordering=None):
+    ordering = ordering or keyset_ordering(queryset)
+    query, backwards = _keyset_query(queryset, page_size, cursor, ordering)
+    return _keyset_page([row async for row in query], page_size, cursor, ordering, backwards)
+
+
+def classification_filters(queryset):
+    """
+    ``{field: value}`` when ``queryset`` is the jutsu table narrowed only by
+    equality filters on classification fields (possibly none), else None.
+    """
+    query = queryset.query
+    if queryset.model is not Jutsu or query.distinct or query.is_sliced or query.combinator:
+        return None
+    if len(query.alias_map) > 1 or query.where.connector != AND or query.where.negated:
+        return None
+    filters = {}
+    for lookup in query.where.children:
+        if not (isinstance(lookup, Exact) and isinstance(lookup.lhs, Col) and isinstance(lookup.rhs, str)):
+            return None
+        field = lookup.lhs.target.name
+        if field not in Jutsu.CLASSIFICATION_FIELDS or filters.get(field, lookup.rhs) != lookup.rhs:
+            return None
+        filters[field] = lookup.rhs
+    return filters
+
+
+def _counter_estimate(stats, filters):
+    """``(count, exact)`` from the dashboard counters, assuming the filters are independent."""
+    total = stats[TOTAL]
+    if not filters:
+        return total, True
+    if len(filters) == 1:
+        return stats[next(iter(filters.items()))], True
+    if not total:
+        return 0, True
+    return round(total * math.prod(stats[item] / total for item in filters.items())), False
+
+
+def _planner_rows(plan):
+    return int(json.loads(plan)[0]['Plan']['Plan Rows'])
+
+
+def _threshold():
+    return getattr(settings, 'CATALOG_ESTIMATED_COUNT_THRESHOLD', 10000)
+
+
+def estimate_count(queryset):
+    """
+    ``(count, estimated)`` for paginating ``queryset``:
+
+    * the jutsu table, whole or filtered on one classification field: the
+      dashboard counters (catalog.stats), which are exact;
+    * several classification filters: the counters combined as if the filters
+      were independent;
+    * anything else (searches, other filters): the planner's row estimate on
+      PostgreSQL; other databases count.
+
+    Estimates below ``CATALOG_ESTIMATED_COUNT_THRESHOLD`` are replaced by an
+    exact ``COUNT(*)``, which is cheap for a small set. A threshold of None
+    always counts.
+    """
+    threshold = _threshold()
+    if threshold is None:
+        return queryset.count(), False
+    filters = classification_filters(queryset)
+    if filters is not None:
+        count, exact = _counter_estimate(stored_stats(queryset.db), filters)
+    elif connections[queryset.db].vendor == 'postgresql':
+        count, exact = _planner_rows(queryset.order_by().explain(format='json')), False
+    else:
+        return queryset.count(), False
+    if exact or count >= threshold:
+        return count, not exact
+    return queryset.count(), False
+
+
+async def aestimate_count(queryset):
+    threshold = _threshold()
+    if threshold is None:
+        return await queryset.acount(), False
+    filters = classification_filters(queryset)
+    if filters is not None:
+        count, exact = _counter_estimate(await astored_stats(queryset.db), filters)
+    elif connections[queryset.db].vendor == 'postgresql':
+        count, exact = _planner_rows(await queryset.order_by().aexplain(format='json')), False
+    else:
+        return await queryset.acount(), False
+    if exact or count >= threshold:
+        return count, not exact
+    return await queryset.acount(), False
+
+
+class EstimatedCountPaginator(Paginator):
+    """A Paginator whose ``count`` comes from ``estimate_count``; ``count_is_estimated`` tells which."""
+    count_is_estimated = False
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        count, self.count_is_estimated = estimate_count(self.object_list)
+        return count
+
+
+class JutsuPagination(PageNumberPagination):
+    """
+    Page numbers by default, with ``count_is_estimated`` telling whether
+    ``count`` came from an estimate (``estimate_count``); ``?cursor=`` (empty
+    for the first page) switches to keyset pagination, which returns
+    ``next``/``previous`` links and no ``count``.
+    Searches keep page numbers, as on the HTML list: the cursor cannot follow
+    relevance order.
+    """
+    cursor_query_param = 'cursor'
+    django_paginator_class = EstimatedCountPaginator
+    keyset_page = None
+
+    def uses_keyset(self, request):
+        return self.cursor_query_param in request.query_params and not request.query_params.get('search')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.uses_keyset(request):
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        try:
+            self.keyset_page = paginate_keyset(
+                queryset,
+                self.get_page_size(request),
+                request.query_params[self.cursor_query_param] or None,
+                ordering=keyset_ordering(queryset),
+            )
+        except InvalidCursor:
+            raise NotFound('Cursor inválido.')
+        return list(self.keyset_page)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for the async API views: same pages, read with the async ORM."""
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.request = request
+        if self.uses_keyset(request):
+            try:
+                self.keyset_page = await apaginate_keyset(
+                    queryset,
+                    page_size,
+                    request.query_params[self.cursor_query_param] or None,
+                    ordering=keyset_ordering(queryset),
+                )
+            except InvalidCursor:
+                raise NotFound('Cursor inválido.')
+            return list(self.keyset_page)
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count, paginator.count_is_estimated = await aestimate_count(queryset)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.page.object_list = [row async for row in self.page.object_list]
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        if self.keyset_page is None:
+            paginator = self.page.paginator
+            return Response({
+                'count': paginator.count,
+                'count_is_estimated': paginator.count_is_estimated,
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link(),
+                'results': data,
+            })
+        return Response({
+            'next': self.get_cursor_link(self.keyset_page.next_cursor),
+            'previous': self.get_cursor_link(self.keyset_page.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        paginated = super().get_paginated_response_schema(schema)
+        properties = paginated['properties']
+        paginated['properties'] = {
+            'count': properties.pop('count'),
+            'count_is_estimated': {
+                'type': 'boolean',
+                'description': "Verdadeiro quando count é uma estimativa (listas grandes filtradas ou buscadas).",
+            },
+            **properties,
+        }
+        return paginated
+
+    def get_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
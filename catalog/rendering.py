@@ -0,0 +1,116 @@
+"""
+Render catalog URLs to files through the whole middleware stack.
+
+Used by catalog.static_catalog; it imports no models, so the spawned processes
+of ``render_parallel`` can load it before ``django.setup()``.
+"""
+import contextlib
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIRequest
+
+from .routers import COOKIE_NAME
+
+# The snapshot's versions of the pages; the async views under ASGI render the same ones.
+URLCONF = 'naruto_jutsu_catalog.snapshot_urls'
+BATCH_SIZE = 50
+
+_handler = None
+
+
+def _request(path, base_url):
+    url = urlsplit(base_url)
+    page, _, query = path.partition('?')
+    request = WSGIRequest({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': page,
+        'QUERY_STRING': query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': url.hostname,
+        'SERVER_PORT': str(url.port or (443 if url.scheme == 'https' else 80)),
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': url.netloc,
+        'HTTP_ACCEPT': 'application/json' if page.startswith('/api/') else 'text/html',
+        # On the primary: the pages must be at least as new as the change feed they were planned from.
+        'HTTP_COOKIE': f'{COOKIE_NAME}=1',
+        'wsgi.url_scheme': url.scheme,
+        'wsgi.input': BytesIO(),
+    })
+    request.urlconf = URLCONF
+    return request
+
+
+def _get_handler():
+    global _handler
+    if _handler is None:
+        handler = BaseHandler()
+        handler.load_middleware()
+        _handler = handler
+    return _handler
+
+
+def write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # nginx never serves a partial file.
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix='.tmp-', delete=False) as file:
+        file.write(content)
+    # The temporary file is private (0600); nginx runs as another user.
+    os.chmod(file.name, 0o644)
+    os.replace(file.name, path)
+
+
+def remove(directory, name):
+    path = directory / name
+    path.unlink(missing_ok=True)
+    with contextlib.suppress(OSError):
+        path.parent.rmdir()
+
+
+def render_pages(directory, base_url, pages):
+    """Render ``[(path, file)]`` into ``directory``; returns the files written and those removed (404)."""
+    directory = Path(directory)
+    handler = _get_handler()
+    rendered, removed = [], []
+    for path, name in pages:
+        response = handler.get_response(_request(path, base_url))
+        if response.status_code == 404:
+            remove(directory, name)
+            removed.append(name)
+        elif response.status_code != 200:
+            raise RuntimeError(f'{path}: HTTP {response.status_code}')
+        else:
+            write(directory / name, response.content)
+            rendered.append(name)
+    return rendered, removed
+
+
+def _init_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'naruto_jutsu_catalog.settings.dev')
+    import django
+    django.setup()
+
+
+def render_parallel(directory, base_url, pages, workers):
+    """``render_pages`` in batches over ``workers`` processes; inline with 0 workers or a single batch."""
+    batches = [pages[start:start + BATCH_SIZE] for start in range(0, len(pages), BATCH_SIZE)]
+    if workers <= 0 or len(batches) <= 1:
+        return render_pages(directory, base_url, pages)
+    rendered, removed = [], []
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(batches)),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+    ) as pool:
+        futures = [pool.submit(render_pages, str(directory), base_url, batch) for batch in batches]
+        for future in futures:
+            written, missing = future.result()
+            rendered += written
+            removed += missing
+    return rendered, removed
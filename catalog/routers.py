@@ -0,0 +1,122 @@
+"""
+Read replicas (``CATALOG_READ_REPLICAS``, configured from ``SQL_REPLICAS``).
+
+``PrimaryReplicaRouter`` sends every write to ``default``, and reads too,
+except inside the GET/HEAD requests of the read views: those with
+``read_from_replica = True`` and the ``replica_actions`` of a viewset.
+``ReplicaMiddleware`` picks one replica for such a request, so all of its
+queries see the same snapshot; only the catalog's own models are read there,
+sessions and users always come from the primary. The read helpers of
+catalog.stats, catalog.versioning, catalog.similarity and catalog.changes
+default to ``using=None``, which is the router's choice.
+
+A request that writes to the catalog sets a cookie keeping that browser on the
+primary for ``CATALOG_REPLICA_STICKY_SECONDS``, so it reads its own writes
+despite the replication lag. Clients without cookies get no such guarantee.
+"""
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+COOKIE_NAME = 'catalog_primary'
+
+_current = contextvars.ContextVar('catalog_request_databases', default=None)
+
+
+class RequestDatabases:
+    """What the router needs to know about the current request."""
+    __slots__ = ('pinned', 'replica', 'wrote')
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.replica = None
+        self.wrote = False
+
+
+def read_replicas():
+    return getattr(settings, 'CATALOG_READ_REPLICAS', [])
+
+
+def reads_from_replica(request, view_func):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    actions = getattr(view_func, 'actions', None) or getattr(view_class, 'actions', None)
+    if actions:
+        return actions.get('get') in getattr(view_class, 'replica_actions', ())
+    return getattr(view_class, 'read_from_replica', False)
+
+
+def _is_catalog(model):
+    return model._meta.app_label == 'catalog'
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is not None and state.replica is not None and _is_catalog(model):
+            return state.replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None and _is_catalog(model):
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication.
+        return db not in read_replicas()
+
+
+class ReplicaMiddleware:
+    """Chooses the replica of each read request and keeps recent writers on the primary."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RequestDatabases(COOKIE_NAME in request.COOKIES)
+        token = _current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = RequestDatabases(COOKIE_NAME in request.COOKIES)
+        token = _current.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, state)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _current.get()
+        replicas = read_replicas()
+        if state is not None and replicas and not state.pinned and reads_from_replica(request, view_func):
+            state.replica = random.choice(replicas)
+
+    def finish(self, request, response, state):
+        if state.wrote and read_replicas():
+            response.set_cookie(
+                COOKIE_NAME, '1', max_age=getattr(settings, 'CATALOG_REPLICA_STICKY_SECONDS', 10),
+                secure=request.is_secure(), httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,92 @@
+"""
+Random featured jutsus without ``ORDER BY RANDOM()``.
+
+The ids of every bucket are cached as a compact array; sampling happens in
+memory and the chosen rows are fetched with a single primary-key lookup.
+The signal handlers in ``catalog.signals`` drop a bucket when a jutsu enters
+or leaves it.
+"""
+import random
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import Jutsu
+
+HIGH_RANKS = [Jutsu.Ranks.A, Jutsu.Ranks.S, Jutsu.Ranks.SS]
+
+BUCKETS = {
+    'fire': Q(element_type=Jutsu.Elements.FIRE),
+    'water': Q(element_type=Jutsu.Elements.WATER),
+    'high_rank': Q(rank__in=HIGH_RANKS),
+}
+
+CACHE_KEY = 'catalog:sample-bucket:{}'
+
+
+def _timeout():
+    return getattr(settings, 'CATALOG_SAMPLE_CACHE_TIMEOUT', 600)
+
+
+def bucket_ids(name):
+    key = CACHE_KEY.format(name)
+    ids = cache.get(key)
+    if ids is None:
+        ids = array('q', Jutsu.objects.filter(BUCKETS[name]).order_by().values_list('id', flat=True))
+        cache.set(key, ids, _timeout())
+    return ids
+
+
+async def abucket_ids(name):
+    key = CACHE_KEY.format(name)
+    ids = await cache.aget(key)
+    if ids is None:
+        ids = array('q', [pk async for pk in Jutsu.objects.filter(BUCKETS[name]).order_by().values_list('id', flat=True)])
+        await cache.aset(key, ids, _timeout())
+    return ids
+
+
+def buckets_for(values):
+    """Names of the buckets a jutsu with these classification values belongs to."""
+    names = set()
+    if values:
+        if values['element_type'] == Jutsu.Elements.FIRE:
+            names.add('fire')
+        if values['element_type'] == Jutsu.Elements.WATER:
+            names.add('water')
+        if values['rank'] in HIGH_RANKS:
+            names.add('high_rank')
+    return names
+
+
+def invalidate(names=None):
+    cache.delete_many([CACHE_KEY.format(name) for name in (BUCKETS if names is None else names)])
+
+
+def _pick(ids_by_bucket, sizes):
+    return {name: random.sample(ids_by_bucket[name], min(k, len(ids_by_bucket[name]))) for name, k in sizes.items()}
+
+
+def _assemble(picks, jutsus):
+    # Ids cached by another process may already be gone; just skip them.
+    return {name: [jutsus[pk] for pk in ids if pk in jutsus] for name, ids in picks.items()}
+
+
+def sample_jutsus(**sizes):
+    """
+    ``sample_jutsus(fire=2, water=2)`` -> ``{'fire': [...], 'water': [...]}``.
+
+    Each list holds up to k distinct random jutsus from its bucket. Every
+    bucket is sampled independently; all rows are loaded in one query.
+    """
+    picks = _pick({name: bucket_ids(name) for name in sizes}, sizes)
+    wanted = {pk for ids in picks.values() for pk in ids}
+    return _assemble(picks, Jutsu.objects.in_bulk(wanted) if wanted else {})
+
+
+async def asample_jutsus(**sizes):
+    picks = _pick({name: await abucket_ids(name) for name in sizes}, sizes)
+    wanted = {pk for ids in picks.values() for pk in ids}
+    return _assemble(picks, await Jutsu.objects.ain_bulk(wanted) if wanted else {})
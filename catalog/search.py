@@ -0,0 +1,203 @@
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+
+FTS_TABLE = 'catalog_jutsu_fts'
+PG_CONFIG = 'catalog_pt'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_COMBINING_RE = re.compile('[\u0300-\u036f]')
+
+SQLITE_INSTALL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description,
+        content='catalog_jutsu', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON catalog_jutsu BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON catalog_jutsu BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON catalog_jutsu BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+SQLITE_UNINSTALL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+POSTGRES_INSTALL = [
+    'CREATE EXTENSION IF NOT EXISTS unaccent',
+    f"""
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = '{PG_CONFIG}') THEN
+            CREATE TEXT SEARCH CONFIGURATION {PG_CONFIG} (COPY = portuguese);
+            ALTER TEXT SEARCH CONFIGURATION {PG_CONFIG}
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+        END IF;
+    END $$
+    """,
+    'ALTER TABLE catalog_jutsu ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    'CREATE INDEX IF NOT EXISTS catalog_jutsu_search_vector_gin ON catalog_jutsu USING gin (search_vector)',
+    f"""
+    CREATE OR REPLACE FUNCTION catalog_jutsu_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{PG_CONFIG}', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('{PG_CONFIG}', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    'DROP TRIGGER IF EXISTS catalog_jutsu_search_vector_trigger ON catalog_jutsu',
+    """
+    CREATE TRIGGER catalog_jutsu_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF name, description ON catalog_jutsu
+        FOR EACH ROW EXECUTE FUNCTION catalog_jutsu_search_vector_update()
+    """,
+]
+
+POSTGRES_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS catalog_jutsu_search_vector_trigger ON catalog_jutsu',
+    'DROP FUNCTION IF EXISTS catalog_jutsu_search_vector_update()',
+    'DROP INDEX IF EXISTS catalog_jutsu_search_vector_gin',
+    'ALTER TABLE catalog_jutsu DROP COLUMN IF EXISTS search_vector',
+]
+
+_available = {}
+
+
+def install_search_index(connection):
+    """Create (or repair) the full-text index and its sync triggers, then rebuild it."""
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        statements = SQLITE_INSTALL
+    elif vendor == 'postgresql':
+        statements = POSTGRES_INSTALL
+    else:
+        return
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+    rebuild_search_index(connection)
+    _available.pop(connection.alias, None)
+
+
+def uninstall_search_index(connection):
+    statements = {
+        'sqlite': SQLITE_UNINSTALL,
+        'postgresql': POSTGRES_UNINSTALL,
+    }.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+    _available.pop(connection.alias, None)
+
+
+def rebuild_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        elif connection.vendor == 'postgresql':
+            # Touching name fires the BEFORE UPDATE trigger for every row.
+            cursor.execute('UPDATE catalog_jutsu SET name = name')
+
+
+def search_index_is_healthy(connection):
+    """True when the index and all of its sync triggers are present."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+                [FTS_TABLE, f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au'],
+            )
+            return cursor.fetchone()[0] == 4
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                "SELECT count(*) FROM pg_trigger WHERE tgname = 'catalog_jutsu_search_vector_trigger'"
+            )
+            return cursor.fetchone()[0] == 1
+    return False
+
+
+def is_available(using='default'):
+    if not getattr(settings, 'CATALOG_FULL_TEXT_SEARCH', True):
+        return False
+    if using not in _available:
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                _available[using] = cursor.fetchone() is not None
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT 1 FROM information_schema.columns "
+                    "WHERE table_name = 'catalog_jutsu' AND column_name = 'search_vector'"
+                )
+                _available[using] = cursor.fetchone() is not None
+            else:
+                _available[using] = False
+    return _available[using]
+
+
+def tokenize(query):
+    return _TOKEN_RE.findall(query or '')
+
+
+def strip_accents(text):
+    """Lowercase ``text`` without diacritics, like the full-text indexes see it."""
+    return _COMBINING_RE.sub('', unicodedata.normalize('NFKD', text.lower()))
+
+
+def search_jutsus(queryset, query):
+    """
+    Filter ``queryset`` down to the jutsus matching ``query``, best matches first.
+
+    Every word of the query must match (the last one as a prefix) in the name or
+    the description; names weigh more than descriptions in the ranking. Falls back
+    to ``icontains`` when the database has no full-text index.
+    """
+    tokens = tokenize(query)
+    if not tokens or not is_available(queryset.db):
+        return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = catalog_jutsu.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            select={'search_rank': f'bm25({FTS_TABLE}, 10.0, 1.0)'},
+        )
+    else:
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        queryset = queryset.extra(
+            where=[f"catalog_jutsu.search_vector @@ to_tsquery('{PG_CONFIG}', %s)"],
+            params=[tsquery],
+            select={'search_rank': f"-ts_rank_cd(catalog_jutsu.search_vector, to_tsquery('{PG_CONFIG}', %s))"},
+            select_params=[tsquery],
+        )
+    return queryset.order_by('search_rank', 'name')
@@ -1,10 +1,87 @@
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+from django.core.files.storage import default_storage
+from django.utils.translation import get_language
+from . import images
+from .instrumentation import timed
 from .models import Jutsu
 
+
+class JutsuListSerializer(serializers.ListSerializer):
+    """
+    Read-only fast path for lists given ``.values(*VALUE_FIELDS)`` rows instead
+    of instances: no model instances, display labels from per-language dicts and
+    media URLs without storage calls. The output is identical to serializing the
+    instances with JutsuSerializer; model instances still take the normal path.
+    """
+    VALUE_FIELDS = [
+        'id', 'name', 'description', 'element_type', 'jutsu_type', 'rank',
+        'image', 'image_variants', 'created_at', 'updated_at',
+    ]
+    _labels = {}
+
+    @classmethod
+    def labels(cls):
+        language = get_language()
+        if language not in cls._labels:
+            cls._labels[language] = tuple(
+                {value: str(label) for value, label in Jutsu._meta.get_field(name).flatchoices}
+                for name in ('element_type', 'jutsu_type', 'rank')
+            )
+        return cls._labels[language]
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+    def to_representation(self, data):
+        rows = data.all() if hasattr(data, 'all') else data
+        if not isinstance(rows, list):
+            rows = list(rows)
+        if not rows or not isinstance(rows[0], dict):
+            return super().to_representation(rows)
+
+        request = self.context.get('request')
+        absolute = request.build_absolute_uri if request is not None else str
+        elements, types, ranks = self.labels()
+        datetime = serializers.DateTimeField().to_representation
+        results = []
+        for row in rows:
+            image = row['image']
+            variants = []
+            manifest = row['image_variants'] or {}
+            if image and manifest.get('source', '') == image:
+                variants = [{
+                    'url': absolute(images.media_url(variant['name'])),
+                    'format': variant['format'],
+                    'width': variant['width'],
+                    'height': variant['height'],
+                } for variant in manifest.get('variants', [])]
+            element_type, jutsu_type, rank = row['element_type'], row['jutsu_type'], row['rank']
+            results.append({
+                'id': row['id'],
+                'name': row['name'],
+                'description': row['description'],
+                'element_type': element_type,
+                'element_display': elements.get(element_type, element_type),
+                'jutsu_type': jutsu_type,
+                'type_display': types.get(jutsu_type, jutsu_type),
+                'rank': rank,
+                'rank_display': ranks.get(rank, rank),
+                'image': absolute(images.media_url(image)) if image else None,
+                'image_variants': variants,
+                'created_at': datetime(row['created_at']),
+                'updated_at': datetime(row['updated_at']),
+            })
+        return results
+
+
 class JutsuSerializer(serializers.ModelSerializer):
     element_display = serializers.CharField(source='get_element_type_display', read_only=True)
     type_display = serializers.CharField(source='get_jutsu_type_display', read_only=True)
     rank_display = serializers.CharField(source='get_rank_display', read_only=True)
+    image_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = Jutsu
@@ -13,5 +90,101 @@ class JutsuSerializer(serializers.ModelSerializer):
             'element_type', 'element_display',
             'jutsu_type', 'type_display',
             'rank', 'rank_display',
-            'image', 'created_at', 'updated_at'
-        ]
\ No newline at end of file
+            'image', 'image_variants', 'created_at', 'updated_at'
+        ]
+        list_serializer_class = JutsuListSerializer
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+    def get_image_variants(self, obj):
+        if not obj.image or not images.manifest_is_current(obj):
+            return []
+        request = self.context.get('request')
+        variants = []
+        for variant in obj.image_variants.get('variants', []):
+            url = default_storage.url(variant['name'])
+            variants.append({
+                'url': request.build_absolute_uri(url) if request is not None else url,
+                'format': variant['format'],
+                'width': variant['width'],
+                'height': variant['height'],
+            })
+        return variants
+
+
+class JutsuImportSerializer(JutsuSerializer):
+    """
+    Same field rules as JutsuSerializer for bulk imports, which upsert by name:
+    the unique check on ``name`` is left to the database, and ``image`` is a path
+    already present in storage rather than an upload.
+    """
+    image = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
+
+    class Meta(JutsuSerializer.Meta):
+        list_serializer_class = serializers.ListSerializer
+        extra_kwargs = {'name': {'validators': []}}
+
+
+class JutsuBulkListSerializer(serializers.ListSerializer):
+    """
+    Validates a batch of the bulk API. ``name`` is checked once for the whole
+    batch -- repeated in it, or taken by another jutsu, in a single query --
+    instead of by a UniqueValidator query per item. When updating,
+    ``instance`` lists the jutsus the items target, in order (None where the
+    ``id`` matched nothing).
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list) or (self.max_length is not None and len(data) > self.max_length):
+            # Raises the list-level error.
+            return super().to_internal_value(data)
+        instances = self.instance if self.instance is not None else [None] * len(data)
+        items, errors = [], []
+        for item, instance in zip(data, instances):
+            if self.instance is not None and instance is None:
+                pk = item.get('id') if isinstance(item, dict) else None
+                message = serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+                items.append(None)
+                errors.append({'id': [message.format(pk_value=pk)]})
+                continue
+            try:
+                items.append(self.child.run_validation(item))
+                errors.append({})
+            except serializers.ValidationError as exc:
+                items.append(None)
+                errors.append(exc.detail)
+        self.check_names(items, instances, errors)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+    def check_names(self, items, instances, errors):
+        positions = {}
+        for position, item in enumerate(items):
+            if item is not None and 'name' in item:
+                positions.setdefault(item['name'], []).append(position)
+        if not positions:
+            return
+        taken = dict(Jutsu.objects.filter(name__in=positions).values_list('name', 'pk'))
+        for name, found in positions.items():
+            for position in found:
+                instance = instances[position]
+                owner = taken.get(name)
+                if len(found) > 1 or (owner is not None and (instance is None or owner != instance.pk)):
+                    errors[position] = {**errors[position], 'name': [UniqueValidator.message]}
+
+
+class JutsuBulkSerializer(JutsuSerializer):
+    """
+    JutsuSerializer for the bulk API: uniqueness of ``name`` is checked per
+    batch by JutsuBulkListSerializer, and ``image`` is read-only (batches are
+    JSON, images are uploaded one jutsu at a time).
+    """
+
+    class Meta(JutsuSerializer.Meta):
+        list_serializer_class = JutsuBulkListSerializer
+        read_only_fields = ['image']
+        extra_kwargs = {'name': {'validators': []}}
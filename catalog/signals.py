@@ -0,0 +1,89 @@
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import autocomplete, changes, images, instrumentation, media, sampling, search, similarity, stats
+from .versioning import bump_revision
+from .models import Jutsu, JutsuNeighbor
+
+
+@receiver(post_migrate)
+def repair_search_index(sender, app_config=None, using=DEFAULT_DB_ALIAS, **kwargs):
+    # SQLite drops the sync triggers whenever a migration rebuilds catalog_jutsu.
+    if app_config is None or app_config.label != 'catalog' or not router.allow_migrate(using, 'catalog'):
+        return
+    connection = connections[using]
+    if not search.search_index_is_healthy(connection):
+        search.install_search_index(connection)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    instrumentation.install_query_hook(connection)
+
+
+def _classification(jutsu):
+    return {field: getattr(jutsu, field) for field in Jutsu.CLASSIFICATION_FIELDS}
+
+
+@receiver(pre_save, sender=Jutsu)
+def remember_previous_state(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    previous = getattr(instance, '_loaded_classification', None)
+    image = getattr(instance, '_loaded_image', None)
+    if (previous is None or image is None) and instance.pk is not None:
+        row = (
+            Jutsu.objects.using(using)
+            .filter(pk=instance.pk)
+            .values('image', *Jutsu.CLASSIFICATION_FIELDS)
+            .first()
+        )
+        if row is not None:
+            loaded_image = row.pop('image') or ''
+            image = loaded_image if image is None else image
+            previous = previous or row
+    instance._previous_classification = previous
+    instance._previous_image = image
+
+
+@receiver(post_save, sender=Jutsu)
+def track_jutsu_save(sender, instance, created, using=DEFAULT_DB_ALIAS, **kwargs):
+    previous = None if created else getattr(instance, '_previous_classification', None)
+    current = _classification(instance)
+    stats.record_change(previous, current, using)
+    bump_revision(using)
+    changes.record([instance.pk], changes.CREATED if created else changes.UPDATED, using)
+    if previous != current:
+        buckets = sampling.buckets_for(previous) | sampling.buckets_for(current)
+        transaction.on_commit(lambda: sampling.invalidate(buckets), using=using)
+    previous_image = getattr(instance, '_previous_image', None)
+    if previous_image and previous_image != (instance.image.name or ''):
+        media.enqueue([previous_image], source=previous_image, using=using)
+    if not images.manifest_is_current(instance):
+        images.schedule_variants(instance, using)
+    similarity.schedule_refresh(changed=[instance.pk], using=using)
+    pk, name = instance.pk, instance.name
+    transaction.on_commit(lambda: autocomplete.record(pk, name), using=using)
+
+
+@receiver(pre_delete, sender=Jutsu)
+def remember_similar_lists(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    # The lists that include this jutsu lose it to the cascade; they get refilled after the commit.
+    instance._similar_lists = list(
+        JutsuNeighbor.objects.using(using).filter(neighbor_id=instance.pk).values_list('jutsu_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Jutsu)
+def track_jutsu_delete(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    previous = getattr(instance, '_loaded_classification', None) or _classification(instance)
+    stats.record_change(previous, None, using)
+    bump_revision(using)
+    changes.record([instance.pk], changes.DELETED, using)
+    media.enqueue_jutsu_files([(instance.image.name, instance.image_variants)], using)
+    buckets = sampling.buckets_for(previous)
+    transaction.on_commit(lambda: sampling.invalidate(buckets), using=using)
+    pk = instance.pk
+    transaction.on_commit(lambda: autocomplete.record(pk), using=using)
+    # Its words leave the frequencies; the lists that held it get refilled.
+    similarity.schedule_refresh(stale=getattr(instance, '_similar_lists', ()), deleted=[pk], using=using)
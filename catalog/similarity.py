@@ -0,0 +1,485 @@
+"""
+Precomputed "similar jutsus".
+
+Each jutsu is a TF-IDF vector over its name and description (sparse dicts,
+L2-normalized, name words counted twice). The similarity of two jutsus
+combines the cosine of their vectors with their classification:
+
+    0.6 * cosine + 0.2 * same element + 0.1 * same type + 0.1 * rank closeness
+
+The ``TOP_K`` best neighbors of every jutsu are stored in ``JutsuNeighbor``, so
+serving them is one indexed lookup. The vectors are stored too (``JutsuTerm``,
+one row per word, which doubles as the inverted index) with the document
+frequency of every word (``SimilarityTerm``). After a jutsu is saved or
+deleted, ``refresh_similar`` recomputes its vector, adjusts the frequencies of
+the words it gained or lost, and recomputes its list and only the lists it
+enters or leaves, reading the vectors of the jutsus that share its words.
+
+The other vectors keep the weights of their last indexing while frequencies
+drift. ``rebuild_similar()`` (``manage.py rebuild_similar_jutsus``) recomputes
+everything; it is also what writes that bypass signals (``bulk_create``,
+``QuerySet.update``) need, and what fills the vectors of a catalog indexed
+before they were stored.
+
+A list that changes moves the jutsu's ``similar_updated_at`` (part of its
+detail page's validators), never its ``updated_at``, and is recorded in the
+change feed (see ``changes.record_refreshed``).
+"""
+import heapq
+import itertools
+import logging
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from . import changes
+from .models import Jutsu, JutsuNeighbor, JutsuTerm, SimilarityTerm
+from .search import strip_accents
+from .stats import total_jutsus
+from .versioning import bump_revision
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 6
+NAME_WEIGHT = 2
+TEXT_WEIGHT, ELEMENT_WEIGHT, TYPE_WEIGHT, RANK_WEIGHT = 0.6, 0.2, 0.1, 0.1
+# Candidates are found through the words shared with a jutsu, except words in
+# more than this share of the catalog (and more than MIN_POSTINGS jutsus): they
+# say little and would make every jutsu a candidate of every other one. The
+# CANDIDATES * k best partial dot products are then scored in full.
+MAX_DOCUMENT_SHARE = 0.01
+MIN_POSTINGS = 50
+CANDIDATES = 4
+BATCH_SIZE = 2000
+# Longer words are not indexed (SimilarityTerm.term).
+MAX_TERM_LENGTH = 50
+
+RANK_ORDER = {value: index for index, (value, _) in enumerate(Jutsu.Ranks.choices)}
+STOPWORDS = frozenset(
+    'ao aos as com como da das de do dos ela ele em entre era essa esse esta este foi mais '
+    'mas na nas no nos num numa os ou para pela pelo por que se sem seu sua sao ser sobre uma um'.split()
+)
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+FIELDS = ('id', 'name', 'description', 'element_type', 'jutsu_type', 'rank')
+
+_executor = None
+_queued = {}
+_lock = threading.Lock()
+
+
+def tokens(text):
+    return [
+        word for word in _TOKEN_RE.findall(strip_accents(text))
+        if 2 < len(word) <= MAX_TERM_LENGTH and word not in STOPWORDS
+    ]
+
+
+def term_counts(name, description):
+    terms = Counter(tokens(description))
+    for word in tokens(name):
+        terms[word] += NAME_WEIGHT
+    return terms
+
+
+def weigh(terms, frequencies, total):
+    """The L2-normalized TF-IDF vector of the word counts ``terms``."""
+    vector = {
+        word: (1 + math.log(count)) * (math.log((1 + total) / (1 + frequencies.get(word, 0))) + 1)
+        for word, count in terms.items()
+    }
+    norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+    return {word: weight / norm for word, weight in vector.items()}
+
+
+def posting_limit(total):
+    return max(MAX_DOCUMENT_SHARE * total, MIN_POSTINGS)
+
+
+def _features(element_type, jutsu_type, rank):
+    return element_type, jutsu_type, RANK_ORDER.get(rank, 0)
+
+
+def _chunks(values, size=500):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class SimilarityIndex:
+    """Vectors and an inverted index of the whole catalog, built in one pass over the table."""
+
+    def __init__(self, rows):
+        self.vectors = {}
+        self.features = {}
+        self.postings = defaultdict(list)
+        self.by_element = defaultdict(list)
+        self.by_type = defaultdict(list)
+        documents = {}
+        self.frequencies = frequencies = Counter()
+        for pk, name, description, element_type, jutsu_type, rank in rows:
+            documents[pk] = terms = term_counts(name, description)
+            frequencies.update(terms.keys())
+            self.features[pk] = _features(element_type, jutsu_type, rank)
+
+        total = len(documents)
+        limit = posting_limit(total)
+        for pk, terms in documents.items():
+            self.vectors[pk] = vector = weigh(terms, frequencies, total)
+            for word, weight in vector.items():
+                if frequencies[word] <= limit:
+                    self.postings[word].append((pk, weight))
+            element_type, jutsu_type, _ = self.features[pk]
+            self.by_element[element_type].append(pk)
+            self.by_type[jutsu_type].append(pk)
+
+    @classmethod
+    def load(cls, using=DEFAULT_DB_ALIAS):
+        rows = Jutsu.objects.using(using).order_by().values_list(*FIELDS)
+        return cls(rows.iterator(chunk_size=BATCH_SIZE))
+
+    def __contains__(self, pk):
+        return pk in self.vectors
+
+    def prefetch(self, pks):
+        """Load the vectors of ``pks`` ahead of scoring them; all are loaded here."""
+
+    def posting_lists(self, words):
+        """``{word: [(jutsu, weight)]}``, empty for the words too common to find candidates by."""
+        return {word: self.postings.get(word, ()) for word in words}
+
+    def pools(self, pk, size):
+        """Up to ``size`` jutsus of the same element, then of the same type, then any."""
+        element_type, jutsu_type, _ = self.features[pk]
+        for pool in (self.by_element[element_type], self.by_type[jutsu_type], self.vectors):
+            yield itertools.islice(pool, size)
+
+    def score(self, a, b):
+        vector, other = self.vectors[a], self.vectors[b]
+        if len(other) < len(vector):
+            vector, other = other, vector
+        cosine = sum(weight * other.get(word, 0.0) for word, weight in vector.items())
+        (element_a, type_a, rank_a), (element_b, type_b, rank_b) = self.features[a], self.features[b]
+        return (
+            TEXT_WEIGHT * cosine
+            + ELEMENT_WEIGHT * (element_a == element_b)
+            + TYPE_WEIGHT * (type_a == type_b)
+            + RANK_WEIGHT * (1 - abs(rank_a - rank_b) / (len(RANK_ORDER) - 1))
+        )
+
+    def candidates(self, pk, k=TOP_K):
+        """
+        The jutsus closest to ``pk`` by its less common words. When they are
+        fewer than ``k``, jutsus of the same element, then of the same type,
+        then any, make up the difference.
+        """
+        vector = self.vectors[pk]
+        partial = defaultdict(float)
+        for word, posting in self.posting_lists(vector).items():
+            weight = vector[word]
+            for other, other_weight in posting:
+                partial[other] += weight * other_weight
+        partial.pop(pk, None)
+        found = set(heapq.nlargest(CANDIDATES * k, partial, key=partial.get))
+        for pool in self.pools(pk, CANDIDATES * k + 1):
+            if len(found) >= k:
+                break
+            found.update(pool)
+            found.discard(pk)
+        return found
+
+    def scores(self, pk, k=TOP_K):
+        candidates = self.candidates(pk, k)
+        self.prefetch(candidates)
+        return {other: self.score(pk, other) for other in candidates if other in self}
+
+    def neighbors(self, pk, k=TOP_K):
+        """``[(neighbor, score)]``, best first; ties go to the lower id."""
+        return heapq.nsmallest(k, self.scores(pk, k).items(), key=lambda item: (-item[1], item[0]))
+
+
+class StoredSimilarityIndex(SimilarityIndex):
+    """
+    The same lookups over the stored vectors and frequencies, read as needed:
+    what refreshing a few lists takes, without reading the whole catalog.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.vectors = {}
+        self.features = {}
+        self.postings = {}
+        self.frequencies = {}
+        self.missing = set()
+        self.total = total_jutsus(using)
+        self.limit = posting_limit(self.total)
+
+    def __contains__(self, pk):
+        self.prefetch([pk])
+        return pk in self.features
+
+    def prefetch(self, pks):
+        pks = [pk for pk in pks if pk not in self.features and pk not in self.missing]
+        for chunk in _chunks(pks):
+            rows = Jutsu.objects.using(self.using).filter(pk__in=chunk).values_list(
+                'id', 'element_type', 'jutsu_type', 'rank'
+            )
+            for pk, element_type, jutsu_type, rank in rows:
+                self.features[pk] = _features(element_type, jutsu_type, rank)
+                # Not indexed yet (see rebuild_similar): no words in common with anyone.
+                self.vectors[pk] = {}
+            self.missing.update(pk for pk in chunk if pk not in self.features)
+            terms = JutsuTerm.objects.using(self.using).filter(jutsu_id__in=chunk).values_list(
+                'jutsu_id', 'term', 'weight'
+            )
+            for pk, term, weight in terms:
+                if pk in self.vectors:
+                    self.vectors[pk][term] = weight
+
+    def load_frequencies(self, words):
+        words = [word for word in words if word not in self.frequencies]
+        for chunk in _chunks(words):
+            self.frequencies.update(dict.fromkeys(chunk, 0))
+            self.frequencies.update(
+                SimilarityTerm.objects.using(self.using).filter(term__in=chunk).values_list('term', 'documents')
+            )
+
+    def posting_lists(self, words):
+        self.load_frequencies(words)
+        wanted = [word for word in words if word not in self.postings]
+        for word in wanted:
+            self.postings[word] = []
+        for chunk in _chunks([word for word in wanted if self.frequencies[word] <= self.limit]):
+            terms = JutsuTerm.objects.using(self.using).filter(term__in=chunk).values_list(
+                'term', 'jutsu_id', 'weight'
+            )
+            for term, pk, weight in terms.iterator(chunk_size=BATCH_SIZE):
+                self.postings[term].append((pk, weight))
+        return {
+            word: self.postings[word] if self.frequencies[word] <= self.limit else ()
+            for word in words
+        }
+
+    def pools(self, pk, size):
+        element_type, jutsu_type, _ = self.features[pk]
+        jutsus = Jutsu.objects.using(self.using).order_by('pk').values_list('pk', flat=True)
+        for filters in ({'element_type': element_type}, {'jutsu_type': jutsu_type}, {}):
+            yield list(jutsus.filter(**filters)[:size])
+
+    def index_jutsus(self, ids):
+        """
+        Store the vectors of the jutsus ``ids`` as they are now -- none for
+        those deleted -- and move the frequencies of the words they gained or
+        lost. Returns the ids still in the catalog.
+        """
+        stored = JutsuTerm.objects.using(self.using)
+        before, documents = defaultdict(set), {}
+        for chunk in _chunks(ids):
+            for pk, term in stored.filter(jutsu_id__in=chunk).values_list('jutsu_id', 'term'):
+                before[pk].add(term)
+            for pk, name, description, element_type, jutsu_type, rank in (
+                Jutsu.objects.using(self.using).filter(pk__in=chunk).values_list(*FIELDS)
+            ):
+                documents[pk] = term_counts(name, description)
+                self.features[pk] = _features(element_type, jutsu_type, rank)
+        delta = Counter()
+        for pk in ids:
+            after = set(documents.get(pk, ()))
+            delta.update(after - before[pk])
+            delta.subtract(before[pk] - after)
+        self._move_frequencies(delta)
+
+        self.load_frequencies({word for terms in documents.values() for word in terms})
+        rows = []
+        for pk, terms in documents.items():
+            self.vectors[pk] = vector = weigh(terms, self.frequencies, self.total)
+            rows.extend(JutsuTerm(jutsu_id=pk, term=word, weight=weight) for word, weight in vector.items())
+        for chunk in _chunks(ids):
+            stored.filter(jutsu_id__in=chunk).delete()
+        stored.bulk_create(rows, batch_size=BATCH_SIZE)
+        self.postings.clear()
+        return list(documents)
+
+    def _move_frequencies(self, delta):
+        terms = SimilarityTerm.objects.using(self.using)
+        terms.bulk_create(
+            [SimilarityTerm(term=word) for word, change in delta.items() if change > 0],
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+        by_change = defaultdict(list)
+        for word, change in delta.items():
+            if change:
+                by_change[change].append(word)
+        for change, words in by_change.items():
+            for chunk in _chunks(words):
+                terms.filter(term__in=chunk).update(documents=F('documents') + change)
+        for chunk in _chunks(word for word, change in delta.items() if change < 0):
+            terms.filter(term__in=chunk, documents__lte=0).delete()
+        self.frequencies.clear()
+
+
+def _rows(pk, neighbors):
+    return [
+        JutsuNeighbor(jutsu_id=pk, neighbor_id=neighbor, position=position, score=round(score, 6))
+        for position, (neighbor, score) in enumerate(neighbors)
+    ]
+
+
+def _write_lists(lists, using):
+    """Store the lists ``{jutsu: [JutsuNeighbor]}`` that differ from the current ones; returns their jutsus."""
+    neighbors = JutsuNeighbor.objects.using(using)
+    updated = []
+    for chunk in _chunks(lists, BATCH_SIZE):
+        current = defaultdict(list)
+        rows = neighbors.filter(jutsu_id__in=chunk).order_by('jutsu_id', 'position').values_list(
+            'jutsu_id', 'neighbor_id', 'score'
+        )
+        for pk, neighbor, score in rows:
+            current[pk].append((neighbor, score))
+        changed = [pk for pk in chunk if current[pk] != [(row.neighbor_id, row.score) for row in lists[pk]]]
+        for part in _chunks(changed):
+            neighbors.filter(jutsu_id__in=part).delete()
+        neighbors.bulk_create([row for pk in changed for row in lists[pk]], batch_size=BATCH_SIZE)
+        updated += changed
+    return updated
+
+
+def _mark_refreshed(updated, using, written=()):
+    if not updated:
+        return
+    now = timezone.now()
+    for chunk in _chunks(updated):
+        Jutsu.objects.using(using).filter(pk__in=chunk).update(similar_updated_at=now)
+    bump_revision(using)
+    # Mirrors and the static snapshot pick up the new lists.
+    changes.record_refreshed(updated, written, using)
+
+
+def _store_index(index, using):
+    stored = JutsuTerm.objects.using(using)
+    stored.all().delete()
+    stored.bulk_create(
+        (
+            JutsuTerm(jutsu_id=pk, term=word, weight=weight)
+            for pk, vector in index.vectors.items() for word, weight in vector.items()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    terms = SimilarityTerm.objects.using(using)
+    terms.all().delete()
+    terms.bulk_create(
+        (SimilarityTerm(term=word, documents=count) for word, count in index.frequencies.items()),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def rebuild_similar(using=DEFAULT_DB_ALIAS, k=TOP_K):
+    """
+    Recompute every vector, frequency and list from scratch, rewriting only the
+    lists that changed; returns the number of jutsus indexed.
+    """
+    index = SimilarityIndex.load(using)
+    with transaction.atomic(using=using):
+        _store_index(index, using)
+        updated = []
+        for chunk in _chunks(index.vectors, BATCH_SIZE):
+            updated += _write_lists({pk: _rows(pk, index.neighbors(pk, k)) for pk in chunk}, using)
+        _mark_refreshed(updated, using)
+    return len(index.vectors)
+
+
+def refresh_similar(changed=(), stale=(), deleted=(), using=DEFAULT_DB_ALIAS, k=TOP_K):
+    """
+    Bring the vectors and lists up to date after the jutsus ``changed`` were
+    created or edited and ``deleted`` were deleted; ``stale`` are jutsus whose
+    lists lost a deleted neighbor. Returns the ids of the jutsus whose list changed.
+    """
+    index = StoredSimilarityIndex(using)
+    neighbors = JutsuNeighbor.objects.using(using)
+    with transaction.atomic(using=using):
+        changed = index.index_jutsus(set(changed) | set(deleted))
+        recompute = set(changed) | {pk for pk in stale if pk in index}
+        # Lists that hold a changed jutsu: its score moved, up or down.
+        for chunk in _chunks(changed):
+            recompute.update(neighbors.filter(neighbor_id__in=chunk).values_list('jutsu_id', flat=True))
+        # Lists a changed jutsu now beats the last entry of (or that are not full).
+        for pk in changed:
+            scores = index.scores(pk, k)
+            for chunk in _chunks(scores):
+                thresholds = {
+                    row['jutsu_id']: (row['count'], row['lowest'])
+                    for row in neighbors.filter(jutsu_id__in=chunk).values('jutsu_id').annotate(
+                        count=Count('id'), lowest=Min('score')
+                    )
+                }
+                for other in chunk:
+                    count, lowest = thresholds.get(other, (0, None))
+                    if count < k or round(scores[other], 6) > lowest:
+                        recompute.add(other)
+        index.prefetch(recompute)
+        recompute = [pk for pk in sorted(recompute) if pk in index]
+        updated = _write_lists({pk: _rows(pk, index.neighbors(pk, k)) for pk in recompute}, using)
+        _mark_refreshed(updated, using, written=changed)
+    return updated
+
+
+def similar_jutsus(pk, using=None):
+    """The stored neighbors of ``pk``, best first, with their ``similarity``."""
+    return (
+        Jutsu.objects.using(using)
+        .filter(neighbor_of__jutsu_id=pk)
+        .annotate(similarity=F('neighbor_of__score'))
+        .order_by('neighbor_of__position')
+    )
+
+
+def _in_background():
+    return getattr(settings, 'CATALOG_SIMILAR_IN_BACKGROUND', True)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # One thread, so a worker's refreshes never interleave; the unique position keeps lists whole across workers.
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='catalog-similar')
+    return _executor
+
+
+def _run(using):
+    with _lock:
+        changed, stale, deleted = _queued.pop(using, (set(), set(), set()))
+    if not _in_background():
+        refresh_similar(changed, stale, deleted, using)
+        return
+    try:
+        refresh_similar(changed, stale, deleted, using)
+    except Exception:
+        logger.exception("Falha ao atualizar os jutsus semelhantes de %s", sorted(changed | stale | deleted))
+    finally:
+        close_old_connections()
+
+
+def schedule_refresh(changed=(), stale=(), deleted=(), using=DEFAULT_DB_ALIAS):
+    """Queue a ``refresh_similar`` for after the current transaction commits; queued ids are merged."""
+
+    def submit():
+        with _lock:
+            queued = _queued.get(using)
+            first = queued is None
+            if first:
+                queued = _queued[using] = (set(), set(), set())
+            queued[0].update(changed)
+            queued[1].update(stale)
+            queued[2].update(deleted)
+        if not _in_background():
+            _run(using)
+        elif first:
+            _get_executor().submit(_run, using)
+
+    transaction.on_commit(submit, using=using)
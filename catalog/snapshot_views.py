@@ -0,0 +1,53 @@
+"""
+The public pages as the static snapshot renders them (catalog.static_catalog,
+through ``naruto_jutsu_catalog.snapshot_urls``).
+
+They bypass the page cache and leave out what every creation, deletion or
+reclassification changes, so that such a write re-renders only the list pages
+it touches: the API lists have no ``count``, the HTML lists no page count, and
+their facet counts are loaded from the shared ``jutsus/facets.json``.
+"""
+from django.views.generic import DetailView, ListView, TemplateView
+
+from . import views
+from .api_views import JutsuViewSet
+from .facets import facet_labels
+from .pagination import JutsuPagination
+
+
+class JutsuListView(views.JutsuListView):
+    # The undecorated get: no page cache, whose entries hold the counts.
+    get = ListView.get
+
+    def get_facets(self):
+        return facet_labels()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['snapshot'] = True
+        return context
+
+
+class JutsuDetailView(views.JutsuDetailView):
+    get = DetailView.get
+
+
+class DashboardView(views.DashboardView):
+    get = TemplateView.get
+
+
+class HomeView(views.HomeView):
+    get = TemplateView.get
+
+
+class SnapshotPagination(JutsuPagination):
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data.pop('count', None)
+        response.data.pop('count_is_estimated', None)
+        return response
+
+
+class SnapshotJutsuViewSet(JutsuViewSet):
+    pagination_class = SnapshotPagination
@@ -0,0 +1,300 @@
+"""
+Static snapshot of the public catalog, for nginx to serve without Django.
+
+``render_catalog()`` (``manage.py render_static_catalog``) writes what an
+anonymous visitor gets from the home page, the dashboard, the list pages, every
+detail page and the API's list pages and details into CATALOG_STATIC_DIR,
+which is dedicated to it. Each page is rendered through the whole middleware
+stack as a GET to CATALOG_STATIC_BASE_URL, with the snapshot's versions of
+the views (catalog.snapshot_views). Files mirror the URLs, and
+``?page=N`` becomes ``page/N``:
+
+    index.html  dashboard/index.html  jutsus/index.html  jutsus/page/2.html
+    jutsu/7/index.html  api/jutsus/index.json  api/jutsus/page/2.json
+    api/jutsus/7/index.json  jutsus/facets.json
+
+The list pages are rendered without what every creation, deletion or
+reclassification changes: the API's ``count``, the HTML page count and the
+facet counts, which the HTML pages load from the shared ``jutsus/facets.json``.
+
+``manifest.json`` remembers the code version, the change feed token, the
+catalog total and when the last run started. The next run renders only what
+the feed says changed:
+
+- the detail pages of changed jutsus, including those whose similar list or
+  image variants changed (``refreshed`` in the feed);
+- the list pages whose rows changed or moved, found from the position of each
+  jutsu that entered, left or changed the list (``_affected_pages``);
+- the home page, the dashboard and the facet counts.
+
+Deleted jutsus lose their files. A new code version, an expired token or
+``full=True`` renders everything.
+
+Large batches are rendered by CATALOG_STATIC_WORKERS processes. Writes do
+not trigger runs: ``render_static_catalog --watch`` keeps the snapshot up to
+date from the feed in its own process. Runs of different processes take turns
+on a lock file.
+"""
+import contextlib
+import json
+import math
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Max
+from django.utils import timezone
+
+from .facets import facet_counts
+from .models import CatalogRevision, Jutsu, JutsuChange
+from .pagination import JutsuPagination
+from .rendering import remove, render_parallel, write
+from .stats import total_jutsus
+from .versioning import code_version
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock between processes
+    fcntl = None
+
+MANIFEST = 'manifest.json'
+FACETS = 'jutsus/facets.json'
+# URL prefix and file extension of each paginated list.
+LISTS = {'jutsus/': 'html', 'api/jutsus/': 'json'}
+CREATED, UPDATED, DELETED, REFRESHED = JutsuChange.Operations.values
+# Beyond this many jutsus to place, every list page is rendered instead of counting each position.
+POSITION_LIMIT = 50
+# Variants written just before the previous run read the feed may have committed after it.
+VARIANTS_LEEWAY = timedelta(minutes=1)
+
+
+def output_dir():
+    directory = getattr(settings, 'CATALOG_STATIC_DIR', None)
+    return Path(directory) if directory else None
+
+
+def _workers():
+    return getattr(settings, 'CATALOG_STATIC_WORKERS', 2)
+
+
+def page_sizes():
+    from .views import JutsuListView
+
+    return {'jutsus/': JutsuListView.paginate_by, 'api/jutsus/': JutsuPagination.page_size}
+
+
+def page_count(total, size):
+    count = max(1, math.ceil(total / size))
+    limit = getattr(settings, 'CATALOG_STATIC_LIST_PAGES', None)
+    return min(count, limit) if limit else count
+
+
+def home_pages():
+    return [('/', 'index.html'), ('/dashboard/', 'dashboard/index.html')]
+
+
+def detail_pages(pk, api=True):
+    pages = [(f'/jutsu/{pk}/', f'jutsu/{pk}/index.html')]
+    if api:
+        pages.append((f'/api/jutsus/{pk}/', f'api/jutsus/{pk}/index.json'))
+    return pages
+
+
+def list_pages(prefix, number):
+    extension = LISTS[prefix]
+    pages = [(f'/{prefix}?page={number}', f'{prefix}page/{number}.{extension}')]
+    if number == 1:
+        pages.append((f'/{prefix}', f'{prefix}index.{extension}'))
+    return pages
+
+
+@contextlib.contextmanager
+def _exclusive(directory):
+    with open(directory / '.lock', 'a') as file:
+        if fcntl is not None:
+            fcntl.flock(file, fcntl.LOCK_EX)
+        yield
+
+
+def _read_manifest(directory):
+    try:
+        return json.loads((directory / MANIFEST).read_bytes())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _changed_since(token, using):
+    """``{operation: jutsu ids}`` after ``token``, or None once the token is past compaction."""
+    compacted = CatalogRevision.objects.using(using).filter(pk=1).values_list(
+        'changes_compacted_through', flat=True
+    ).first() or 0
+    if token < compacted:
+        return None
+    changes = {operation: set() for operation in JutsuChange.Operations.values}
+    rows = JutsuChange.objects.using(using).filter(id__gt=token).values_list('jutsu_id', 'operation')
+    # The feed holds one entry per jutsu: its last change.
+    for pk, operation in rows.iterator(chunk_size=2000):
+        changes[operation].add(pk)
+    return changes
+
+
+def _stale_files(directory, keep):
+    for path in directory.rglob('*'):
+        name = path.relative_to(directory).as_posix()
+        if path.is_file() and path.suffix in ('.html', '.json') and name != MANIFEST and name not in keep:
+            yield name
+
+
+def _chunks(values, size=500):
+    values = sorted(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _snapshot_name(directory, pk):
+    """The jutsu's name as the snapshot shows it, or None if it is not in the snapshot."""
+    _, name = detail_pages(pk)[1]
+    try:
+        return json.loads((directory / name).read_bytes())['name']
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _position(name, using):
+    """Where a jutsu named ``name`` is, or would be, in the lists (ordered by name)."""
+    return Jutsu.objects.using(using).filter(name__lt=name).count()
+
+
+def _moves(directory, changes, since, using):
+    """
+    ``(inserted, removed, edited)`` list positions for the ``changes`` since
+    the last run: of the jutsus that entered the lists or moved in them, of
+    the places those that left or moved had, and of the jutsus edited in place.
+    None when there are more than POSITION_LIMIT.
+    """
+    jutsus = Jutsu.objects.using(using)
+    touched = changes[CREATED] | changes[UPDATED]
+    # A list card shows the image variants, not the similar list.
+    for chunk in _chunks(changes[REFRESHED]):
+        touched.update(jutsus.filter(pk__in=chunk, variants_updated_at__gte=since).values_list('pk', flat=True))
+    if len(touched) + len(changes[DELETED]) > POSITION_LIMIT:
+        return None
+    names = {}
+    for chunk in _chunks(touched):
+        names.update(jutsus.filter(pk__in=chunk).values_list('pk', 'name'))
+    inserted, removed, edited = [], [], []
+    for pk in touched | changes[DELETED]:
+        # The snapshot's API detail is read before this run renders it again.
+        old, new = _snapshot_name(directory, pk), names.get(pk)
+        if old is not None and old == new:
+            edited.append(_position(new, using))
+            continue
+        if old is not None:
+            removed.append(_position(old, using))
+        if new is not None:
+            inserted.append(_position(new, using))
+    return inserted, removed, edited
+
+
+def _affected_pages(moves, size, count, old_count, total_changed):
+    """
+    Numbers of the list pages with ``size`` rows that ``_moves()`` changes,
+    now that there are ``count`` of them instead of ``old_count``.
+    """
+    if moves is None:
+        return set(range(1, count + 1))
+    inserted, removed, edited = moves
+    pages = {position // size + 1 for position in inserted + edited}
+    # Rows after an inserted one move one slot down; rows from a removed one's slot, one slot up.
+    steps = sorted([(position + 1, 1) for position in inserted] + [(position, -1) for position in removed])
+    shift = 0
+    for (start, step), (end, _) in zip(steps, steps[1:] + [(count * size, 0)]):
+        shift += step
+        if shift and end > start:
+            pages.update(range(start // size + 1, (end - 1) // size + 2))
+    if total_changed:
+        # The "next" link of the last page depends on whether more rows follow.
+        pages.update({count, old_count})
+    return {number for number in pages if number <= count}
+
+
+def _plan_full(total, sizes, using):
+    pages = home_pages()
+    pks = Jutsu.objects.using(using).order_by('pk').values_list('pk', flat=True)
+    for pk in pks.iterator(chunk_size=2000):
+        pages += detail_pages(pk)
+    for prefix, size in sizes.items():
+        for number in range(1, page_count(total, size) + 1):
+            pages += list_pages(prefix, number)
+    return pages
+
+
+def _plan_changes(directory, manifest, changes, total, sizes, using):
+    """``(pages to render, files to remove)`` after the ``changes`` since the run of ``manifest``."""
+    changed = changes[CREATED] | changes[UPDATED] | changes[REFRESHED]
+    if not changed and not changes[DELETED]:
+        return [], []
+    since = datetime.fromisoformat(manifest['started']) - VARIANTS_LEEWAY
+    moves = _moves(directory, changes, since, using)
+    pages, gone = home_pages(), []
+    for pk in sorted(changed):
+        pages += detail_pages(pk)
+    for pk in sorted(changes[DELETED]):
+        gone += [name for _, name in detail_pages(pk)]
+    for prefix, size in sizes.items():
+        count, old_count = page_count(total, size), page_count(manifest['total'], size)
+        for number in sorted(_affected_pages(moves, size, count, old_count, total != manifest['total'])):
+            pages += list_pages(prefix, number)
+        for number in range(count + 1, old_count + 1):
+            gone += [name for _, name in list_pages(prefix, number)]
+    return pages, gone
+
+
+def render_catalog(directory=None, full=False, workers=None, using=DEFAULT_DB_ALIAS):
+    """
+    Bring the snapshot in ``directory`` (CATALOG_STATIC_DIR) up to date; returns
+    ``{'full', 'rendered', 'removed'}`` with the files written and removed.
+    """
+    directory = Path(directory or output_dir())
+    directory.mkdir(parents=True, exist_ok=True)
+    workers = _workers() if workers is None else workers
+    base_url = getattr(settings, 'CATALOG_STATIC_BASE_URL', 'http://localhost')
+    sizes = page_sizes()
+    with _exclusive(directory):
+        manifest = _read_manifest(directory)
+        # Read before the token: whatever commits in between is in this run's changes and in the next ones.
+        started = timezone.now()
+        total = total_jutsus(using)
+        token = JutsuChange.objects.using(using).aggregate(last=Max('id'))['last'] or 0
+        state = {'code_version': code_version(), 'base_url': base_url, 'page_sizes': sizes}
+
+        changes = None
+        if not full and manifest is not None and all(manifest.get(key) == value for key, value in state.items()):
+            changes = _changed_since(manifest['token'], using)
+        full = changes is None
+        if full:
+            pages, removed = _plan_full(total, sizes, using), []
+        else:
+            pages, removed = _plan_changes(directory, manifest, changes, total, sizes, using)
+            for name in removed:
+                remove(directory, name)
+
+        rendered = []
+        if pages:
+            facets = facet_counts(Jutsu.objects.using(using).all(), {})
+            write(directory / FACETS, json.dumps(facets).encode())
+            rendered.append(FACETS)
+        written, missing = render_parallel(directory, base_url, pages, workers)
+        rendered += written
+        removed += missing
+        if full:
+            stale = list(_stale_files(directory, set(rendered)))
+            for name in stale:
+                remove(directory, name)
+            removed += stale
+        write(directory / MANIFEST, json.dumps(
+            {**state, 'token': token, 'total': total, 'started': started.isoformat()}
+        ).encode())
+    return {'full': full, 'rendered': rendered, 'removed': removed}
+
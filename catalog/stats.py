@@ -0,0 +1,145 @@
+"""
+Incrementally maintained jutsu counters backing the dashboard.
+
+``JutsuStat`` holds one row per (dimension, value) pair plus a ``total`` row.
+The signal handlers in ``catalog.signals`` apply +1/-1 deltas inside the
+transaction that saves or deletes the jutsu. Writes that bypass signals
+(``QuerySet.update``, ``bulk_create``, raw SQL) must be followed by
+``rebuild_stats()``; ``manage.py rebuild_jutsu_stats --check`` reports drift.
+"""
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F
+
+from .models import Jutsu, JutsuStat
+
+TOTAL = (JutsuStat.Dimensions.TOTAL, '')
+
+
+def classification_keys(values):
+    """Counter keys touched by a jutsu with the given classification values."""
+    return [TOTAL] + [(field, values[field]) for field in Jutsu.CLASSIFICATION_FIELDS]
+
+
+def apply_delta(keys, delta, using=DEFAULT_DB_ALIAS):
+    stats = JutsuStat.objects.using(using)
+    for dimension, value in keys:
+        updated = stats.filter(dimension=dimension, value=value).update(count=F('count') + delta)
+        if not updated:
+            stats.get_or_create(dimension=dimension, value=value)
+            stats.filter(dimension=dimension, value=value).update(count=F('count') + delta)
+
+
+def record_change(old_values, new_values, using=DEFAULT_DB_ALIAS):
+    """Move a jutsu's contribution from ``old_values`` to ``new_values`` (either may be None)."""
+    old_keys = set(classification_keys(old_values)) if old_values else set()
+    new_keys = set(classification_keys(new_values)) if new_values else set()
+    with transaction.atomic(using=using):
+        apply_delta(sorted(old_keys - new_keys), -1, using)
+        apply_delta(sorted(new_keys - old_keys), 1, using)
+
+
+def record_changes(changes, using=DEFAULT_DB_ALIAS):
+    """``record_change`` for a batch of ``(old_values, new_values)``: one UPDATE per counter that moves."""
+    deltas = Counter()
+    for old_values, new_values in changes:
+        old_keys = set(classification_keys(old_values)) if old_values else set()
+        new_keys = set(classification_keys(new_values)) if new_values else set()
+        deltas.subtract(old_keys - new_keys)
+        deltas.update(new_keys - old_keys)
+    with transaction.atomic(using=using):
+        for key, delta in sorted(deltas.items()):
+            if delta:
+                apply_delta([key], delta, using)
+
+
+def compute_stats(using=DEFAULT_DB_ALIAS):
+    """Exact counters straight from the Jutsu table (full scans)."""
+    jutsus = Jutsu.objects.using(using).order_by()
+    counts = Counter({TOTAL: jutsus.count()})
+    for field in Jutsu.CLASSIFICATION_FIELDS:
+        for row in jutsus.values(field).annotate(count=Count('id')):
+            counts[(field, row[field])] = row['count']
+    return counts
+
+
+def stored_stats(using=None):
+    return Counter({
+        (dimension, value): count
+        for dimension, value, count in JutsuStat.objects.using(using).values_list('dimension', 'value', 'count')
+        if count
+    })
+
+
+async def astored_stats(using=None):
+    return Counter({
+        (dimension, value): count
+        async for dimension, value, count in JutsuStat.objects.using(using).values_list('dimension', 'value', 'count')
+        if count
+    })
+
+
+def stats_drift(using=DEFAULT_DB_ALIAS):
+    """{(dimension, value): (stored, actual)} for every counter that disagrees with the table."""
+    stored = stored_stats(using)
+    actual = compute_stats(using)
+    return {
+        key: (stored[key], actual[key])
+        for key in sorted(set(stored) | set(actual))
+        if stored[key] != actual[key]
+    }
+
+
+def rebuild_stats(using=DEFAULT_DB_ALIAS):
+    with transaction.atomic(using=using):
+        JutsuStat.objects.using(using).all().delete()
+        JutsuStat.objects.using(using).bulk_create([
+            JutsuStat(dimension=dimension, value=value, count=count)
+            for (dimension, value), count in compute_stats(using).items()
+        ])
+
+
+def total_jutsus(using=None):
+    return JutsuStat.objects.using(using).filter(
+        dimension=TOTAL[0], value=TOTAL[1]
+    ).values_list('count', flat=True).first() or 0
+
+
+async def atotal_jutsus(using=None):
+    return await JutsuStat.objects.using(using).filter(
+        dimension=TOTAL[0], value=TOTAL[1]
+    ).values_list('count', flat=True).afirst() or 0
+
+
+def _counter_rows(using):
+    return JutsuStat.objects.using(using).filter(count__gt=0).values_list('dimension', 'value', 'count')
+
+
+def _group_counters(rows):
+    counters = {field: [] for field in Jutsu.CLASSIFICATION_FIELDS}
+    total = 0
+    for dimension, value, count in rows:
+        if dimension == JutsuStat.Dimensions.TOTAL:
+            total = count
+        else:
+            counters[dimension].append((value, count))
+    counters['element_type'].sort(key=lambda item: (-item[1], item[0]))
+    counters['jutsu_type'].sort(key=lambda item: (-item[1], item[0]))
+    counters['rank'].sort()
+    counters['total'] = total
+    return counters
+
+
+def dashboard_stats(using=None):
+    """
+    All dashboard numbers from a single read of the counters table.
+
+    Returns the total plus, per classification field, a list of (value, count)
+    pairs without empty values: elements and types by descending count, ranks by value.
+    """
+    return _group_counters(_counter_rows(using))
+
+
+async def adashboard_stats(using=None):
+    return _group_counters([row async for row in _counter_rows(using)])
@@ -0,0 +1,43 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from catalog import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def jutsu_image(jutsu, sizes='100vw', **attrs):
+    """
+    ``<picture>`` for ``jutsu.image`` with one ``<source>`` per modern format and a
+    lazily loaded JPEG ``<img>``. Falls back to the original upload while the
+    derivatives are missing or stale (and queues them) or could not be generated.
+    """
+    if not jutsu.image:
+        return ''
+    attrs.setdefault('alt', jutsu.name)
+    srcsets = images.srcsets(jutsu)
+    if not srcsets:
+        if not images.manifest_is_current(jutsu):
+            images.schedule_variants(jutsu)
+        return format_html(
+            '<img src="{}" loading="lazy" decoding="async"{}>',
+            jutsu.image.url, _attributes(attrs),
+        )
+
+    fallback = srcsets.pop('jpeg')
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((images.CONTENT_TYPES[fmt], srcset, sizes) for fmt, srcset in srcsets.items()),
+    )
+    largest = [variant for variant in jutsu.image_variants['variants'] if variant['format'] == 'jpeg'][-1]
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" loading="lazy" decoding="async"{}></picture>',
+        sources, default_storage.url(largest['name']), fallback, sizes,
+        largest['width'], largest['height'], _attributes(attrs),
+    )
+
+
+def _attributes(attrs):
+    return format_html_join('', ' {}="{}"', ((name.replace('_', '-'), value) for name, value in attrs.items()))
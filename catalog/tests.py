@@ -1,9 +1,43 @@
-from django.test import TestCase
-from django.urls import reverse
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from PIL import Image as PILImage
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth.models import User
-from .models import Jutsu
+from . import autocomplete, changes, images, instrumentation, openapi, routers, static_catalog
+from .facets import facet_counts
+from .api_views import JutsuViewSet
+from .models import Jutsu, JutsuChange, JutsuTerm, MediaDeletion, SimilarityTerm
+from .pagination import EstimatedCountPaginator, JutsuPagination, estimate_count
+from .sampling import sample_jutsus
+from .search import search_jutsus
+from .similarity import SimilarityIndex, rebuild_similar, similar_jutsus
+from .serializers import JutsuSerializer
+from .stats import dashboard_stats, rebuild_stats, stats_drift
+from .versioning import bump_revision
 
 class JutsuModelTests(TestCase):
     
@@ -94,8 +128,1570 @@ class JutsuAPITests(APITestCase):
             'rank': 'S'
         }
         response = self.client.post(url, data)
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        # SessionAuthentication comes first, so DRF refuses anonymous writes with 403 rather than 401.
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.client.login(username='apiuser', password='api12345')
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(Jutsu.objects.count(), 2)
\ No newline at end of file
+        self.assertEqual(Jutsu.objects.count(), 2)
+
+class JutsuSearchTests(TestCase):
+
+    def setUp(self):
+        Jutsu.objects.create(
+            name="Suiton: Suiryūdan no Jutsu",
+            description="Um dragão de água que ataca o inimigo",
+            element_type="water",
+            jutsu_type="offensive",
+            rank="B"
+        )
+        Jutsu.objects.create(
+            name="Katon: Gōkakyū no Jutsu",
+            description="Uma grande bola de fogo expelida pela boca",
+            element_type="fire",
+            jutsu_type="offensive",
+            rank="C"
+        )
+        Jutsu.objects.create(
+            name="Rasengan",
+            description="Esfera de chakra que lembra um pequeno dragão de vento",
+            element_type="wind",
+            jutsu_type="offensive",
+            rank="A"
+        )
+
+    def search(self, query):
+        return list(search_jutsus(Jutsu.objects.all(), query).values_list('name', flat=True))
+
+    def test_search_is_accent_insensitive(self):
+        self.assertEqual(self.search("agua"), ["Suiton: Suiryūdan no Jutsu"])
+        self.assertEqual(self.search("GOKAKYU"), ["Katon: Gōkakyū no Jutsu"])
+
+    def test_search_matches_prefixes_and_ranks_name_first(self):
+        Jutsu.objects.create(
+            name="Dragão de Fogo",
+            description="Jutsu de fogo",
+            element_type="fire",
+            rank="A"
+        )
+        self.assertEqual(self.search("dragã")[0], "Dragão de Fogo")
+        self.assertEqual(len(self.search("drag")), 3)
+
+    def test_index_follows_updates_and_deletes(self):
+        jutsu = Jutsu.objects.get(name="Rasengan")
+        jutsu.description = "Esfera de chakra giratória"
+        jutsu.save()
+        self.assertEqual(self.search("dragão"), ["Suiton: Suiryūdan no Jutsu"])
+        jutsu.delete()
+        self.assertEqual(self.search("esfera"), [])
+
+    def test_fallback_without_index(self):
+        with self.settings(CATALOG_FULL_TEXT_SEARCH=False):
+            self.assertEqual(self.search("ton: "), ["Katon: Gōkakyū no Jutsu", "Suiton: Suiryūdan no Jutsu"])
+
+    def test_list_view_and_api_use_search(self):
+        response = self.client.get(reverse('jutsu-list'), {'search': 'agua', 'element': 'water'})
+        self.assertContains(response, "Suiton: Suiryūdan no Jutsu")
+        self.assertNotContains(response, "Rasengan")
+        response = self.client.get('/api/jutsus/', {'search': 'bola fog'})
+        self.assertEqual([item['name'] for item in response.data['results']], ["Katon: Gōkakyū no Jutsu"])
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+class JutsuStatsTests(TestCase):
+
+    def setUp(self):
+        self.rasengan = Jutsu.objects.create(
+            name="Rasengan", description="Esfera de chakra",
+            element_type="wind", jutsu_type="offensive", rank="A"
+        )
+        self.chidori = Jutsu.objects.create(
+            name="Chidori", description="Chakra de raio",
+            element_type="lightning", jutsu_type="offensive", rank="A"
+        )
+        Jutsu.objects.create(
+            name="Katon: Gōkakyū no Jutsu", description="Bola de fogo",
+            element_type="fire", jutsu_type="offensive", rank="C"
+        )
+
+    def assertNoDrift(self):
+        self.assertEqual(stats_drift(), {})
+
+    def test_counters_follow_creates_updates_and_deletes(self):
+        self.assertEqual(dashboard_stats()['total'], 3)
+        self.chidori.element_type = "fire"
+        self.chidori.rank = "S"
+        self.chidori.save()
+        Jutsu.objects.get(pk=self.rasengan.pk).save()
+        self.rasengan.delete()
+        self.assertNoDrift()
+        stats = dashboard_stats()
+        self.assertEqual(stats['total'], 2)
+        self.assertEqual(stats['element_type'], [("fire", 2)])
+        self.assertEqual(stats['rank'], [("C", 1), ("S", 1)])
+
+    def test_counters_follow_queryset_deletes(self):
+        Jutsu.objects.filter(jutsu_type="offensive", rank="A").delete()
+        self.assertNoDrift()
+        self.assertEqual(dashboard_stats()['total'], 1)
+
+    def test_rebuild_command_detects_and_fixes_drift(self):
+        Jutsu.objects.filter(pk=self.chidori.pk).update(rank="B")
+        with self.assertRaises(CommandError):
+            call_command('rebuild_jutsu_stats', '--check', stdout=StringIO())
+        call_command('rebuild_jutsu_stats', stdout=StringIO())
+        self.assertNoDrift()
+
+    def test_dashboard_reads_counters(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_jutsus'], 3)
+        self.assertEqual(response.context['total_elements'], 3)
+        self.assertEqual(response.context['types_labels'], ["offensive"])
+        self.assertEqual(response.context['types_data'], [3])
+        self.assertEqual(response.context['ranks_labels'], ["A", "C"])
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+@override_settings(CATALOG_SIMILAR_IN_BACKGROUND=False)
+class FeaturedSamplingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        for i in range(6):
+            Jutsu.objects.create(name=f"Katon {i}", description="Fogo", element_type="fire", rank="C")
+        Jutsu.objects.create(name="Suiton", description="Água", element_type="water", rank="S")
+
+    def test_samples_are_distinct_members_of_the_bucket(self):
+        featured = sample_jutsus(fire=4, water=2, high_rank=3)
+        self.assertEqual(len({jutsu.pk for jutsu in featured['fire']}), 4)
+        self.assertTrue(all(jutsu.element_type == "fire" for jutsu in featured['fire']))
+        self.assertEqual([jutsu.name for jutsu in featured['water']], ["Suiton"])
+        self.assertEqual([jutsu.name for jutsu in featured['high_rank']], ["Suiton"])
+
+    def test_buckets_are_invalidated_on_membership_changes(self):
+        sample_jutsus(water=5, high_rank=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            jutsu = Jutsu.objects.create(name="Suiton 2", description="Água", element_type="water", rank="A")
+        self.assertEqual(len(sample_jutsus(water=5)['water']), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            jutsu.rank = "D"
+            jutsu.save()
+        self.assertEqual(len(sample_jutsus(high_rank=5)['high_rank']), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            jutsu.delete()
+        self.assertEqual(len(sample_jutsus(water=5)['water']), 1)
+
+    def test_home_page_uses_a_fixed_number_of_queries(self):
+        self.client.get(reverse('home'))
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(20):
+                Jutsu.objects.create(name=f"Fūton {i}", description="Vento", element_type="wind", rank="A")
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(len(response.context['fire_jutsus']), 2)
+        self.assertEqual(len(response.context['high_rank_jutsus']), 3)
+        self.assertEqual(response.context['total_jutsus'], 27)
+
+
+class KeysetPaginationTests(APITestCase):
+
+    def setUp(self):
+        for i in range(25):
+            Jutsu.objects.create(
+                name=f"Jutsu {i:02d}",
+                description="Técnica de teste",
+                element_type="fire" if i % 2 else "water",
+                rank="A" if i % 3 else "B",
+            )
+
+    def walk(self, url, params):
+        names, pages = [], []
+        response = self.client.get(url, params)
+        while True:
+            pages.append(response)
+            names += [item['name'] for item in response.data['results']]
+            if not response.data['next']:
+                return names, pages
+            response = self.client.get(response.data['next'])
+
+    def test_api_cursor_pages_follow_filters_and_ordering(self):
+        names, pages = self.walk('/api/jutsus/', {'cursor': '', 'element_type': 'fire', 'ordering': '-created_at'})
+        expected = list(
+            Jutsu.objects.filter(element_type="fire").order_by('-created_at', '-id').values_list('name', flat=True)
+        )
+        self.assertEqual(names, expected)
+        self.assertEqual(len(pages), 2)
+        self.assertNotIn('count', pages[0].data)
+        previous = self.client.get(pages[1].data['previous'])
+        self.assertEqual([item['name'] for item in previous.data['results']], expected[:10])
+        self.assertIsNone(previous.data['previous'])
+
+    def test_api_page_numbers_still_work(self):
+        response = self.client.get('/api/jutsus/', {'page': 3})
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_api_search_keeps_relevance_pages(self):
+        Jutsu.objects.create(name="A Técnica", description="Um katon simples", element_type="fire")
+        Jutsu.objects.create(name="Katon Gōkakyū", description="Katon katon katon", element_type="fire")
+        response = self.client.get('/api/jutsus/', {'search': 'katon', 'cursor': ''})
+        # The cursor is ignored: page numbers, in relevance order.
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            [item['name'] for item in response.data['results']],
+            list(search_jutsus(Jutsu.objects.all(), 'katon').values_list('name', flat=True)),
+        )
+        self.assertEqual(response.data['results'][0]['name'], "Katon Gōkakyū")
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/jutsus/', {'cursor': 'bogus'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('jutsu-list'), {'cursor': 'bogus'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_view_uses_keyset_without_count(self):
+        # The catalog revision (for the ETag), the page itself and the facets (one aggregate, plus the
+        # counters for the type facet, which no other filter constrains).
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('jutsu-list'), {'type': 'supplementary'})
+        self.assertTrue(response.context['keyset_pagination'])
+        self.assertEqual(len(response.context['jutsus']), 12)
+        second = self.client.get(reverse('jutsu-list'), {'cursor': response.context['page_obj'].next_cursor})
+        third = self.client.get(reverse('jutsu-list'), {'cursor': second.context['page_obj'].next_cursor})
+        self.assertEqual([jutsu.name for jutsu in third.context['jutsus']], ["Jutsu 24"])
+        self.assertFalse(third.context['page_obj'].has_next())
+
+        response = self.client.get(reverse('jutsu-list'), {'page': 2})
+        self.assertFalse(response.context['keyset_pagination'])
+        self.assertContains(response, "Página 2 de 3")
+
+
+class TemporaryMediaMixin:
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, size=(1600, 900), name="rasengan.png"):
+        buffer = BytesIO()
+        PILImage.new("RGBA", size, (0, 90, 200, 255)).save(buffer, format="PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def create(self, name="Rasengan", **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Jutsu.objects.create(name=name, description="Esfera de chakra", image=self.upload(), **kwargs)
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0, CATALOG_ESTIMATED_COUNT_THRESHOLD=20)
+class EstimatedCountTests(APITestCase):
+
+    def setUp(self):
+        for i in range(40):
+            Jutsu.objects.create(
+                name=f"Jutsu {i:02d}", description="Técnica de teste",
+                element_type="fire" if i % 2 else "water", jutsu_type="support" if i % 4 else "defensive",
+            )
+
+    def count(self, queryset):
+        with CaptureQueriesContext(connection) as queries:
+            result = estimate_count(queryset)
+        return result, [query['sql'] for query in queries if 'COUNT(' in query['sql']]
+
+    def test_counters_instead_of_count(self):
+        self.assertEqual(self.count(Jutsu.objects.all()), ((40, False), []))
+        self.assertEqual(self.count(Jutsu.objects.filter(element_type="fire")), ((20, False), []))
+        # Two filters: the counters' estimate, 40 * 20/40 * 30/40, is below the threshold, so they are counted...
+        fire_support = Jutsu.objects.filter(element_type="fire", jutsu_type="support")
+        self.assertEqual(self.count(fire_support)[0], (20, False))
+        # ...unless it is lowered (all fire jutsus are support ones: the filters are not independent).
+        with override_settings(CATALOG_ESTIMATED_COUNT_THRESHOLD=10):
+            self.assertEqual(self.count(fire_support), ((15, True), []))
+        self.assertEqual(self.count(Jutsu.objects.filter(name__startswith="Jutsu 1"))[0], (10, False))
+        with override_settings(CATALOG_ESTIMATED_COUNT_THRESHOLD=None):
+            self.assertEqual(len(self.count(Jutsu.objects.all())[1]), 1)
+
+    def test_list_api_and_admin(self):
+        Jutsu.objects.filter(element_type="water").update(rank="S")
+        with override_settings(CATALOG_ESTIMATED_COUNT_THRESHOLD=10):
+            response = self.client.get(reverse('jutsu-list'), {'page': 1, 'element': 'fire', 'type': 'support'})
+            self.assertTrue(response.context['paginator'].count_is_estimated)
+            self.assertContains(response, "Página 1 de cerca de 2")
+            params = {'element_type': 'fire', 'jutsu_type': 'support'}
+            data = self.client.get('/api/jutsus/', params).data
+            self.assertEqual((data['count'], data['count_is_estimated']), (15, True))
+            with override_settings(ROOT_URLCONF='naruto_jutsu_catalog.asgi_urls'):
+                data = json.loads(async_to_sync(self.async_client.get)('/api/jutsus/', params).content)
+            self.assertEqual((data['count'], data['count_is_estimated']), (15, True))
+            self.assertIs(self.client.get('/api/jutsus/', {'element_type': 'fire'}).data['count_is_estimated'], False)
+
+        # QuerySet.update() skipped the counters: the unfiltered count comes from them, not the table.
+        self.assertEqual(self.client.get('/api/jutsus/', {'rank': 'S'}).data['count'], 0)
+        self.client.force_login(User.objects.create_superuser(username='admin', password='12345'))
+        response = self.client.get(reverse('admin:catalog_jutsu_changelist'), {'element_type__exact': 'fire'})
+        self.assertEqual(response.context['cl'].result_count, 20)
+        self.assertIsInstance(response.context['cl'].paginator, EstimatedCountPaginator)
+
+
+@override_settings(CATALOG_IMAGE_WORKERS=0, CATALOG_SIMILAR_IN_BACKGROUND=False, CATALOG_MEDIA_CLEANUP_IN_BACKGROUND=False)
+class ImageVariantTests(TemporaryMediaMixin, TestCase):
+
+    def test_variants_are_generated_after_commit(self):
+        jutsu = self.create()
+        jutsu.refresh_from_db()
+        manifest = jutsu.image_variants
+        self.assertEqual(manifest['source'], jutsu.image.name)
+        self.assertEqual(
+            sorted({variant['width'] for variant in manifest['variants']}), [320, 640, 1280]
+        )
+        self.assertIn('jpeg', {variant['format'] for variant in manifest['variants']})
+        for variant in manifest['variants']:
+            self.assertTrue(default_storage.exists(variant['name']))
+
+    def test_replacing_and_deleting_the_image_cleans_up_variants(self):
+        jutsu = self.create()
+        jutsu.refresh_from_db()
+        old_variants = [variant['name'] for variant in jutsu.image_variants['variants']]
+        with self.captureOnCommitCallbacks(execute=True):
+            jutsu.image = self.upload(size=(500, 500), name="chidori.png")
+            jutsu.save()
+        jutsu.refresh_from_db()
+        self.assertEqual({variant['width'] for variant in jutsu.image_variants['variants']}, {320})
+        self.assertFalse(any(default_storage.exists(name) for name in old_variants))
+        new_variants = [variant['name'] for variant in jutsu.image_variants['variants']]
+        with self.captureOnCommitCallbacks(execute=True):
+            jutsu.delete()
+        self.assertFalse(any(default_storage.exists(name) for name in new_variants))
+
+    def test_template_tag_and_serializer_expose_srcset(self):
+        jutsu = self.create()
+        jutsu.refresh_from_db()
+        html = Template("{% load jutsu_images %}{% jutsu_image jutsu sizes='50vw' class='img-fluid' %}").render(
+            Context({'jutsu': jutsu})
+        )
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('320w', html)
+        self.assertIn('sizes="50vw"', html)
+        self.assertIn('class="img-fluid"', html)
+        data = JutsuSerializer(jutsu).data
+        self.assertEqual(len(data['image_variants']), len(jutsu.image_variants['variants']))
+
+    def test_stale_manifest_serves_original_and_regenerates(self):
+        jutsu = self.create()
+        Jutsu.objects.filter(pk=jutsu.pk).update(image_variants={})
+        jutsu.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            html = Template("{% load jutsu_images %}{% jutsu_image jutsu %}").render(Context({'jutsu': jutsu}))
+        self.assertIn(f'src="{jutsu.image.url}"', html)
+        jutsu.refresh_from_db()
+        self.assertEqual(jutsu.image_variants['source'], jutsu.image.name)
+
+    def test_variants_are_versioned_apart_from_the_jutsu(self):
+        jutsu = self.create()
+        jutsu.refresh_from_db()
+        self.assertIsNotNone(jutsu.variants_updated_at)
+        self.assertEqual(JutsuChange.objects.get(jutsu_id=jutsu.pk).operation, changes.REFRESHED)
+        etag = self.client.get(reverse('jutsu-detail', args=[jutsu.pk]))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            images.generate_variants(jutsu.pk, force=True)
+        regenerated = Jutsu.objects.get(pk=jutsu.pk)
+        self.assertEqual(regenerated.updated_at, jutsu.updated_at)
+        self.assertGreater(regenerated.variants_updated_at, jutsu.variants_updated_at)
+        # The detail page's validators see the new variants.
+        self.assertNotEqual(self.client.get(reverse('jutsu-detail', args=[jutsu.pk]))['ETag'], etag)
+
+    def test_unreadable_image_is_recorded_and_not_queued_again(self):
+        with self.assertLogs('catalog.images', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            jutsu = Jutsu.objects.create(
+                name="Rasengan", description="Esfera de chakra",
+                image=SimpleUploadedFile("broken.png", b"not an image", content_type="image/png"),
+            )
+        jutsu.refresh_from_db()
+        self.assertEqual(jutsu.image_variants['source'], jutsu.image.name)
+        self.assertIn('error', jutsu.image_variants)
+        self.assertFalse(default_storage.exists(images.VARIANT_DIR))
+        with patch('catalog.images.schedule_variants') as schedule:
+            html = Template("{% load jutsu_images %}{% jutsu_image jutsu %}").render(Context({'jutsu': jutsu}))
+        schedule.assert_not_called()
+        self.assertIn(f'src="{jutsu.image.url}"', html)
+        self.assertEqual(JutsuSerializer(jutsu).data['image_variants'], [])
+
+
+@override_settings(CATALOG_IMAGE_WORKERS=0, CATALOG_SIMILAR_IN_BACKGROUND=False, CATALOG_MEDIA_CLEANUP_IN_BACKGROUND=False)
+class MediaCleanupTests(TemporaryMediaMixin, TestCase):
+
+    def files(self, jutsu):
+        jutsu.refresh_from_db()
+        return [jutsu.image.name] + [variant['name'] for variant in jutsu.image_variants['variants']]
+
+    def assertStored(self, names, stored=True):
+        self.assertEqual([default_storage.exists(name) for name in names], [stored] * len(names))
+
+    def test_files_are_deleted_after_the_commit(self):
+        jutsu = self.create()
+        names = self.files(jutsu)
+        with self.captureOnCommitCallbacks() as callbacks:
+            jutsu.delete()
+        self.assertStored(names)
+        self.assertEqual(MediaDeletion.objects.count(), len(names))
+        for callback in callbacks:
+            callback()
+        self.assertStored(names, False)
+        self.assertFalse(MediaDeletion.objects.exists())
+
+    def test_rolled_back_delete_keeps_the_files(self):
+        jutsu = self.create()
+        names = self.files(jutsu)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            jutsu.delete()
+            raise RuntimeError
+        self.assertFalse(MediaDeletion.objects.exists())
+        self.assertStored(names)
+
+    def test_queryset_deletes_and_replaced_images(self):
+        first, second = self.create(), self.create(name="Chidori")
+        names = self.files(first)
+        with self.captureOnCommitCallbacks(execute=True):
+            Jutsu.objects.filter(pk=first.pk).delete()
+        self.assertStored(names, False)
+
+        names = self.files(second)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.image = self.upload(size=(500, 500), name="chidori.png")
+            second.save()
+        self.assertStored(names, False)
+        self.assertStored(self.files(second))
+
+    def test_files_still_used_by_another_jutsu_are_kept(self):
+        jutsu = self.create()
+        names = self.files(jutsu)
+        Jutsu.objects.create(
+            name="Cópia", description="Mesma imagem", image=jutsu.image.name, image_variants=jutsu.image_variants
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            jutsu.delete()
+        self.assertStored(names)
+        self.assertFalse(MediaDeletion.objects.exists())
+
+    def test_import_replacing_the_image_deletes_the_old_files(self):
+        jutsu = self.create()
+        names = self.files(jutsu)
+        kept = self.create(name="Chidori")
+        kept_names = self.files(kept)
+        replacement = default_storage.save("jutsu_images/rasengan-novo.png", self.upload())
+        path = f"{self.media_root}/jutsus.jsonl"
+        with open(path, "w", encoding="utf-8") as file:
+            for name, image in (("Rasengan", replacement), ("Chidori", kept.image.name)):
+                file.write(json.dumps({"name": name, "description": "Importado", "image": image}) + "\n")
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_jutsus', path, '--similar', 'skip', stdout=StringIO())
+
+        jutsu.refresh_from_db()
+        self.assertEqual((jutsu.image.name, jutsu.image_variants), (replacement, {}))
+        self.assertStored(names, False)
+        self.assertStored([replacement])
+        self.assertEqual(self.files(kept), kept_names)
+        self.assertStored(kept_names)
+
+    def test_sweep_media(self):
+        names = self.files(self.create())
+        orphans = [default_storage.save(name, ContentFile(b"x"))
+                   for name in ("jutsu_images/perdido.png", "jutsu_images/variants/perdido-320w.webp")]
+        queued = default_storage.save("jutsu_images/fila.png", ContentFile(b"x"))
+        MediaDeletion.objects.create(name=queued)
+
+        out = StringIO()
+        call_command('sweep_media', '--dry-run', '--min-age', '0', stdout=out)
+        self.assertEqual(sorted(out.getvalue().splitlines()[:-1]), sorted(orphans + [queued]))
+        call_command('sweep_media', stdout=StringIO())
+        self.assertStored(orphans)
+        call_command('sweep_media', '--min-age', '0', stdout=StringIO())
+        self.assertStored(orphans + [queued], False)
+        self.assertStored(names)
+
+
+class ImportExportCommandTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        Jutsu.objects.create(name="Rasengan", description="Esfera de chakra", element_type="wind", rank="A")
+
+    def path(self, name):
+        return f"{self.directory}/{name}"
+
+    def test_import_upserts_by_name_and_reports_bad_rows(self):
+        with open(self.path("jutsus.jsonl"), "w", encoding="utf-8") as file:
+            file.write('{"name": "Rasengan", "description": "Versão atualizada", "element_type": "wind", "rank": "S"}\n')
+            file.write('{"name": "Chidori", "description": "Raio", "element_type": "lightning"}\n')
+            file.write('{"name": "Errado", "description": "x", "rank": "Z"}\n')
+            file.write('não é json\n')
+        with patch('catalog.management.commands.import_jutsus.rebuild_similar') as rebuild:
+            call_command(
+                'import_jutsus', self.path("jutsus.jsonl"), '--batch-size', '2',
+                '--errors', self.path("errors.jsonl"), stdout=StringIO()
+            )
+        # Only the imported jutsus are indexed, not the whole catalog.
+        rebuild.assert_not_called()
+        chidori = Jutsu.objects.get(name="Chidori")
+        self.assertEqual([jutsu.name for jutsu in similar_jutsus(chidori.pk)], ["Rasengan"])
+        self.assertEqual(Jutsu.objects.get(name="Rasengan").rank, "S")
+        self.assertEqual(
+            dict(JutsuChange.objects.values_list('jutsu_id', 'operation')),
+            {chidori.pk: changes.CREATED, Jutsu.objects.get(name="Rasengan").pk: changes.UPDATED},
+        )
+        self.assertEqual(Jutsu.objects.get(name="Chidori").get_element_type_display(), "Raio")
+        self.assertEqual(Jutsu.objects.count(), 2)
+        with open(self.path("errors.jsonl"), encoding="utf-8") as file:
+            errors = [json.loads(line) for line in file]
+        self.assertEqual([error['line'] for error in errors], [3, 4])
+        self.assertIn('rank', errors[0]['errors'])
+        self.assertEqual(dashboard_stats()['total'], 2)
+        self.assertEqual(search_jutsus(Jutsu.objects.all(), "versao").get().name, "Rasengan")
+
+    def test_large_import_rebuilds_the_similar_lists_instead(self):
+        with open(self.path("jutsus.jsonl"), "w", encoding="utf-8") as file:
+            for number in range(3):
+                file.write(json.dumps({"name": f"Jutsu {number}", "description": "Técnica"}) + "\n")
+        with patch('catalog.management.commands.import_jutsus.REFRESH_LIMIT', 2), \
+                patch('catalog.management.commands.import_jutsus.refresh_similar') as refresh, \
+                patch('catalog.management.commands.import_jutsus.rebuild_similar') as rebuild:
+            call_command('import_jutsus', self.path("jutsus.jsonl"), '--batch-size', '2', stdout=StringIO())
+        refresh.assert_not_called()
+        rebuild.assert_called_once()
+        self.assertEqual(Jutsu.objects.count(), 4)
+
+    def test_export_then_import_round_trips_through_csv(self):
+        Jutsu.objects.create(name="Katon, \"Gōkakyū\"", description="Linha 1\nLinha 2", element_type="fire")
+        call_command('export_jutsus', self.path("jutsus.csv"), stdout=StringIO())
+        exported = {jutsu.name: jutsu for jutsu in Jutsu.objects.all()}
+        Jutsu.objects.all().delete()
+        call_command('import_jutsus', self.path("jutsus.csv"), stdout=StringIO())
+        for jutsu in Jutsu.objects.all():
+            original = exported[jutsu.name]
+            self.assertEqual(
+                (jutsu.description, jutsu.element_type, jutsu.jutsu_type, jutsu.rank),
+                (original.description, original.element_type, original.jutsu_type, original.rank),
+            )
+        self.assertEqual(Jutsu.objects.count(), 2)
+
+    def test_export_jsonl_matches_api_representation(self):
+        call_command('export_jutsus', self.path("jutsus.jsonl"), '--element', 'wind', stdout=StringIO())
+        with open(self.path("jutsus.jsonl"), encoding="utf-8") as file:
+            rows = [json.loads(line) for line in file]
+        api = self.client.get('/api/jutsus/').data['results'][0]
+        self.assertEqual(len(rows), 1)
+        for field in ('id', 'name', 'element_type', 'created_at', 'updated_at'):
+            self.assertEqual(rows[0][field], api[field])
+
+
+class NDJSONExportTests(APITestCase):
+
+    def setUp(self):
+        for i, (element, label) in enumerate([("fire", "fogo"), ("water", "água"), ("fire", "fogo")]):
+            Jutsu.objects.create(name=f"Jutsu {i}", description=f"Técnica de {label}", element_type=element)
+
+    def test_export_streams_filtered_rows(self):
+        response = self.client.get('/api/jutsus/export/', {'element_type': 'fire'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['name'] for row in rows], ["Jutsu 0", "Jutsu 2"])
+
+    def test_export_honors_search_and_gzip(self):
+        response = self.client.get('/api/jutsus/export/', {'search': 'agua'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        rows = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(row)['name'] for row in rows], ["Jutsu 1"])
+
+
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        self.jutsu = Jutsu.objects.create(name="Rasengan", description="Esfera de chakra", element_type="wind")
+        self.user = User.objects.create_user(username='ninja', password='12345')
+
+    def assertRevalidates(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **headers)
+        self.assertEqual(cached.status_code, 304)
+        return response
+
+    def test_list_and_detail_pages_return_304_until_the_catalog_changes(self):
+        list_url = reverse('jutsu-list')
+        detail_url = reverse('jutsu-detail', args=[self.jutsu.pk])
+        list_etag = self.assertRevalidates(list_url)['ETag']
+        detail_etag = self.assertRevalidates(detail_url)['ETag']
+
+        Jutsu.objects.create(name="Chidori", description="Raio", element_type="lightning")
+        self.assertEqual(self.client.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+        self.assertEqual(self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag).status_code, 304)
+
+        self.jutsu.description = "Esfera giratória"
+        self.jutsu.save()
+        self.assertEqual(self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag).status_code, 200)
+
+    def test_pages_vary_by_viewer(self):
+        etag = self.client.get(reverse('jutsu-detail', args=[self.jutsu.pk]))['ETag']
+        self.client.login(username='ninja', password='12345')
+        response = self.client.get(reverse('jutsu-detail', args=[self.jutsu.pk]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, reverse('jutsu-edit', args=[self.jutsu.pk]))
+
+    def test_api_list_and_retrieve_support_last_modified(self):
+        self.assertRevalidates('/api/jutsus/')
+        response = self.assertRevalidates(f'/api/jutsus/{self.jutsu.pk}/')
+        cached = self.client.get(f'/api/jutsus/{self.jutsu.pk}/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_invalid_pk_is_not_found(self):
+        for url in ('/api/jutsus/abc/', '/api/jutsus/abc/similar/'):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+            with override_settings(ROOT_URLCONF='naruto_jutsu_catalog.asgi_urls'):
+                response = async_to_sync(self.async_client.get)(url)
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/api/jutsus/999/', HTTP_IF_NONE_MATCH='*').status_code, 404)
+
+
+class PageCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.jutsu = Jutsu.objects.create(name="Rasengan", description="Esfera de chakra", element_type="wind")
+        self.user = User.objects.create_user(username='editor', password='12345')
+
+    def test_anonymous_pages_are_served_from_cache_until_a_write(self):
+        # The detail page's ETag check reads the jutsu's updated_at before the cache.
+        pages = [(reverse('home'), 1), (reverse('dashboard'), 1), (reverse('jutsu-list'), 1),
+                 (reverse('jutsu-detail', args=[self.jutsu.pk]), 2)]
+        for url, queries in pages:
+            first = self.client.get(url)
+            with self.assertNumQueries(queries):
+                cached = self.client.get(url)
+            self.assertEqual(cached.content, first.content)
+
+        self.jutsu.description = "Esfera giratória"
+        self.jutsu.save()
+        self.assertContains(self.client.get(reverse('jutsu-detail', args=[self.jutsu.pk])), "Esfera giratória")
+        self.assertContains(self.client.get(reverse('dashboard')), "Rasengan")
+
+    def test_query_string_is_part_of_the_key(self):
+        Jutsu.objects.create(name="Katon", description="Fogo", element_type="fire")
+        self.assertContains(self.client.get(reverse('jutsu-list'), {'element': 'fire'}), "Katon")
+        self.assertNotContains(self.client.get(reverse('jutsu-list'), {'element': 'wind'}), "Katon")
+
+    def test_authenticated_editors_bypass_the_cache(self):
+        self.client.get(reverse('jutsu-list'))
+        self.client.login(username='editor', password='12345')
+        self.assertContains(self.client.get(reverse('jutsu-list')), reverse('jutsu-create'))
+
+    def test_concurrent_miss_serves_the_previous_copy(self):
+        url = reverse('jutsu-detail', args=[self.jutsu.pk])
+        self.client.get(url)
+        self.jutsu.description = "Nova descrição"
+        self.jutsu.save()
+        cache.add(f"catalog:page:jutsu-detail:{hashlib.md5(url.encode()).hexdigest()}:lock", 1)
+        response = self.client.get(url)
+        self.assertContains(response, "Esfera de chakra")
+
+
+class FastListSerializationTests(APITestCase):
+
+    def setUp(self):
+        Jutsu.objects.create(name="Rasengan", description="Esfera de chakra", element_type="wind", rank="A")
+        Jutsu.objects.create(name="Katon", description="Bola de fogo", element_type="fire", image="jutsu_images/katon.png")
+        variants = {
+            'source': 'jutsu_images/chidori çá.png', 'width': 800, 'height': 600,
+            'variants': [{'name': 'jutsu_images/variants/chidori-320w.webp', 'format': 'webp', 'width': 320, 'height': 240}],
+        }
+        Jutsu.objects.create(name="Chidori", description="Raio", element_type="lightning", image="jutsu_images/chidori çá.png")
+        Jutsu.objects.filter(name="Chidori").update(image_variants=variants)
+        # A stale manifest and a value missing from the choices.
+        Jutsu.objects.filter(name="Katon").update(image_variants=dict(variants, source='jutsu_images/old.png'), rank='Z')
+
+    def assertSameAsInstances(self, params):
+        fast = self.client.get('/api/jutsus/', params)
+        with patch.object(JutsuViewSet, 'fast_list', False):
+            slow = self.client.get('/api/jutsus/', params)
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_list_output_is_byte_identical(self):
+        response = self.assertSameAsInstances({})
+        self.assertEqual(response.data['count'], 3)
+        for params in ({'cursor': '', 'ordering': '-created_at'}, {'search': 'fogo'}, {'element_type': 'wind'},
+                       {'ordering': 'rank', 'page': 1}):
+            self.assertSameAsInstances(params)
+
+    @patch.object(JutsuPagination, 'page_size', 2)
+    def test_cursor_pages_from_value_rows(self):
+        first = self.assertSameAsInstances({'cursor': ''})
+        self.assertSameAsInstances({'cursor': first.data['next'].split('cursor=')[1]})
+        self.assertEqual(self.client.get(first.data['next']).data['results'][0]['name'], "Rasengan")
+
+    def test_list_does_not_build_instances(self):
+        with patch.object(Jutsu, 'from_db', side_effect=AssertionError):
+            self.assertEqual(self.client.get('/api/jutsus/').status_code, status.HTTP_200_OK)
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+class FacetTests(APITestCase):
+
+    def setUp(self):
+        for name, element, jutsu_type, rank, description in (
+            ("Rasengan", "wind", "offensive", "A", "Esfera de chakra"),
+            ("Chidori", "lightning", "offensive", "A", "Chakra de raio"),
+            ("Katon: Gōkakyū no Jutsu", "fire", "offensive", "C", "Bola de fogo"),
+            ("Doton: Doryūheki", "earth", "defensive", "B", "Muralha de terra"),
+        ):
+            Jutsu.objects.create(name=name, element_type=element, jutsu_type=jutsu_type, rank=rank, description=description)
+
+    def counts(self, facets):
+        return {field: {item['value']: item['count'] for item in items if item['count']} for field, items in facets.items()}
+
+    def test_each_facet_ignores_its_own_filter(self):
+        facets = facet_counts(Jutsu.objects.all(), {'jutsu_type': 'offensive', 'rank': 'A'})
+        self.assertEqual(self.counts(facets), {
+            'element_type': {'wind': 1, 'lightning': 1},
+            'jutsu_type': {'offensive': 2},
+            'rank': {'A': 2, 'C': 1},
+        })
+        self.assertEqual([item['value'] for item in facets['rank']], [value for value, _ in Jutsu.Ranks.choices])
+        self.assertEqual(facets['element_type'][0], {'value': 'fire', 'label': 'Fogo', 'count': 0})
+
+    def test_one_aggregate_query(self):
+        with self.assertNumQueries(1):
+            facets = facet_counts(search_jutsus(Jutsu.objects.all(), "chakra"), {'element_type': 'wind'})
+        self.assertEqual(self.counts(facets), {
+            'element_type': {'wind': 1, 'lightning': 1}, 'jutsu_type': {'offensive': 1}, 'rank': {'A': 1},
+        })
+        # Without a search or filters every facet comes from the dashboard counters.
+        with self.assertNumQueries(1):
+            facets = facet_counts(Jutsu.objects.all(), {})
+        self.assertEqual(self.counts(facets)['jutsu_type'], {'offensive': 3, 'defensive': 1})
+
+    def test_list_page_and_api(self):
+        response = self.client.get(reverse('jutsu-list'), {'type': 'offensive'})
+        self.assertEqual(self.counts(response.context['facets'])['element_type'], {'wind': 1, 'lightning': 1, 'fire': 1})
+        self.assertContains(response, '<option value="earth" disabled>Terra (0)</option>', html=True)
+        self.assertContains(response, '<option value="defensive" >Defensivo (1)</option>', html=True)
+
+        self.assertNotIn('facets', self.client.get('/api/jutsus/').data)
+        response = self.client.get('/api/jutsus/', {'facets': 'true', 'search': 'chakra', 'cursor': ''})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(self.counts(response.data['facets'])['rank'], {'A': 2})
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+class QueryPlanTests(TestCase):
+    """
+    Runs EXPLAIN on every query the catalog's read paths send for jutsus and
+    fails when one of them has to scan the whole table. Planners pick scans for
+    tiny tables, so this works on a seeded, analyzed dataset.
+    """
+    ROWS = 3000
+
+    @classmethod
+    def setUpTestData(cls):
+        elements = [value for value, _ in Jutsu.Elements.choices]
+        types = [value for value, _ in Jutsu.Types.choices]
+        ranks = [value for value, _ in Jutsu.Ranks.choices]
+        Jutsu.objects.bulk_create([
+            Jutsu(
+                name=f"Jutsu {i:05d}",
+                description="Técnica de teste",
+                element_type=elements[i % len(elements)],
+                jutsu_type=types[i % len(types)],
+                rank=ranks[i % len(ranks)],
+            )
+            for i in range(cls.ROWS)
+        ])
+        rebuild_stats()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.superuser = User.objects.create_superuser(username='admin', password='12345')
+        cls.jutsu = Jutsu.objects.order_by('pk').last()
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                # SQLite reports "SCAN catalog_jutsu USING [COVERING] INDEX x" for ordered index walks.
+                return [row[-1] for row in cursor.fetchall()
+                        if re.match(r'SCAN (TABLE )?catalog_jutsu\b(?! USING (COVERING )?INDEX)', row[-1])]
+            if connection.vendor == 'postgresql':
+                # With sequential scans disabled a Seq Scan only remains when no index can serve the query.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+                return [row[0] for row in cursor.fetchall() if re.search(r'Seq Scan on catalog_jutsu\b', row[0])]
+        self.skipTest(f'no plan checks for {connection.vendor}')
+
+    def assertIndexedQueries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, url)
+        jutsu_queries = [query['sql'] for query in queries
+                         if query['sql'].startswith('SELECT') and 'catalog_jutsu' in query['sql']]
+        self.assertTrue(jutsu_queries, url)
+        for sql in jutsu_queries:
+            self.assertEqual(self.full_scans(sql), [], f'{url} {params}: {sql}')
+
+    def test_html_pages(self):
+        cursor = self.client.get(reverse('jutsu-list')).context['page_obj'].next_cursor
+        for params in ({}, {'element': 'fire'}, {'type': 'support'}, {'element': 'fire', 'type': 'support'},
+                       {'rank': 'S'}, {'element': 'fire', 'type': 'support', 'rank': 'S'},
+                       {'cursor': cursor}, {'page': 2}, {'element': 'water', 'page': 3}):
+            self.assertIndexedQueries(reverse('jutsu-list'), params)
+        self.assertIndexedQueries(reverse('jutsu-detail', args=[self.jutsu.pk]))
+        self.assertIndexedQueries(reverse('dashboard'))
+        self.assertIndexedQueries(reverse('home'))
+
+    def test_api(self):
+        self.assertIndexedQueries('/api/jutsus/')
+        self.assertIndexedQueries('/api/jutsus/', {'facets': 'true', 'element_type': 'fire', 'rank': 'S'})
+        for field, value in (('element_type', 'fire'), ('jutsu_type', 'support'), ('rank', 'S')):
+            for ordering in ('name', '-created_at', 'rank'):
+                self.assertIndexedQueries('/api/jutsus/', {field: value, 'ordering': ordering})
+                self.assertIndexedQueries('/api/jutsus/', {field: value, 'ordering': ordering, 'cursor': ''})
+        for ordering in ('-name', 'created_at', '-rank'):
+            self.assertIndexedQueries('/api/jutsus/', {'ordering': ordering, 'cursor': ''})
+        self.assertIndexedQueries(f'/api/jutsus/{self.jutsu.pk}/')
+
+    def test_admin_changelist(self):
+        self.client.force_login(self.superuser)
+        url = reverse('admin:catalog_jutsu_changelist')
+        for params in ({}, {'element_type__exact': 'fire'}, {'jutsu_type__exact': 'support'}, {'rank__exact': 'S'},
+                       {'created_at__gte': '2000-01-01 00:00:00+00:00'}, {'o': '6'}, {'p': 2}):
+            self.assertIndexedQueries(url, params)
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        for histogram in instrumentation.HISTOGRAMS:
+            histogram.clear()
+        self.jutsu = Jutsu.objects.create(name="Rasengan", description="Esfera de chakra", element_type="wind")
+
+    def timings(self, response):
+        return {part.split(';')[0]: part for part in response['Server-Timing'].split(', ')}
+
+    def test_server_timing_header(self):
+        timings = self.timings(self.client.get(reverse('jutsu-list')))
+        self.assertEqual(set(timings), {'db', 'render', 'total'})
+        self.assertRegex(timings['db'], r'^db;desc="\d+ queries";dur=\d+\.\d\d$')
+        timings = self.timings(self.client.get('/api/jutsus/'))
+        self.assertEqual(set(timings), {'db', 'serialize', 'render', 'total'})
+
+    @override_settings(CATALOG_METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_metrics_endpoint(self):
+        self.client.get('/api/jutsus/')
+        self.client.get('/api/jutsus/')
+        self.client.get(reverse('jutsu-detail', args=[self.jutsu.pk]))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('# TYPE catalog_request_duration_seconds histogram', text)
+        self.assertIn('catalog_request_duration_seconds_count{view="jutsu-list-api",method="GET",status="200"} 2', text)
+        self.assertIn('catalog_db_queries_count{view="jutsu-detail"} 1', text)
+        self.assertIn('catalog_section_duration_seconds_count{view="jutsu-list-api",section="serialize"} 2', text)
+
+    @override_settings(CATALOG_METRICS_TOKEN='segredo', CATALOG_METRICS_ALLOWED_IPS=[])
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer outro').status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer segredo').status_code, 200)
+
+    @override_settings(CATALOG_METRICS_TOKEN=None, CATALOG_METRICS_ALLOWED_IPS=[])
+    def test_metrics_are_off_until_configured(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        with override_settings(CATALOG_METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+    @override_settings(CATALOG_SLOW_QUERY_MS=0)
+    def test_slow_query_log_names_the_view(self):
+        with self.assertLogs('catalog.instrumentation', 'WARNING') as logs:
+            self.client.get(reverse('jutsu-detail', args=[self.jutsu.pk]))
+        self.assertIn('em jutsu-detail [default]: SELECT', logs.output[0])
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+class AsyncViewTests(TestCase):
+    """The ASGI URLconf's async views must answer exactly like the sync ones."""
+
+    def setUp(self):
+        cache.clear()
+        for i in range(15):
+            Jutsu.objects.create(
+                name=f"Katon {i:02d}" if i % 2 else f"Suiton {i:02d}",
+                description="Bola de fogo" if i % 2 else "Dragão de água",
+                element_type="fire" if i % 2 else "water",
+                rank="S" if i % 3 else "C",
+            )
+        rebuild_similar()
+        self.jutsu = Jutsu.objects.first()
+
+    def async_get(self, url, data=None, headers=None):
+        with override_settings(ROOT_URLCONF='naruto_jutsu_catalog.asgi_urls'):
+            self.assertTrue(iscoroutinefunction(resolve(url.split('?')[0]).func), url)
+            random.seed(7)
+            return async_to_sync(self.async_client.get)(url, data, headers=headers)
+
+    def sync_get(self, url, data=None, headers=None):
+        random.seed(7)
+        return self.client.get(url, data, headers=headers)
+
+    def assertSameResponse(self, url, data=None, headers=None):
+        expected = self.sync_get(url, data, headers)
+        response = self.async_get(url, data, headers)
+        self.assertEqual(response.status_code, expected.status_code, url)
+        self.assertEqual(response.content, expected.content, url)
+        self.assertEqual(response.get('ETag'), expected.get('ETag'), url)
+        return response
+
+    def test_pages_match_the_sync_views(self):
+        self.assertSameResponse(reverse('home'))
+        self.assertSameResponse(reverse('dashboard'))
+        self.assertSameResponse(reverse('jutsu-detail', args=[self.jutsu.pk]))
+        self.assertSameResponse(reverse('jutsu-detail', args=[9999]))
+        first = self.assertSameResponse(reverse('jutsu-list'))
+        self.assertSameResponse(reverse('jutsu-list'), {'cursor': first.context['page_obj'].next_cursor})
+        for params in ({'element': 'fire'}, {'element': 'fire', 'rank': 'S'}, {'page': 2}, {'page': 9}, {'search': 'fogo'},
+                       {'cursor': 'bogus'}):
+            self.assertSameResponse(reverse('jutsu-list'), params)
+
+    def test_api_matches_the_viewset(self):
+        for params in ({}, {'page': 2}, {'page': 9}, {'element_type': 'fire', 'ordering': '-rank'},
+                       {'search': 'agua'}, {'cursor': ''}, {'cursor': 'bogus'}, {'element_type': 'bogus'},
+                       {'facets': 'true', 'rank': 'S'}, {'facets': 'true', 'search': 'fogo', 'cursor': ''}):
+            self.assertSameResponse('/api/jutsus/', params)
+        self.assertSameResponse(f'/api/jutsus/{self.jutsu.pk}/')
+        self.assertSameResponse('/api/jutsus/9999/')
+        # The browsable API is left to the viewset (its breadcrumbs differ, as they resolve to the async view).
+        response = self.async_get('/api/jutsus/', headers={'Accept': 'text/html'})
+        self.assertContains(response, 'Jutsu List')
+
+    def test_conditional_get(self):
+        etag = self.async_get('/api/jutsus/')['ETag']
+        self.assertEqual(self.async_get('/api/jutsus/', headers={'If-None-Match': etag}).status_code, 304)
+        etag = self.async_get(reverse('jutsu-detail', args=[self.jutsu.pk]))['ETag']
+        self.assertEqual(
+            self.async_get(reverse('jutsu-detail', args=[self.jutsu.pk]), headers={'If-None-Match': etag}).status_code, 304
+        )
+
+    def test_writes_go_to_the_viewset(self):
+        with override_settings(ROOT_URLCONF='naruto_jutsu_catalog.asgi_urls'):
+            response = async_to_sync(self.async_client.post)('/api/jutsus/', {'name': 'Novo'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0, CATALOG_SIMILAR_IN_BACKGROUND=False)
+class SimilarJutsuTests(APITestCase):
+
+    def setUp(self):
+        self.goukakyuu = Jutsu.objects.create(
+            name="Katon: Goukakyuu", description="Uma grande bola de fogo cuspida pela boca.",
+            element_type="fire", jutsu_type="offensive", rank="C",
+        )
+        self.housenka = Jutsu.objects.create(
+            name="Katon: Housenka", description="Várias pequenas bolas de fogo cuspidas em sequência.",
+            element_type="fire", jutsu_type="offensive", rank="C",
+        )
+        self.suiryuudan = Jutsu.objects.create(
+            name="Suiton: Suiryuudan", description="Um dragão de água que avança sobre o inimigo.",
+            element_type="water", jutsu_type="offensive", rank="B",
+        )
+        self.raikiri = Jutsu.objects.create(
+            name="Raikiri", description="Lâmina de raio concentrada na mão.",
+            element_type="lightning", jutsu_type="offensive", rank="A",
+        )
+        rebuild_similar()
+
+    def names(self, jutsu):
+        return [similar.name for similar in similar_jutsus(jutsu.pk)]
+
+    def test_neighbors_combine_text_and_classification(self):
+        self.assertEqual(self.names(self.goukakyuu)[0], "Katon: Housenka")
+        self.assertEqual(len(self.names(self.goukakyuu)), 3)
+        scores = [similar.similarity for similar in similar_jutsus(self.goukakyuu.pk)]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_saves_and_deletes_refresh_the_affected_lists(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ryuuka = Jutsu.objects.create(
+                name="Katon: Ryuuka", description="Um dragão de fogo cuspido pela boca.",
+                element_type="fire", jutsu_type="offensive", rank="C",
+            )
+        self.assertIn("Katon: Goukakyuu", self.names(ryuuka)[:2])
+        self.assertIn("Katon: Ryuuka", self.names(self.goukakyuu)[:2])
+        self.assertIn("Katon: Ryuuka", self.names(self.raikiri))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.housenka.delete()
+        self.assertNotIn("Katon: Housenka", self.names(self.goukakyuu))
+        self.assertEqual(len(self.names(self.goukakyuu)), 3)
+
+    def test_a_refreshed_list_moves_the_detail_page_validators(self):
+        url = reverse('jutsu-detail', args=[self.raikiri.pk])
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Jutsu.objects.create(name="Chidori", description="Raio na mão.", element_type="lightning")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Jutsus Semelhantes")
+        self.assertContains(response, reverse('jutsu-detail', args=[Jutsu.objects.get(name="Chidori").pk]))
+
+    def test_refresh_reads_only_the_stored_vectors_and_keeps_updated_at(self):
+        updated_at = Jutsu.objects.get(pk=self.raikiri.pk).updated_at
+        with patch.object(SimilarityIndex, 'load', side_effect=AssertionError("full scan")), \
+                self.captureOnCommitCallbacks(execute=True):
+            chidori = Jutsu.objects.create(
+                name="Chidori", description="Lâmina de raio na mão.", element_type="lightning", rank="A",
+            )
+        self.assertEqual(self.names(self.raikiri)[0], "Chidori")
+        self.assertEqual(self.names(chidori)[0], "Raikiri")
+        raikiri = Jutsu.objects.get(pk=self.raikiri.pk)
+        self.assertEqual(raikiri.updated_at, updated_at)
+        self.assertIsNotNone(raikiri.similar_updated_at)
+        self.assertEqual(JutsuChange.objects.get(jutsu_id=raikiri.pk).operation, changes.REFRESHED)
+        self.assertEqual(JutsuChange.objects.get(jutsu_id=chidori.pk).operation, changes.CREATED)
+
+    def test_frequencies_follow_saves_and_deletes(self):
+        self.assertEqual(SimilarityTerm.objects.get(term="fogo").documents, 2)
+        pk = self.housenka.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.housenka.delete()
+        self.assertEqual(SimilarityTerm.objects.get(term="fogo").documents, 1)
+        self.assertFalse(JutsuTerm.objects.filter(jutsu_id=pk).exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.raikiri.description = "Lâmina de raio e fogo."
+            self.raikiri.save()
+        self.assertEqual(SimilarityTerm.objects.get(term="fogo").documents, 2)
+        self.assertFalse(SimilarityTerm.objects.filter(term="concentrada").exists())
+
+    def test_rebuild_rewrites_only_the_lists_that_changed(self):
+        token = JutsuChange.objects.latest('id').id
+        rebuild_similar()
+        self.assertFalse(JutsuChange.objects.filter(id__gt=token).exists())
+        self.assertEqual(
+            JutsuTerm.objects.filter(jutsu_id=self.raikiri.pk).count(),
+            len(SimilarityIndex.load().vectors[self.raikiri.pk]),
+        )
+
+    def test_similar_api_action_is_one_lookup(self):
+        url = f'/api/jutsus/{self.goukakyuu.pk}/similar/'
+        # The ETag check, then the neighbors.
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['name'] for item in response.data], self.names(self.goukakyuu))
+        self.assertEqual(response.data[0]['element_display'], "Fogo")
+        self.assertGreater(response.data[0]['similarity'], response.data[-1]['similarity'])
+        self.assertEqual(self.client.get('/api/jutsus/9999/similar/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_rebuild_command(self):
+        out = StringIO()
+        call_command('rebuild_similar_jutsus', '--top', '1', stdout=out)
+        self.assertIn("4 jutsu(s)", out.getvalue())
+        self.assertEqual(self.names(self.goukakyuu), ["Katon: Housenka"])
+
+
+@override_settings(CATALOG_SIMILAR_IN_BACKGROUND=False, CATALOG_AUTOCOMPLETE_IN_BACKGROUND=False)
+class AutocompleteTests(APITestCase):
+
+    def setUp(self):
+        autocomplete.reset()
+        self.addCleanup(autocomplete.reset)
+        for name in ["Katon: Goukakyuu no Jutsu", "Katon: Housenka no Jutsu", "Kage Bunshin no Jutsu",
+                     "Tajuu Kage Bunshin no Jutsu", "Fūton: Rasenshuriken", "Rasengan", "Raikiri"]:
+            Jutsu.objects.create(name=name, description="...")
+
+    def names(self, query, limit=10):
+        return [item['name'] for item in autocomplete.suggest(query, limit)]
+
+    def test_prefixes_then_word_starts_accent_and_case_folded(self):
+        self.assertEqual(self.names("RAS"), ["Rasengan", "Fūton: Rasenshuriken"])
+        self.assertEqual(self.names("bunshin"), ["Kage Bunshin no Jutsu", "Tajuu Kage Bunshin no Jutsu"])
+        self.assertEqual(self.names("futon"), ["Fūton: Rasenshuriken"])
+        self.assertEqual(self.names("katon:  gou"), ["Katon: Goukakyuu no Jutsu"])
+        self.assertEqual(self.names("ka", limit=2), ["Kage Bunshin no Jutsu", "Katon: Goukakyuu no Jutsu"])
+        self.assertEqual(self.names(""), [])
+
+    def test_typos_fall_back_to_similar_words(self):
+        self.assertEqual(self.names("gokakyuu"), ["Katon: Goukakyuu no Jutsu"])
+        self.assertEqual(self.names("raikri"), ["Raikiri"])
+        self.assertEqual(self.names("xyzw"), [])
+
+    def test_committed_writes_are_visible_without_a_rebuild(self):
+        self.names("ras")
+        index = autocomplete.current_state().index
+        with self.captureOnCommitCallbacks(execute=True):
+            Jutsu.objects.create(name="Rasen Rangan", description="...")
+            Jutsu.objects.get(name="Rasengan").delete()
+            raikiri = Jutsu.objects.get(name="Raikiri")
+            raikiri.name = "Raiton: Raikiri"
+            raikiri.save()
+        self.assertEqual(self.names("ras"), ["Rasen Rangan", "Fūton: Rasenshuriken"])
+        self.assertEqual(self.names("raiton"), ["Raiton: Raikiri"])
+        self.assertIs(autocomplete.current_state().index, index)
+
+    def test_writes_of_other_processes_are_synced_from_the_change_feed(self):
+        self.names("ras")
+        index = autocomplete.current_state().index
+        # No on_commit callbacks: as if another worker had written them.
+        Jutsu.objects.create(name="Rasen Rangan", description="...")
+        Jutsu.objects.get(name="Rasengan").delete()
+        with override_settings(CATALOG_AUTOCOMPLETE_MAX_AGE=0), \
+                patch('catalog.autocomplete.threading.Thread') as thread:
+            self.names("ras")
+        thread.assert_called_once()
+        thread.call_args.kwargs['target'](*thread.call_args.kwargs['args'])
+        self.assertEqual(self.names("rasen"), ["Rasen Rangan", "Fūton: Rasenshuriken"])
+        self.assertIs(autocomplete.current_state().index, index)
+
+    def test_database_answers_while_the_index_loads(self):
+        with override_settings(CATALOG_AUTOCOMPLETE_IN_BACKGROUND=True), \
+                patch('catalog.autocomplete.threading.Thread') as thread:
+            self.assertEqual(self.names("kage"), ["Kage Bunshin no Jutsu", "Tajuu Kage Bunshin no Jutsu"])
+            self.assertEqual(self.names("ras", limit=1), ["Rasengan"])
+        thread.assert_called_once()
+        thread.call_args.kwargs['target'](*thread.call_args.kwargs['args'])
+        self.assertEqual(self.names("raikri"), ["Raikiri"])
+
+    def test_api_endpoint(self):
+        response = self.client.get('/api/jutsus/autocomplete/', {'q': 'kage', 'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [
+            {'id': Jutsu.objects.get(name="Kage Bunshin no Jutsu").pk, 'name': "Kage Bunshin no Jutsu"},
+        ])
+        self.assertContains(self.client.get(reverse('jutsu-list')), 'data-autocomplete-url="/api/jutsus/autocomplete/"')
+
+
+@override_settings(
+    CATALOG_SIMILAR_IN_BACKGROUND=False, CATALOG_MEDIA_CLEANUP_IN_BACKGROUND=False,
+    CATALOG_AUTOCOMPLETE_IN_BACKGROUND=False,
+)
+class BulkAPITests(APITestCase):
+    url = '/api/jutsus/bulk/'
+
+    def setUp(self):
+        autocomplete.reset()
+        self.addCleanup(autocomplete.reset)
+        self.rasengan = Jutsu.objects.create(name="Rasengan", description="Esfera de chakra", rank="A")
+        self.chidori = Jutsu.objects.create(
+            name="Chidori", description="Raio na mão", element_type="lightning", rank="A",
+            image="jutsu_images/chidori.png",
+        )
+        self.user = User.objects.create_user(username='bulk', password='12345')
+        self.client.force_authenticate(self.user)
+
+    def test_create_batch(self):
+        data = [
+            {'name': "Katon: Goukakyuu", 'description': "Bola de fogo", 'element_type': 'fire', 'rank': 'C'},
+            {'name': "Suiton: Suiryuudan", 'description': "Dragão de água", 'element_type': 'water'},
+        ]
+        autocomplete.suggest("ka")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['name'] for item in response.data['results']], [row['name'] for row in data])
+        self.assertEqual(Jutsu.objects.get(pk=response.data['results'][0]['id']).rank, 'C')
+        self.assertEqual(stats_drift(), {})
+        self.assertEqual(self.names("katon"), ["Katon: Goukakyuu"])
+        self.assertIn("Rasengan", [jutsu.name for jutsu in similar_jutsus(response.data['results'][1]['id'])])
+
+    def test_invalid_batch_writes_nothing_and_checks_names_in_one_query(self):
+        data = [
+            {'name': "Rasengan", 'description': "Repetido no catálogo"},
+            {'name': "Kage Bunshin", 'description': "Rank inválido", 'rank': 'Z'},
+            {'name': "Sharingan", 'description': "Repetido no lote"},
+            {'name': "Sharingan", 'description': "Repetido no lote"},
+        ]
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([sorted(errors) for errors in response.data], [['name'], ['rank'], ['name'], ['name']])
+        self.assertEqual(Jutsu.objects.count(), 2)
+
+    def test_update_batch(self):
+        updated_at = self.rasengan.updated_at
+        data = [
+            {'id': self.rasengan.pk, 'rank': 'S'},
+            {'id': self.chidori.pk, 'name': "Raikiri", 'element_type': 'lightning'},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['rank'] for item in response.data['results']], ['S', 'A'])
+        self.rasengan.refresh_from_db()
+        self.assertEqual((self.rasengan.name, self.rasengan.rank), ("Rasengan", 'S'))
+        self.assertGreater(self.rasengan.updated_at, updated_at)
+        self.assertEqual(Jutsu.objects.get(pk=self.chidori.pk).name, "Raikiri")
+        self.assertEqual(stats_drift(), {})
+        self.assertEqual(self.names("rai"), ["Raikiri"])
+
+        response = self.client.patch(self.url, [{'id': 9999, 'rank': 'S'}, {'id': self.rasengan.pk, 'name': "Raikiri"}],
+                                     format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([list(errors) for errors in response.data], [['id'], ['name']])
+
+    def test_delete_batch(self):
+        rebuild_similar()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(self.url, [self.chidori.pk, 9999], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [
+            {'id': self.chidori.pk, 'deleted': True}, {'id': 9999, 'deleted': False},
+        ])
+        self.assertEqual(list(Jutsu.objects.values_list('name', flat=True)), ["Rasengan"])
+        self.assertEqual(list(similar_jutsus(self.rasengan.pk)), [])
+        self.assertEqual(stats_drift(), {})
+        self.assertEqual(self.names("chi"), [])
+
+    def test_limits_and_permissions(self):
+        with override_settings(CATALOG_BULK_MAX_ITEMS=1):
+            response = self.client.delete(self.url, [1, 2], format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            response = self.client.post(self.url, [{'name': "A"}, {'name': "B"}], format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url, {'name': "A"}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.delete(self.url, [self.rasengan.pk], format='json').status_code,
+                         status.HTTP_403_FORBIDDEN)
+        self.assertTrue(Jutsu.objects.filter(pk=self.rasengan.pk).exists())
+
+    def names(self, query):
+        return [item['name'] for item in autocomplete.suggest(query)]
+
+
+@override_settings(CATALOG_SIMILAR_IN_BACKGROUND=False)
+class ChangeFeedTests(APITestCase):
+    url = '/api/jutsus/changes/'
+
+    def setUp(self):
+        self.rasengan = Jutsu.objects.create(name="Rasengan", description="Esfera de chakra")
+        self.chidori = Jutsu.objects.create(name="Chidori", description="Raio na mão")
+        self.start = JutsuChange.objects.latest('id').id
+
+    def feed(self, since, **params):
+        response = self.client.get(self.url, {'since': since, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def operations(self, data):
+        return [(item['operation'], item['id']) for item in data['results']]
+
+    def test_changes_since_a_token_in_commit_order(self):
+        self.assertEqual(self.operations(self.feed(0)), [
+            ('created', self.rasengan.pk), ('created', self.chidori.pk),
+        ])
+        self.rasengan.rank = 'S'
+        self.rasengan.save()
+        kage = Jutsu.objects.create(name="Kage Bunshin", description="Clones")
+        Jutsu.objects.filter(pk=self.chidori.pk).delete()
+
+        data = self.feed(self.start)
+        self.assertEqual(self.operations(data), [
+            ('updated', self.rasengan.pk), ('created', kage.pk), ('deleted', self.chidori.pk),
+        ])
+        self.assertEqual(data['results'][0]['jutsu']['rank'], 'S')
+        self.assertIsNone(data['results'][2]['jutsu'])
+        self.assertEqual(self.feed(data['next'])['results'], [])
+        # Every write replaces the jutsu's entry: reading from 0 is the catalog plus its tombstones.
+        self.assertEqual(JutsuChange.objects.count(), 3)
+
+    def test_pages_follow_the_next_token(self):
+        first = self.feed(0, limit=1)
+        self.assertTrue(first['has_more'])
+        second = self.feed(first['next'], limit=1)
+        self.assertEqual(self.operations(first) + self.operations(second), self.operations(self.feed(0)))
+        self.assertFalse(second['has_more'])
+
+    def test_bulk_writes_are_in_the_feed(self):
+        self.client.force_authenticate(User.objects.create_user(username='mirror', password='12345'))
+        self.client.patch('/api/jutsus/bulk/', [{'id': self.chidori.pk, 'rank': 'A'}], format='json')
+        self.client.delete('/api/jutsus/bulk/', [self.rasengan.pk], format='json')
+        self.assertEqual(self.operations(self.feed(self.start)), [
+            ('updated', self.chidori.pk), ('deleted', self.rasengan.pk),
+        ])
+
+    def test_compaction_expires_older_tokens(self):
+        pk = self.chidori.pk
+        self.chidori.delete()
+        JutsuChange.objects.filter(jutsu_id=pk).update(changed_at=self.chidori.created_at.replace(year=2000))
+        self.assertEqual(changes.compact_changes(), 1)
+        response = self.client.get(self.url, {'since': self.start})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(self.operations(self.feed(self.start + 1)), [])
+        # A mirror that lost its token can always start over.
+        self.assertEqual(self.operations(self.feed(0)), [('created', self.rasengan.pk)])
+        self.assertEqual(self.client.get(self.url, {'since': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0, CATALOG_READ_REPLICAS=['default'])
+class ReadReplicaTests(TestCase):
+    # The "replica" is the default database itself: what is checked is which requests pick one.
+
+    def setUp(self):
+        self.jutsu = Jutsu.objects.create(name="Rasengan", description="Esfera de chakra")
+        self.user = User.objects.create_user(username='editor', password='12345')
+
+    def replica_chosen(self, method, url, **kwargs):
+        with patch('catalog.routers.random.choice', return_value='default') as choice:
+            response = getattr(self.client, method)(url, **kwargs)
+        return response, choice.called
+
+    def test_read_views_and_actions_use_a_replica(self):
+        for url in ('/', reverse('jutsu-list'), reverse('jutsu-detail', args=[self.jutsu.pk]),
+                    '/api/jutsus/', f'/api/jutsus/{self.jutsu.pk}/'):
+            response, chosen = self.replica_chosen('get', url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(chosen, url)
+        self.assertFalse(self.replica_chosen('get', '/api/jutsus/export/')[1])
+
+    def test_writers_stick_to_the_primary(self):
+        self.client.login(username='editor', password='12345')
+        self.assertFalse(self.replica_chosen('get', reverse('jutsu-edit', args=[self.jutsu.pk]))[1])
+        response, chosen = self.replica_chosen('post', reverse('jutsu-edit', args=[self.jutsu.pk]), data={
+            'name': "Rasengan", 'description': "Editado", 'element_type': 'wind',
+            'jutsu_type': 'offensive', 'rank': 'A',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(chosen)
+        self.assertEqual(response.cookies[routers.COOKIE_NAME]['max-age'], 10)
+        self.assertFalse(self.replica_chosen('get', reverse('jutsu-detail', args=[self.jutsu.pk]))[1])
+
+        self.client.cookies.pop(routers.COOKIE_NAME)
+        response, chosen = self.replica_chosen('get', reverse('jutsu-detail', args=[self.jutsu.pk]))
+        self.assertTrue(chosen)
+        self.assertNotIn(routers.COOKIE_NAME, response.cookies)
+
+    def test_router_only_sends_catalog_reads_to_the_replica(self):
+        router = routers.PrimaryReplicaRouter()
+        state = routers.RequestDatabases(pinned=False)
+        state.replica = 'replica1'
+        token = routers._current.set(state)
+        try:
+            self.assertEqual(router.db_for_read(Jutsu), 'replica1')
+            self.assertEqual(router.db_for_read(User), 'default')
+            self.assertEqual(router.db_for_write(Jutsu), 'default')
+        finally:
+            routers._current.reset(token)
+        self.assertTrue(state.wrote)
+        self.assertEqual(router.db_for_read(Jutsu), 'default')
+        with override_settings(CATALOG_READ_REPLICAS=['replica1']):
+            self.assertFalse(router.allow_migrate('replica1', 'catalog'))
+            self.assertTrue(router.allow_migrate('default', 'catalog'))
+
+
+class OpenAPISchemaTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        schema = override_settings(CATALOG_OPENAPI_DIR=directory)
+        schema.enable()
+        self.addCleanup(schema.disable)
+        openapi._documents.clear()
+        self.addCleanup(openapi._documents.clear)
+
+    def test_schema_is_generated_once_and_revalidated_by_content_hash(self):
+        with patch('catalog.openapi.generate', wraps=openapi.generate) as generate:
+            response = self.client.get('/swagger.json')
+            self.assertEqual(response.status_code, 200)
+            document = json.loads(response.content)
+            self.assertIn('/jutsus/bulk/', document['paths'])
+            page = document['paths']['/jutsus/']['get']['responses']['200']['schema']
+            self.assertEqual(page['properties']['count_is_estimated']['type'], 'boolean')
+            etag = response['ETag']
+            self.assertEqual(etag, f'"{openapi.get_document("json").etag}"')
+            self.assertEqual(self.client.get('/swagger.json', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertTrue(self.client.get('/swagger.yaml').content.startswith(b"swagger: '2.0'"))
+        self.assertEqual(generate.call_count, 1)
+
+    def test_new_code_version_regenerates_and_command_prunes_the_old(self):
+        with patch('catalog.openapi.code_version', return_value='old'):
+            openapi.build()
+        call_command('build_openapi_schema', stdout=StringIO())
+        files = sorted(path.name for path in openapi.schema_dir().iterdir())
+        self.assertNotIn('old.json', files)
+        self.assertIn(f'{openapi.code_version()}.json', files)
+        self.assertEqual(len(files), 3)
+        for path in openapi.schema_dir().iterdir():
+            self.assertEqual(path.stat().st_mode & 0o777, 0o644)
+
+
+@override_settings(
+    CATALOG_PAGE_CACHE_TIMEOUT=0, CATALOG_SIMILAR_IN_BACKGROUND=False, CATALOG_STATIC_WORKERS=0,
+    CATALOG_STATIC_BASE_URL='http://testserver',
+)
+class StaticCatalogTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        # 25 jutsus: three HTML list pages of 12 and three API pages of 10.
+        self.jutsus = [
+            Jutsu.objects.create(name=f"Jutsu {number:02}", description=f"Técnica {number}", element_type="fire")
+            for number in range(25)
+        ]
+
+    def render(self, **kwargs):
+        return static_catalog.render_catalog(self.directory, **kwargs)
+
+    def read(self, name):
+        with open(os.path.join(self.directory, name), 'rb') as file:
+            return file.read()
+
+    def test_full_render_mirrors_the_urls(self):
+        result = self.render()
+        self.assertTrue(result['full'])
+        jutsu = self.jutsus[3]
+        self.assertIn(jutsu.name.encode(), self.read(f'jutsu/{jutsu.pk}/index.html'))
+        self.assertEqual(json.loads(self.read(f'api/jutsus/{jutsu.pk}/index.json'))['name'], jutsu.name)
+        self.assertIn(b'Jutsu 00', self.read('jutsus/index.html'))
+        self.assertIn(b'Jutsu 00', self.read('jutsus/page/1.html'))
+        self.assertEqual(len(json.loads(self.read('api/jutsus/page/3.json'))['results']), 5)
+        self.assertIn(b'Jutsu 24', self.read('jutsus/page/3.html'))
+        for name in ('index.html', 'dashboard/index.html'):
+            self.assertTrue(os.path.exists(os.path.join(self.directory, name)))
+        # nginx reads the files as another user.
+        for name in ('index.html', 'jutsus/facets.json', f'api/jutsus/{jutsu.pk}/index.json', 'manifest.json'):
+            self.assertEqual(os.stat(os.path.join(self.directory, name)).st_mode & 0o777, 0o644)
+        self.assertEqual(self.render()['rendered'], [])
+
+    def test_edit_renders_its_detail_and_list_pages_only(self):
+        self.render()
+        jutsu = self.jutsus[20]
+        jutsu.description = "Técnica revisada"
+        jutsu.save()
+        result = self.render()
+        self.assertFalse(result['full'])
+        self.assertIn(f'jutsu/{jutsu.pk}/index.html', result['rendered'])
+        self.assertIn(b'revisada', self.read(f'api/jutsus/{jutsu.pk}/index.json'))
+        lists = {name for name in result['rendered'] if '/page/' in name or name.endswith('s/index.html')}
+        self.assertEqual(lists, {'jutsus/page/2.html', 'api/jutsus/page/3.json'})
+
+    def test_delete_removes_its_files_and_the_last_list_page(self):
+        self.render()
+        pk = self.jutsus[24].pk
+        Jutsu.objects.filter(name__gte="Jutsu 20").delete()
+        result = self.render()
+        self.assertIn(f'jutsu/{pk}/index.html', result['removed'])
+        self.assertIn('api/jutsus/page/3.json', result['removed'])
+        self.assertFalse(os.path.exists(os.path.join(self.directory, f'jutsu/{pk}')))
+        self.assertNotIn(b'Jutsu 24', self.read('jutsus/page/2.html'))
+
+    def lists(self, result):
+        lists = ('jutsus/index.html', 'api/jutsus/index.json')
+        return {name for name in result['rendered'] if '/page/' in name or name in lists}
+
+    def test_list_pages_leave_counters_to_a_shared_fragment(self):
+        self.render()
+        self.assertNotIn('count', json.loads(self.read('api/jutsus/page/2.json')))
+        self.assertNotIn(b'(25)', self.read('jutsus/page/2.html'))
+        self.assertIn(b'data-facets-url="/jutsus/facets.json"', self.read('jutsus/page/2.html'))
+        jutsu = self.jutsus[3]
+        jutsu.element_type = "water"
+        jutsu.save()
+        result = self.render()
+        # A reclassification moves the counters, but only its own pages show it.
+        self.assertEqual(self.lists(result), {'jutsus/page/1.html', 'jutsus/index.html',
+                                              'api/jutsus/page/1.json', 'api/jutsus/index.json'})
+        facets = json.loads(self.read('jutsus/facets.json'))
+        self.assertIn({'value': 'water', 'label': 'Água', 'count': 1}, facets['element_type'])
+        # Django still counts for everyone else.
+        self.assertEqual(self.client.get('/api/jutsus/', {'page': 2}).data['count'], 25)
+        self.assertNotIn('order', json.loads(self.read('manifest.json')))
+
+    def test_rename_renders_the_pages_between_its_places(self):
+        self.render()
+        jutsu = self.jutsus[22]
+        jutsu.name = "Jutsu 00a"
+        jutsu.save()
+        self.assertEqual(self.lists(self.render()), {
+            'jutsus/page/1.html', 'jutsus/index.html', 'jutsus/page/2.html',
+            'api/jutsus/page/1.json', 'api/jutsus/index.json', 'api/jutsus/page/2.json', 'api/jutsus/page/3.json',
+        })
+        Jutsu.objects.create(name="Jutsu 99", description="Última")
+        self.assertEqual(self.lists(self.render()), {'jutsus/page/3.html', 'api/jutsus/page/3.json'})
+        self.assertIn(b'Jutsu 99', self.read('jutsus/page/3.html'))
+
+    def test_refreshed_similar_lists_render_details_only(self):
+        self.render()
+        pk = self.jutsus[5].pk
+        with transaction.atomic():
+            bump_revision()
+            changes.record_refreshed([pk])
+        result = self.render()
+        self.assertIn(f'jutsu/{pk}/index.html', result['rendered'])
+        self.assertEqual(self.lists(result), set())
+        # New image variants show on the list cards too.
+        with transaction.atomic():
+            Jutsu.objects.filter(pk=pk).update(variants_updated_at=timezone.now())
+            bump_revision()
+            changes.record_refreshed([pk])
+        self.assertEqual(self.lists(self.render()), {
+            'jutsus/page/1.html', 'jutsus/index.html', 'api/jutsus/page/1.json', 'api/jutsus/index.json',
+        })
+
+    def test_watch_renders_the_writes_in_its_own_process(self):
+        command = 'catalog.management.commands.render_static_catalog'
+        written = []
+
+        def write_while_asleep(seconds):
+            if written:
+                raise KeyboardInterrupt
+            with self.captureOnCommitCallbacks(execute=True):
+                written.append(Jutsu.objects.create(name="Rasengan", description="Esfera de chakra"))
+            # The write itself leaves the snapshot alone.
+            self.assertFalse(os.path.exists(os.path.join(self.directory, f'jutsu/{written[0].pk}')))
+
+        with override_settings(CATALOG_STATIC_DIR=self.directory), \
+                patch(f'{command}.time.sleep', side_effect=write_while_asleep), \
+                patch(f'{command}.close_old_connections'), self.assertRaises(KeyboardInterrupt):
+            call_command('render_static_catalog', '--watch', '5', stdout=StringIO())
+        self.assertIn(b'Rasengan', self.read(f'jutsu/{written[0].pk}/index.html'))
+        self.assertIn(b'Rasengan', self.read('jutsus/page/3.html'))
+
+    def test_command_needs_a_directory(self):
+        with self.assertRaises(CommandError):
+            call_command('render_static_catalog', stdout=StringIO())
+
+
+class SettingsProfileTests(SimpleTestCase):
+    module = 'naruto_jutsu_catalog.settings.prod'
+
+    def load_prod(self, **environ):
+        sys.modules.pop(self.module, None)
+        self.addCleanup(sys.modules.pop, self.module, None)
+        with patch.dict(os.environ, environ):
+            return importlib.import_module(self.module)
+
+    def test_prod_drops_dev_only_apps_and_keeps_connections(self):
+        prod = self.load_prod(SECRET_KEY='s3cr3t', DJANGO_ALLOWED_HOSTS='catalogo.example.com,localhost', CONN_MAX_AGE='120')
+        self.assertFalse(prod.DEBUG)
+        self.assertEqual(prod.SECRET_KEY, 's3cr3t')
+        self.assertEqual(prod.ALLOWED_HOSTS, ['catalogo.example.com', 'localhost'])
+        self.assertNotIn('debug_toolbar', prod.INSTALLED_APPS)
+        self.assertFalse([name for name in prod.MIDDLEWARE if name.startswith('debug_toolbar.')])
+        self.assertEqual(prod.DATABASES['default']['CONN_MAX_AGE'], 120)
+        self.assertTrue(prod.DATABASES['default']['CONN_HEALTH_CHECKS'])
+        loader, _ = prod.TEMPLATES[0]['OPTIONS']['loaders'][0]
+        self.assertEqual(loader, 'django.template.loaders.cached.Loader')
+
+    def test_prod_requires_a_secret_key(self):
+        with patch.dict(os.environ), self.assertRaises(ImproperlyConfigured):
+            os.environ.pop('SECRET_KEY', None)
+            self.load_prod()
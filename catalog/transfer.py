@@ -0,0 +1,160 @@
+"""
+Row-level reading and writing of the catalog as JSONL or CSV.
+
+Everything here streams: rows are read and encoded one at a time, and exports
+iterate ``values_list()`` in chunks so memory stays flat whatever the size of
+the catalog. Used by the ``import_jutsus``/``export_jutsus`` commands and the
+API's NDJSON export.
+"""
+import contextlib
+import csv
+import json
+import sys
+
+from . import media
+from .models import Jutsu
+
+EXPORT_FIELDS = [
+    'id', 'name', 'description', 'element_type', 'jutsu_type', 'rank', 'image', 'created_at', 'updated_at'
+]
+IMPORT_FIELDS = ['name', 'description', 'element_type', 'jutsu_type', 'rank', 'image']
+FORMATS = ('jsonl', 'csv')
+
+
+class RowError(ValueError):
+    pass
+
+
+@contextlib.contextmanager
+def open_text(path, mode):
+    """Open ``path`` as UTF-8 text; ``-`` means stdin/stdout (left open afterwards)."""
+    if path == '-':
+        yield sys.stdin if 'r' in mode else sys.stdout
+        return
+    with open(path, mode, encoding='utf-8', newline='') as file:
+        yield file
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    if str(path).endswith('.csv'):
+        return 'csv'
+    return 'jsonl'
+
+
+def format_datetime(value):
+    # Same representation as the API (DRF's DateTimeField).
+    value = value.isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Yield one plain dict per jutsu, in primary-key order, without building model instances."""
+    for values in queryset.order_by('pk').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size):
+        row = dict(zip(EXPORT_FIELDS, values))
+        row['image'] = row['image'] or None
+        row['created_at'] = format_datetime(row['created_at'])
+        row['updated_at'] = format_datetime(row['updated_at'])
+        yield row
+
+
+def encode_jsonl(row):
+    return json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def iter_ndjson(rows, buffer_size=64 * 1024):
+    """Encode rows as NDJSON, yielding ~``buffer_size`` strings instead of one tiny chunk per row."""
+    buffer, size = [], 0
+    for row in rows:
+        line = encode_jsonl(row)
+        buffer.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def write_rows(rows, file, fmt):
+    """Write ``rows`` to a text file; returns how many were written."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(file, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            file.write(encode_jsonl(row))
+            count += 1
+    return count
+
+
+def read_rows(file, fmt):
+    """
+    Yield ``(line_number, row)`` for every record of a text file. A record that
+    cannot even be parsed is yielded as ``(line_number, RowError)`` so the caller
+    can report it and carry on.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, {key: value for key, value in row.items() if key in IMPORT_FIELDS}
+        return
+
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield line_number, RowError(f"JSON inválido: {exc.msg}")
+            continue
+        if not isinstance(row, dict):
+            yield line_number, RowError("Cada linha deve ser um objeto JSON.")
+            continue
+        yield line_number, {key: value for key, value in row.items() if key in IMPORT_FIELDS}
+
+
+def upsert_jutsus(validated_rows, using='default'):
+    """
+    Insert or update (by the unique ``name``) one batch with a single statement.
+
+    Within a batch the last row for a name wins, since the database refuses to
+    upsert the same key twice in one statement. A jutsu whose image is replaced
+    loses its variants, and the old files are queued for deletion (catalog.media)
+    as the signals would for a save; call it inside the batch's transaction.
+    Returns the ids of the jutsus created and of those updated.
+    """
+    by_name = {row['name']: row for row in validated_rows}
+    existing = {
+        name: (pk, image or '', manifest)
+        for pk, name, image, manifest in Jutsu.objects.using(using)
+        .filter(name__in=by_name).values_list('pk', 'name', 'image', 'image_variants')
+    }
+    objects = [Jutsu(**row) for row in by_name.values()]
+    for jutsu in objects:
+        if jutsu.name not in existing:
+            continue
+        _, image, manifest = existing[jutsu.name]
+        if image == (jutsu.image.name or ''):
+            jutsu.image_variants = manifest
+            continue
+        media.enqueue([image], source=image, using=using)
+        media.enqueue(media.variant_names(manifest), source=(manifest or {}).get('source', ''), using=using)
+    Jutsu.objects.using(using).bulk_create(
+        objects,
+        update_conflicts=True,
+        unique_fields=['name'],
+        update_fields=[
+            'description', 'element_type', 'jutsu_type', 'rank', 'image', 'image_variants', 'updated_at'
+        ],
+    )
+    new = [name for name in by_name if name not in existing]
+    created = list(
+        Jutsu.objects.using(using).filter(name__in=new).values_list('pk', flat=True)
+    ) if new else []
+    return created, [pk for pk, _, _ in existing.values()]
@@ -0,0 +1,53 @@
+import hashlib
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CatalogRevision
+
+_code_version = None
+
+
+def code_version():
+    """
+    Identifies the deployed code and templates, so validators change on deploys.
+
+    ``CATALOG_CODE_VERSION`` (e.g. a git sha) wins; otherwise it is a hash of the
+    names, sizes and mtimes of the project's source files, which is the same in
+    every worker of a deploy.
+    """
+    global _code_version
+    if _code_version is None:
+        configured = getattr(settings, 'CATALOG_CODE_VERSION', None)
+        if configured:
+            _code_version = str(configured)
+        else:
+            digest = hashlib.sha1()
+            base = Path(settings.BASE_DIR)
+            for package in ('catalog', 'naruto_jutsu_catalog'):
+                for path in sorted((base / package).rglob('*')):
+                    if path.suffix in ('.py', '.html') and path.is_file():
+                        stat = path.stat()
+                        digest.update(f'{path.relative_to(base)}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+            _code_version = digest.hexdigest()[:12]
+    return _code_version
+
+
+def bump_revision(using=DEFAULT_DB_ALIAS):
+    """Advance the catalog revision inside the caller's transaction."""
+    revisions = CatalogRevision.objects.using(using)
+    if not revisions.filter(pk=1).update(revision=F('revision') + 1, changed_at=timezone.now()):
+        revisions.get_or_create(pk=1)
+        revisions.filter(pk=1).update(revision=F('revision') + 1, changed_at=timezone.now())
+
+
+def catalog_revision(using=None):
+    """``(revision, changed_at)``; ``(0, None)`` before the first write."""
+    return CatalogRevision.objects.using(using).filter(pk=1).values_list('revision', 'changed_at').first() or (0, None)
+
+
+async def acatalog_revision(using=None):
+    return await CatalogRevision.objects.using(using).filter(pk=1).values_list('revision', 'changed_at').afirst() or (0, None)
@@ -1,50 +1,91 @@
+from django.http import Http404
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
-from django.db.models import Q, Count 
 from .models import Jutsu
 from django.contrib.auth.mixins import LoginRequiredMixin
+from .caching import cache_catalog_page
+from .conditional import catalog_etag, jutsu_etag
+from .facets import facet_counts
 from .forms import JutsuForm
+from .pagination import EstimatedCountPaginator, InvalidCursor, paginate_keyset
+from .search import search_jutsus
+from .sampling import sample_jutsus
+from .similarity import similar_jutsus
+from .stats import dashboard_stats, total_jutsus
 
+@method_decorator(condition(etag_func=catalog_etag), name='get')
+@method_decorator(cache_catalog_page('jutsu-list'), name='get')
 class JutsuListView(ListView):
     model = Jutsu
+    read_from_replica = True
     template_name = 'catalog/jutsu_list.html' 
     context_object_name = 'jutsus' 
     paginate_by = 12
-    def get_queryset(self):
+    paginator_class = EstimatedCountPaginator
+    # Query parameter -> filtered field.
+    filter_params = {'element': 'element_type', 'type': 'jutsu_type', 'rank': 'rank'}
+
+    def get_search_queryset(self):
         queryset = super().get_queryset() 
 
         search_query = self.request.GET.get('search')
-        if search_query:           
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) | 
-                Q(description__icontains=search_query)
-            )
-
-        element_filter = self.request.GET.get('element')
-        if element_filter:
-            queryset = queryset.filter(element_type=element_filter)
-
-        type_filter = self.request.GET.get('type')
-        if type_filter:
-            queryset = queryset.filter(jutsu_type=type_filter)
-            
+        if search_query:
+            queryset = search_jutsus(queryset, search_query)
         return queryset
+
+    def get_filters(self):
+        return {
+            field: self.request.GET[param] for param, field in self.filter_params.items() if self.request.GET.get(param)
+        }
+
+    def get_queryset(self):
+        return self.get_search_queryset().filter(**self.get_filters())
+
+    def get_facets(self):
+        return facet_counts(self.get_search_queryset(), self.get_filters())
     
+    def paginate_queryset(self, queryset, page_size):
+        # Page numbers stay available for old links and for relevance-ordered searches.
+        if 'page' in self.request.GET or self.request.GET.get('search'):
+            return super().paginate_queryset(queryset, page_size)
+        try:
+            page = paginate_keyset(queryset, page_size, self.request.GET.get('cursor') or None)
+        except InvalidCursor:
+            raise Http404("Cursor inválido.")
+        return (None, page, page.object_list, page.has_other_pages())
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context['keyset_pagination'] = context['paginator'] is None
         context['element_choices'] = Jutsu.Elements.choices
         context['type_choices'] = Jutsu.Types.choices
+        context['rank_choices'] = Jutsu.Ranks.choices
+        context['facets'] = self.get_facets()
         context['current_search'] = self.request.GET.get('search', '')
         context['current_element'] = self.request.GET.get('element', '')
         context['current_type'] = self.request.GET.get('type', '')
+        context['current_rank'] = self.request.GET.get('rank', '')
         
         return context
 
+@method_decorator(condition(etag_func=jutsu_etag), name='get')
+@method_decorator(cache_catalog_page('jutsu-detail'), name='get')
 class JutsuDetailView(DetailView):
     model = Jutsu
+    read_from_replica = True
     template_name = 'catalog/jutsu_detail.html'
     context_object_name = 'jutsu'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['similar_jutsus'] = self.get_similar_jutsus()
+        return context
+
+    def get_similar_jutsus(self):
+        return list(similar_jutsus(self.object.pk))
+
 class JutsuCreateView(LoginRequiredMixin, CreateView):
     model = Jutsu
     form_class = JutsuForm 
@@ -75,43 +116,52 @@ class JutsuDeleteView(LoginRequiredMixin, DeleteView):
     context_object_name = 'jutsu'
     success_url = reverse_lazy('jutsu-list')
     
+def dashboard_context(stats, recent_jutsus):
+    return {
+        'total_jutsus': stats['total'],
+        'total_elements': len(stats['element_type']),
+        'elements_labels': [value for value, count in stats['element_type']],
+        'elements_data': [count for value, count in stats['element_type']],
+        'types_labels': [value for value, count in stats['jutsu_type']],
+        'types_data': [count for value, count in stats['jutsu_type']],
+        'ranks_labels': [value for value, count in stats['rank']],
+        'ranks_data': [count for value, count in stats['rank']],
+        'recent_jutsus': recent_jutsus,
+    }
+
+
+def home_context(latest_jutsus, featured, total):
+    return {
+        'latest_jutsus': latest_jutsus,
+        'fire_jutsus': featured['fire'],
+        'water_jutsus': featured['water'],
+        'high_rank_jutsus': featured['high_rank'],
+        'total_jutsus': total,
+    }
+
+
+FEATURED_SIZES = {'fire': 2, 'water': 2, 'high_rank': 3}
+
+
+@method_decorator(cache_catalog_page('dashboard'), name='get')
 class DashboardView(TemplateView):
     template_name = 'catalog/dashboard.html'
+    read_from_replica = True
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_jutsus'] = Jutsu.objects.count()
-        context['total_elements'] = Jutsu.objects.values('element_type').distinct().count()
-        elements_data = Jutsu.objects.values('element_type').annotate(
-            count=Count('id')
-        ).order_by('-count')
-        context['elements_labels'] = [item['element_type'] for item in elements_data]
-        context['elements_data'] = [item['count'] for item in elements_data]
-        types_data = Jutsu.objects.values('jutsu_type').annotate(
-            count=Count('id')
-        ).order_by('-count')
-        
-        context['types_labels'] = [item['jutsu_type'] for item in types_data]
-        context['types_data'] = [item['count'] for item in types_data]
-        ranks_data = Jutsu.objects.values('rank').annotate(
-            count=Count('id')
-        ).order_by('rank')
-        
-        context['ranks_labels'] = [item['rank'] for item in ranks_data]
-        context['ranks_data'] = [item['count'] for item in ranks_data]
-        context['recent_jutsus'] = Jutsu.objects.order_by('-created_at')[:5]
-        
+        context.update(dashboard_context(dashboard_stats(), Jutsu.objects.order_by('-created_at')[:5]))
         return context
     
+# Short-lived: the featured jutsus are a random sample.
+@method_decorator(cache_catalog_page('home', timeout=60), name='get')
 class HomeView(TemplateView):
     template_name = 'catalog/home.html'
+    read_from_replica = True
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['latest_jutsus'] = Jutsu.objects.order_by('-created_at')[:3]
-        context['fire_jutsus'] = Jutsu.objects.filter(element_type='fire').order_by('?')[:2]
-        context['water_jutsus'] = Jutsu.objects.filter(element_type='water').order_by('?')[:2]
-        context['high_rank_jutsus'] = Jutsu.objects.filter(rank__in=['A', 'S', 'SS']).order_by('?')[:3]
-        context['total_jutsus'] = Jutsu.objects.count()
-        
-        return context
\ No newline at end of file
+        context.update(home_context(
+            Jutsu.objects.order_by('-created_at')[:3], sample_jutsus(**FEATURED_SIZES), total_jutsus()
+        ))
+        return context
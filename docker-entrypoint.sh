@@ -14,4 +14,12 @@ python manage.py migrate
 
 python manage.py collectstatic --no-input
 
-exec gunicorn naruto_jutsu_catalog.wsgi:application --bind 0.0.0.0:8000
\ No newline at end of file
+python manage.py build_openapi_schema
+
+# Workers, threads e timeouts vêm de gunicorn.conf.py (variáveis GUNICORN_*)
+# SERVER_MODE=asgi serve as views assíncronas de leitura com workers uvicorn
+if [ "$SERVER_MODE" = "asgi" ]; then
+    exec gunicorn naruto_jutsu_catalog.asgi:application -k uvicorn.workers.UvicornWorker
+fi
+
+exec gunicorn naruto_jutsu_catalog.wsgi:application
\ No newline at end of file
@@ -0,0 +1,35 @@
+"""
+Gunicorn configuration, read from the environment (.env.prod). Gunicorn loads
+it from the working directory, /code in the Docker image; options given on the
+command line take precedence.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Processos: por padrão 2 por CPU + 1
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+
+# Threads por processo (workers sync); com mais de uma, cada thread mantém a sua
+# conexão persistente com o banco (CONN_MAX_AGE). Ignorado pelos workers uvicorn.
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recicla cada processo após este número de requisições (0 = nunca), com uma
+# variação aleatória para que não reiniciem todos ao mesmo tempo
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+
+# GUNICORN_ACCESS_LOG=- escreve o log de acesso na saída padrão
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_worker_init(worker):
+    # Carrega o índice de sugestões em segundo plano assim que o worker sobe
+    from catalog import autocomplete
+    autocomplete.warm()
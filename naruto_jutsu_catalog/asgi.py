@@ -11,6 +11,8 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'naruto_jutsu_catalog.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'naruto_jutsu_catalog.settings.dev')
+# Serve the catalog's read views natively async (naruto_jutsu_catalog.asgi_urls).
+os.environ.setdefault('CATALOG_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
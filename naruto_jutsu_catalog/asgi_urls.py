@@ -0,0 +1,20 @@
+"""
+URLconf used under ASGI (``naruto_jutsu_catalog.asgi`` turns on
+CATALOG_ASYNC_VIEWS): the catalog's read pages and the jutsu API's list and
+retrieve are served by catalog.async_views; every other route is the same as
+in naruto_jutsu_catalog.urls.
+"""
+from django.urls import path
+
+from catalog import async_views
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('', async_views.HomeView.as_view(), name='home'),
+    path('jutsus/', async_views.JutsuListView.as_view(), name='jutsu-list'),
+    path('dashboard/', async_views.DashboardView.as_view(), name='dashboard'),
+    path('jutsu/<int:pk>/', async_views.JutsuDetailView.as_view(), name='jutsu-detail'),
+    path('api/jutsus/', async_views.JutsuListAPIView.as_view(), name='jutsu-list-api'),
+    path('api/jutsus/<int:pk>/', async_views.JutsuDetailAPIView.as_view(), name='jutsu-detail-api'),
+] + sync_urlpatterns
@@ -0,0 +1,8 @@
+"""
+Settings profiles:
+
+- ``naruto_jutsu_catalog.settings.dev``: the default of manage.py, wsgi.py and
+  asgi.py; DEBUG and the debug toolbar.
+- ``naruto_jutsu_catalog.settings.prod``: what the Docker image runs; no
+  dev-only apps, configured from the environment.
+"""
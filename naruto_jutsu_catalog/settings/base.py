@@ -0,0 +1,267 @@
+"""
+Django settings for naruto_jutsu_catalog project: what the dev and prod
+profiles (naruto_jutsu_catalog.settings.dev / .prod) have in common.
+
+Generated by 'django-admin startproject' using Django 5.2.4.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/5.2/ref/settings/
+"""
+
+import os
+from pathlib import Path
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'django-insecure-oaxg7t@ri48akdiaylhktb5^@=*4t(elb88f4#$x$$e_4ke$0n'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = []
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',       
+    'django.contrib.auth',        
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',     
+    'django.contrib.messages',    
+    'django.contrib.staticfiles',  
+    'catalog.apps.CatalogConfig',
+    'rest_framework',
+    'django_filters',
+    'drf_yasg',
+    'crispy_forms',
+    'crispy_bootstrap5',
+]
+
+MIDDLEWARE = [
+    'catalog.instrumentation.InstrumentationMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'catalog.routers.ReplicaMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+# Under ASGI (naruto_jutsu_catalog.asgi) the read views are served by their async versions.
+CATALOG_ASYNC_VIEWS = os.environ.get('CATALOG_ASYNC_VIEWS', '0') == '1'
+
+ROOT_URLCONF = 'naruto_jutsu_catalog.asgi_urls' if CATALOG_ASYNC_VIEWS else 'naruto_jutsu_catalog.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'naruto_jutsu_catalog.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+
+# SQLite por padrão; DATABASE=postgres usa as variáveis SQL_* (as mesmas do docker-entrypoint.sh)
+if os.environ.get('DATABASE') == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('SQL_DATABASE', 'naruto_jutsu_catalog'),
+            'USER': os.environ.get('SQL_USER', 'postgres'),
+            'PASSWORD': os.environ.get('SQL_PASSWORD', ''),
+            'HOST': os.environ.get('SQL_HOST', 'localhost'),
+            'PORT': os.environ.get('SQL_PORT', '5432'),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQL_DATABASE', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+
+# Réplicas de leitura (catalog.routers): SQL_REPLICAS lista, separados por vírgula,
+# os host[:porta] das réplicas do PostgreSQL ou, com SQLite, os arquivos das cópias.
+# As páginas e a API de leitura consultam uma delas; as gravações vão para o default.
+CATALOG_READ_REPLICAS = []
+for _number, _replica in enumerate(filter(None, os.environ.get('SQL_REPLICAS', '').split(',')), 1):
+    _alias = f'replica{_number}'
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES[_alias] = {**DATABASES['default'], 'NAME': _replica.strip()}
+    else:
+        _host, _, _port = _replica.strip().partition(':')
+        DATABASES[_alias] = {**DATABASES['default'], 'HOST': _host, 'PORT': _port or DATABASES['default']['PORT']}
+    # Nos testes a réplica é o próprio banco default.
+    DATABASES[_alias]['TEST'] = {'MIRROR': 'default'}
+    CATALOG_READ_REPLICAS.append(_alias)
+
+DATABASE_ROUTERS = ['catalog.routers.PrimaryReplicaRouter']
+
+# Segundos em que o navegador que acabou de gravar lê do banco principal, para
+# ver as próprias alterações apesar do atraso da replicação
+CATALOG_REPLICA_STICKY_SECONDS = 10
+
+
+# Cache
+# Local memory by default; in production point it at Redis, e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://redis:6379/1
+# (FileBasedCache with a directory also works when several workers must share it.)
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'naruto-jutsu-catalog'),
+    }
+}
+
+# Cache de páginas públicas (catalog.caching)
+CATALOG_PAGE_CACHE_TIMEOUT = 300
+
+# Instrumentação (catalog.instrumentation): consultas acima deste tempo vão para o log
+# "catalog.instrumentation". /metrics responde 404 até que se defina
+# CATALOG_METRICS_TOKEN (exigido em "Authorization: Bearer <token>") ou os IPs
+# autorizados em CATALOG_METRICS_ALLOWED_IPS (separados por espaço ou vírgula).
+CATALOG_SLOW_QUERY_MS = int(os.environ.get('CATALOG_SLOW_QUERY_MS', 200))
+CATALOG_METRICS_TOKEN = os.environ.get('CATALOG_METRICS_TOKEN')
+CATALOG_METRICS_ALLOWED_IPS = os.environ.get('CATALOG_METRICS_ALLOWED_IPS', '').replace(',', ' ').split()
+
+
+# Password validation
+# https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.2/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.2/howto/static-files/
+
+STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+LOGIN_URL = 'admin:login'
+
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'PAGE_SIZE': 10,
+    'DEFAULT_FILTER_BACKENDS': [
+        'django_filters.rest_framework.DjangoFilterBackend',
+        'rest_framework.filters.SearchFilter',
+        'rest_framework.filters.OrderingFilter',
+    ],
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+}
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# As páginas do Swagger UI e do ReDoc carregam o schema gerado uma vez por versão (catalog.openapi)
+SWAGGER_SETTINGS = {'SPEC_URL': ('schema-json', {'format': '.json'})}
+REDOC_SETTINGS = {'SPEC_URL': ('schema-json', {'format': '.json'})}
+
+# Diretório onde "manage.py build_openapi_schema" (ou a primeira requisição) grava
+# o schema OpenAPI; None usa STATIC_ROOT/openapi
+CATALOG_OPENAPI_DIR = None
+
+CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
+CRISPY_TEMPLATE_PACK = "bootstrap5"
+
+# Processos que geram as variantes das imagens (0 = gera na própria requisição, após o commit)
+CATALOG_IMAGE_WORKERS = 2
+
+# Recalcula os jutsus semelhantes (catalog.similarity) numa thread de fundo após
+# cada gravação; False recalcula na própria requisição, após o commit
+CATALOG_SIMILAR_IN_BACKGROUND = True
+
+# Intervalo, em segundos, entre as leituras do feed de alterações que trazem ao
+# índice de sugestões de nomes (catalog.autocomplete) as gravações de outros processos
+CATALOG_AUTOCOMPLETE_MAX_AGE = 300
+
+# Carrega o índice de sugestões numa thread de fundo, respondendo do banco até
+# que fique pronto; False carrega na primeira requisição
+CATALOG_AUTOCOMPLETE_IN_BACKGROUND = True
+
+# Remove arquivos de imagens apagadas ou substituídas (catalog.media) numa thread
+# de fundo após o commit; False remove na própria requisição, após o commit
+CATALOG_MEDIA_CLEANUP_IN_BACKGROUND = True
+
+# A partir de quantos jutsus a paginação por número de página usa uma contagem
+# estimada em vez de COUNT(*) (catalog.pagination); None sempre conta
+CATALOG_ESTIMATED_COUNT_THRESHOLD = 10000
+
+# Máximo de itens por lote nas ações em massa da API (/api/jutsus/bulk/)
+CATALOG_BULK_MAX_ITEMS = 500
+
+# Dias que as lápides de jutsus excluídos ficam no feed de alterações
+# (/api/jutsus/changes/) antes de "manage.py compact_changes" removê-las
+CATALOG_CHANGES_RETENTION_DAYS = 30
+
+# Snapshot estático do catálogo público (catalog.static_catalog) para o nginx servir,
+# gerado e mantido atualizado por "manage.py render_static_catalog --watch"
+CATALOG_STATIC_DIR = os.environ.get('CATALOG_STATIC_DIR') or None
+
+# Endereço público usado nas URLs absolutas do snapshot (o host precisa estar em ALLOWED_HOSTS)
+CATALOG_STATIC_BASE_URL = os.environ.get('CATALOG_STATIC_BASE_URL', 'http://localhost')
+
+# Processos que renderizam lotes grandes do snapshot (0 = no próprio processo)
+CATALOG_STATIC_WORKERS = 2
+
+# Quantas páginas de cada lista entram no snapshot (None = todas); as demais são
+# servidas pelo Django
+CATALOG_STATIC_LIST_PAGES = None
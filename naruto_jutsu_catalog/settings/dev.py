@@ -0,0 +1,18 @@
+"""Development profile: DEBUG on and the Django Debug Toolbar."""
+from .base import *  # noqa: F401,F403
+from .base import CATALOG_ASYNC_VIEWS, INSTALLED_APPS, MIDDLEWARE
+
+DEBUG = True
+
+INSTALLED_APPS = [*INSTALLED_APPS, 'debug_toolbar']
+
+# The toolbar's middleware is sync-only and would push every async view back into a thread.
+if not CATALOG_ASYNC_VIEWS:
+    MIDDLEWARE = [MIDDLEWARE[0], 'debug_toolbar.middleware.DebugToolbarMiddleware', *MIDDLEWARE[1:]]
+
+INTERNAL_IPS = [
+    '127.0.0.1',
+]
+
+# /metrics open to the local machine.
+CATALOG_METRICS_ALLOWED_IPS = INTERNAL_IPS
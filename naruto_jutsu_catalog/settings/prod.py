@@ -0,0 +1,51 @@
+"""
+Production profile (the Docker image's DJANGO_SETTINGS_MODULE): no dev-only
+apps or middleware, persistent database connections and cached templates, with
+the secrets and hosts taken from the environment (.env.prod).
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import CATALOG_ASYNC_VIEWS, DATABASES, TEMPLATES
+
+DEBUG = False
+
+try:
+    SECRET_KEY = os.environ['SECRET_KEY']
+except KeyError:
+    raise ImproperlyConfigured("Defina SECRET_KEY no ambiente (.env.prod) para usar o perfil de produção.")
+
+# Hosts separados por espaço ou vírgula, ex.: DJANGO_ALLOWED_HOSTS="localhost catalogo.example.com"
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost 127.0.0.1').replace(',', ' ').split()
+CSRF_TRUSTED_ORIGINS = os.environ.get('DJANGO_CSRF_TRUSTED_ORIGINS', '').replace(',', ' ').split()
+
+# Conexões persistentes: cada thread do gunicorn reaproveita a sua por até
+# CONN_MAX_AGE segundos, verificada antes do uso. No modo ASGI cada requisição
+# tem a sua conexão, que ficaria aberta sem reuso; lá elas são fechadas ao fim.
+_conn_max_age = 0 if CATALOG_ASYNC_VIEWS else int(os.environ.get('CONN_MAX_AGE', 60))
+DATABASES = {
+    alias: {**config, 'CONN_MAX_AGE': _conn_max_age, 'CONN_HEALTH_CHECKS': True}
+    for alias, config in DATABASES.items()
+}
+
+# Templates compilados uma vez por processo
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+        },
+    },
+]
+
+# Com HTTPS no nginx, DJANGO_SECURE_COOKIES=1 restringe os cookies de sessão e CSRF a ele
+SESSION_COOKIE_SECURE = CSRF_COOKIE_SECURE = os.environ.get('DJANGO_SECURE_COOKIES', '0') == '1'
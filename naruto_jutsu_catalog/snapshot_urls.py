@@ -0,0 +1,18 @@
+"""
+URLconf of the static snapshot's renders (catalog.rendering): the pages it
+writes are served by catalog.snapshot_views; every other route, which those
+pages only link to, is the same as in naruto_jutsu_catalog.urls.
+"""
+from django.urls import path
+
+from catalog import snapshot_views
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('', snapshot_views.HomeView.as_view(), name='home'),
+    path('jutsus/', snapshot_views.JutsuListView.as_view(), name='jutsu-list'),
+    path('dashboard/', snapshot_views.DashboardView.as_view(), name='dashboard'),
+    path('jutsu/<int:pk>/', snapshot_views.JutsuDetailView.as_view(), name='jutsu-detail'),
+    path('api/jutsus/', snapshot_views.SnapshotJutsuViewSet.as_view({'get': 'list'}), name='jutsu-list-api'),
+] + sync_urlpatterns
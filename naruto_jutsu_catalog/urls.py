@@ -4,23 +4,23 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework import routers, permissions
 from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+from catalog import openapi
 from catalog.api_views import JutsuViewSet
+from catalog.instrumentation import metrics_view
 
+# Only the Swagger UI and ReDoc pages; they load the stored schema from "schema-json" (SWAGGER_SETTINGS).
 schema_view = get_schema_view(
-   openapi.Info(
-      title="Naruto Jutsu Catalog API",
-      default_version='v1',
-      description="API para o catálogo de jutsus de Naruto",
-      terms_of_service="https://www.example.com/terms/",
-      contact=openapi.Contact(email="seu.email@example.com"),
-      license=openapi.License(name="BSD License"),
-   ),
+   openapi.API_INFO,
    public=True,
    permission_classes=[permissions.AllowAny],
 )
 
-router = routers.DefaultRouter()
+class APIRouter(routers.DefaultRouter):
+    # Suffix route names with "-api" so they don't shadow the HTML views ("jutsu-list", "jutsu-detail").
+    routes = [route._replace(name=f'{route.name}-api') for route in routers.DefaultRouter.routes]
+
+
+router = APIRouter()
 router.register(r'jutsus', JutsuViewSet)
 
 urlpatterns = [
@@ -28,11 +28,14 @@ urlpatterns = [
     path('', include('catalog.urls')),  
     path('api/', include(router.urls)), 
     path('api-auth/', include('rest_framework.urls')),  
-    path('__debug__/', include('debug_toolbar.urls')),
-    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
+    path('metrics', metrics_view, name='metrics'),
+    re_path(r'^swagger(?P<format>\.json|\.yaml)$', openapi.schema_view, name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
 
+if 'debug_toolbar' in settings.INSTALLED_APPS:
+    urlpatterns.append(path('__debug__/', include('debug_toolbar.urls')))
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file